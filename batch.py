@@ -0,0 +1,368 @@
+"""Headless entry point to process whole folders of ship files
+
+Every ship file found under the given folders is loaded, checked and saved again,
+to the same path or to an output folder, by a pool of worker processes.
+The results are printed as soon as each file is done, then a summary.
+Nothing here imports tkinter, so it runs without a display.
+
+The superstructures and funnels of one ship can also be given to all the other ships,
+to refit a class of sister ships.
+
+The files can also only be validated, with all the problems of each file
+printed as one JSON object per line, or measured, with the area, centroid, length
+and beam of their superstructures.
+
+Example:
+    python batch.py "C:/Games/RTW/Save/Game1" "C:/Games/RTW/Save/Game2" --workers 4
+    python batch.py "C:/Games/RTW/Save/Game1/Class1" --propagate-from lead_ship.10d --dry-run
+    python batch.py "C:/Games/RTW/Save" --validate --json > report.jsonl
+    python batch.py "C:/Games/RTW/Save" --metrics --json > metrics.jsonl
+"""
+import argparse
+import collections
+import concurrent.futures
+import importlib
+import json
+import logging
+import os
+import pathlib
+import sys
+import time
+import model.shipdata as sd
+import model.validation
+import model.metrics
+import parameters_loader
+
+summary = logging.getLogger("Summary")
+details = logging.getLogger("Details")
+
+#result of the processing of one file
+#status is "ok", "invalid" (not a correct ship file) or "error" (anything else)
+#message is a string, the list of issues for the validation, or a dict for the metrics
+FileResult = collections.namedtuple("FileResult", ["path", "status", "seconds", "message"])
+
+#parameters of the worker process, set once per process by _init_worker
+_parameters = None
+
+#most files measured at once by a worker: enough structures for model.metrics.measure_many
+#to be faster than measuring them one by one
+METRICS_CHUNK_SIZE = 50
+
+def find_ship_files(roots, pattern=sd.SHIP_FILE_PATTERN):
+    """List all the ship files in the folder trees
+
+    Args:
+        roots (list[str]): folders to search. A path to a file is returned as is
+        pattern (str): glob pattern of the ship files
+    Returns:
+        list of (root, path) tuples of pathlib.Path, path being an absolute path
+    """
+    found = []
+    for root in roots:
+        root = pathlib.Path(root).resolve()
+        if root.is_file():
+            found.append((root.parent, root))
+        else:
+            found.extend((root, path) for path in sorted(root.rglob(pattern)) if path.is_file())
+    return found
+
+def load_ship(path, parameters):
+    """Read a ship file
+
+    Args:
+        path (pathlib.Path): path to the ship file
+        parameters (parameters_loader.Parameters): parameters for the whole program
+    Returns:
+        model.shipdata.ShipData
+    Raises:
+        ShipFileInvalidException, OSError
+    """
+    with open(path, newline="") as file:
+        return sd.ShipData(file, parameters)
+
+def resave_job(path, root, output_dir=None, transform=None):
+    """Load a ship file, apply the transform if any and save it
+
+    Args:
+        path (pathlib.Path): path to the ship file
+        root (pathlib.Path): the searched folder that contains the file
+        output_dir (pathlib.Path): if given, the file is saved there with the same path
+            relative to root. If None, the file is overwritten
+        transform (str): "module:function" to call with the ShipData before saving.
+            None for no transform
+    Returns:
+        a message for the report
+    """
+    ship_data = load_ship(path, _parameters)
+    if transform is not None:
+        resolve_transform(transform)(ship_data)
+    return save_ship(path, root, output_dir, ship_data)
+
+def propagate_job(path, root, sections, dry_run=False, output_dir=None):
+    """Replace the superstructures and funnels of a ship file, keep the rest
+
+    Args:
+        path (pathlib.Path): path to the ship file
+        root (pathlib.Path): the searched folder that contains the file
+        sections (dict): superstructures and funnels sections,
+            see ShipData.structures_and_funnels_sections
+        dry_run (bool): if True, only report what would change
+        output_dir (pathlib.Path): as for resave_job
+    Returns:
+        a message for the report
+    """
+    ship_data = load_ship(path, _parameters)
+    changes = ship_data.replace_structures_and_funnels(sections)
+    if not changes:
+        return "already the same"
+    message = ", ".join(f"{name} {change}" for name, change in sorted(changes.items()))
+    if dry_run:
+        return "would change: " + message
+    return f"{save_ship(path, root, output_dir, ship_data)}: {message}"
+
+def save_ship(path, root, output_dir, ship_data):
+    """Save a ship to its path or in the output folder
+
+    Returns:
+        a message for the report
+    """
+    if output_dir is None:
+        target = path
+    else:
+        target = pathlib.Path(output_dir).joinpath(path.relative_to(root))
+        target.parent.mkdir(parents=True, exist_ok=True)
+    if ship_data.write_as_ini(file_path=target):
+        return f"saved to {target}"
+    return "unchanged, not written"
+
+def check_job(path, _root):
+    """Only load the ship file, to check that it can be read"""
+    ship_data = load_ship(path, _parameters)
+    return (f"{ship_data.ship_type}, {len(ship_data.structures)} structures, "
+            f"{len(ship_data.turrets_torps)} turrets and torpedo mounts")
+
+def validate_job(path, _root):
+    """Run all the checks on the ship file, without stopping at the first problem
+
+    Returns:
+        (status, issues), see model.validation.validate_file for the issues
+    """
+    issues = model.validation.validate_file(path, _parameters)
+    return ("invalid" if issues else "ok"), issues
+
+def load_job(path, _root):
+    """Only load the ship file, for the jobs that work on several ships at once"""
+    return load_ship(path, _parameters)
+
+def metrics_job(files):
+    """Measure the superstructures of each ship, and all of them together
+
+    The superstructures of all the ships are measured at once by model.metrics.measure_many,
+    the time it takes is shared by the ships.
+
+    Args:
+        files (list): (root, path) tuples
+    Returns:
+        list of FileResult, the message being a dict {structure name or "ship": dict of
+        the metrics relative to the ship's size, see model.metrics.relative} if the ship is ok
+    """
+    loaded = [_timed_job(load_job, path, root, ()) for root, path in files]
+    start = time.perf_counter()
+    ships = [result.message for result in loaded if result.status == "ok"]
+    all_metrics = iter(model.metrics.measure_many(
+        [structure for ship_data in ships for structure in ship_data.structures]))
+    messages = []
+    for ship_data in ships:
+        ship_metrics = {structure.name: next(all_metrics) for structure in ship_data.structures}
+        ship_metrics["ship"] = model.metrics.combine(ship_metrics.values())
+        messages.append({name: {key: None if value is None else round(value, 2)
+                                for key, value
+                                in model.metrics.relative(metrics, ship_data.half_length).items()}
+                         for name, metrics in ship_metrics.items()})
+    share = (time.perf_counter() - start)/len(ships) if ships else 0.0
+    messages = iter(messages)
+    return [result._replace(seconds=result.seconds + share, message=next(messages))
+            if result.status == "ok" else result for result in loaded]
+
+def resolve_transform(transform):
+    """Get the function from a "module:function" string
+
+    Raises:
+        ValueError if the string is malformed
+        ImportError, AttributeError if the function cannot be found
+    """
+    module_name, separator, function_name = transform.partition(":")
+    if not separator or not module_name or not function_name:
+        raise ValueError(f"transform should look like module:function, not {transform}")
+    return getattr(importlib.import_module(module_name), function_name)
+
+def _init_worker(parameters):
+    """Runs once in each worker process"""
+    global _parameters
+    _parameters = parameters
+
+def _timed_job(job, path, root, job_args):
+    """Run the job for one file, catch the errors and time it
+
+    Top level function so it can be sent to the worker processes
+    """
+    start = time.perf_counter()
+    try:
+        outcome = job(path, root, *job_args)
+        status, message = outcome if isinstance(outcome, tuple) else ("ok", outcome)
+    except sd.ShipFileInvalidException as error:
+        status = "invalid"
+        message = str(error).replace("\n", " ")
+    except (OSError, KeyError, IndexError, ValueError, AttributeError, ImportError) as error:
+        status = "error"
+        message = f"{type(error).__name__}: {error}"
+    return FileResult(str(path), status, time.perf_counter() - start, message)
+
+def run_pool(job, files, parameters, job_args=(), workers=None, chunk_size=None):
+    """Run a job on each file in a pool of processes
+
+    Args:
+        job (function): top level function job(path, root, *job_args) that returns a message,
+            or a (status, message) tuple. The worker's parameters are in the module's _parameters
+        files (list): (root, path) tuples as given by find_ship_files
+        parameters (parameters_loader.Parameters): sent once to each worker
+        job_args (tuple): additional arguments for the job, must be picklable
+        workers (int): amount of processes, None for as many as processors
+        chunk_size (int): if not None, job(files, *job_args) is given up to this amount of
+            (root, path) at once, shared between the workers, and returns a list of FileResult
+    Yields:
+        FileResult, in the order the files, or chunks of files, are finished
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=_init_worker,
+                                                initargs=(parameters,)) as executor:
+        if chunk_size is None:
+            futures = [executor.submit(_timed_job, job, path, root, job_args)
+                       for root, path in files]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+            return
+        #small enough chunks to give work to all the workers
+        chunk_size = max(1, min(chunk_size, -(-len(files)//(workers or os.cpu_count() or 1))))
+        futures = [executor.submit(job, files[start:start + chunk_size], *job_args)
+                   for start in range(0, len(files), chunk_size)]
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
+
+def report(results, out=sys.stdout, as_json=False):
+    """Print each result as it arrives, then the summary
+
+    Args:
+        results (iterable): FileResult
+        out (file-like): where to print
+        as_json (bool): print one JSON object per line, the summary being the last one
+    Returns:
+        dict {status: count}
+    """
+    start = time.perf_counter()
+    counts = collections.Counter()
+    busy_time = 0.0
+    for result in results:
+        counts[result.status] += 1
+        busy_time += result.seconds
+        if as_json:
+            print(json.dumps(result._asdict()), file=out, flush=True)
+        else:
+            print(f"{result.status:<8}{result.seconds*1000:9.1f} ms  {result.path}  "
+                  f"{_format_message(result.message)}", file=out, flush=True)
+    wall_time = time.perf_counter() - start
+    total = sum(counts.values())
+    if as_json:
+        print(json.dumps({"summary": {"files": total, "seconds": wall_time,
+                                      "busy_seconds": busy_time, **counts}}), file=out)
+        return counts
+    print(f"\n{total} files in {wall_time:.2f} s "
+          f"({total/wall_time if wall_time else 0:.1f} files/s, {busy_time:.2f} s of work)",
+          file=out)
+    print(", ".join(f"{status}: {counts[status]}" for status in ("ok", "invalid", "error")),
+          file=out)
+    return counts
+
+def _format_message(message):
+    """The message of a result on one line"""
+    if isinstance(message, str):
+        return message
+    if isinstance(message, dict):
+        return "; ".join(f"{name}: " + ", ".join(f"{key} {value}%" for key, value in values.items())
+                         for name, values in message.items())
+    return "; ".join(f"{issue['section']}: {issue['message']}" if issue["section"]
+                     else issue["message"] for issue in message)
+
+def make_arg_parser():
+    """Command line arguments"""
+    parser = argparse.ArgumentParser(description="Load, check and save all the ship files "
+                                                 "in folders, without the editor window")
+    parser.add_argument("folders", nargs="+",
+                        help="folders to search for ship files, like Save/Game1")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="amount of worker processes, default: one per processor")
+    parser.add_argument("-o", "--output", default=None,
+                        help="save to this folder instead of overwriting the files")
+    parser.add_argument("-c", "--check-only", action="store_true",
+                        help="only load the files, do not save anything")
+    parser.add_argument("-v", "--validate", action="store_true",
+                        help="report all the problems of each file, do not save anything")
+    parser.add_argument("-m", "--metrics", action="store_true",
+                        help="report the area, centroid, length and beam of the superstructures "
+                             "relative to the ship, do not save anything")
+    parser.add_argument("-j", "--json", action="store_true",
+                        help="print the results as JSON lines")
+    parser.add_argument("-t", "--transform", default=None,
+                        help="module:function called with each ShipData before saving")
+    parser.add_argument("--propagate-from", default=None, metavar="SHIP_FILE",
+                        help="give the superstructures and funnels of this ship to all the ships")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="with --propagate-from, only report what would change")
+    parser.add_argument("-p", "--pattern", default=sd.SHIP_FILE_PATTERN,
+                        help=f"glob pattern of the ship files, default: {sd.SHIP_FILE_PATTERN}")
+    return parser
+
+def main(argv=None):
+    """Parse the arguments, process the files and print the report
+
+    Returns:
+        the exit code: 0 if all files are ok, 1 if not
+    """
+    args = make_arg_parser().parse_args(argv)
+    logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.WARNING)
+
+    files = find_ship_files(args.folders, args.pattern)
+    if not files:
+        summary.warning("No ship file found in %s", ", ".join(args.folders))
+        return 1
+    if args.transform is not None:
+        #fail early, not once per file
+        resolve_transform(args.transform)
+
+    parameters = parameters_loader.Parameters("")
+    output = pathlib.Path(args.output).resolve() if args.output is not None else None
+    chunk_size = None
+    if args.validate:
+        job, job_args = validate_job, ()
+    elif args.metrics:
+        job, job_args, chunk_size = metrics_job, (), METRICS_CHUNK_SIZE
+    elif args.check_only:
+        job, job_args = check_job, ()
+    elif args.propagate_from is not None:
+        source_path = pathlib.Path(args.propagate_from).resolve()
+        try:
+            sections = load_ship(source_path, parameters).structures_and_funnels_sections()
+        except (sd.ShipFileInvalidException, OSError) as error:
+            summary.error("Could not read the ship to propagate: %s", error)
+            return 1
+        files = [(root, path) for root, path in files if path != source_path]
+        job, job_args = propagate_job, (sections, args.dry_run, output)
+    else:
+        job, job_args = resave_job, (output, args.transform)
+
+    counts = report(run_pool(job, files, parameters, job_args, args.workers, chunk_size),
+                    as_json=args.json)
+    return 0 if counts["ok"] == sum(counts.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Synthetic ship files and a benchmark of their loading and saving
+
+The generated ship files look like the game's: ship types and displacements from the
+lengths data file, turret layouts from the known turret positions, torpedo mounts, funnels,
+superstructures of up to STRUCTURE_POINTS_MAX points and a side picture, so they pass
+the validation of batch.py.
+The same seed always gives the same files, so the timings can be compared between versions.
+
+Example:
+    python benchmark.py --corpus ./bench_corpus --sizes 10 1000 100000
+"""
+import argparse
+import collections
+import concurrent.futures
+import configparser
+import math
+import pathlib
+import random
+import shutil
+import sys
+import tempfile
+import time
+import schemas
+import parameters_loader
+import model.shipdata as sd
+from model.structure import Structure, STRUCTURE_POINTS_MAX
+from model.turrets_torps import Turret
+from model.funnel import Funnel, funnels_as_ini_section
+from model.inifile import IniFile
+
+DEFAULT_SIZES = [10, 1000, 100000]
+DEFAULT_SEED = 1906
+#copied as the side picture of the ships, the benchmark does not look at them
+SIDE_PICTURE = pathlib.Path(__file__).with_name("start.png")
+
+#order of the timed stages in the report
+STAGES = ["read ini (configparser)", "read ini", "structures", "turrets", "load ShipData",
+          "as_ini_section", "write_as_ini", "write_as_ini unchanged"]
+
+def ship_file_name(index):
+    """Name of the index-th ship of the corpus, with all the ship file extensions"""
+    return f"ship{index:06d}.{index % 9 + 1}0d"
+
+def generate_ship(index, parameters, seed=DEFAULT_SEED):
+    """Make the content of a realistic ship file
+
+    Args:
+        index (int): number of the ship in the corpus, the same index gives the same ship
+        parameters (parameters_loader.Parameters): for the ship lengths
+        seed (int): seed of the whole corpus
+    Returns:
+        dict {section: {option: value}}
+    """
+    rng = random.Random(seed*1000003 + index)
+    ship_type = rng.choice(sorted(parameters.ships_hlengths))
+    tonnages = sorted(parameters.ships_hlengths[ship_type])
+    #the last tonnage is a catch-all, do not go too far above the one before
+    highest = tonnages[-2] if len(tonnages) >= 2 else tonnages[-1]
+    displacement = rng.randint(max(100, tonnages[0]//2), int(highest*1.2))
+    half_length = parameters.ship_dimensions.half_length(ship_type, displacement)
+
+    sections = collections.OrderedDict()
+    sections["Data"] = {"PictureName": f"{ship_type}_{index % 50}.png",
+                        "ShipType": ship_type,
+                        "Displacement": displacement,
+                        "Name": f"Synthetic {index}"}
+    sections["Guns"] = {"TurretStyle": rng.randint(0, 3),
+                        "Main": rng.randint(2, schemas.MIN_MAX_GUN_CALIBER)}
+
+    turret_positions = rng.sample(schemas.TURRETS, rng.randint(1, 6))
+    for number, pos in enumerate(turret_positions, start=1):
+        sections[f"Turret{number}"] = {"Pos": pos,
+                                       "Guns": rng.randint(1, schemas.MAX_GUNS_PER_TURRET)}
+    for number in range(1, rng.randint(0, 2) + 1):
+        sections[f"TorpedoMount{number}"] = {"Pos": rng.choice(schemas.TURRETS),
+                                             "Tubes": rng.randint(0, schemas.MAX_TORP_PER_MOUNT-1)}
+
+    for number in range(1, rng.randint(1, 4) + 1):
+        structure = Structure(f"Superstructure{number}", {})
+        structure.points = _random_outline(rng, half_length)
+        structure.fill = rng.random() < 0.8
+        sections[structure.name] = structure.as_ini_section()
+
+    funnels = {f"Funnel{number}": Funnel(oval=rng.random() < 0.5,
+                                         position=rng.randint(-half_length//3, half_length//3))
+               for number in range(1, rng.randint(1, 3) + 1)}
+    sections["Funnels"] = funnels_as_ini_section(funnels)
+    return sections
+
+def _random_outline(rng, half_length):
+    """A star-shaped polygon somewhere on the ship, in funnel coordinates
+
+    One point in each of count equal sectors around the center, away from the sector's
+    borders, so the outline never crosses itself and has no spike
+    """
+    count = rng.randint(3, STRUCTURE_POINTS_MAX)
+    center = (rng.uniform(-0.05, 0.05)*half_length, rng.uniform(-0.6, 0.6)*half_length)
+    size = rng.uniform(0.03, 0.12)*half_length
+    outline = []
+    for sector in range(count):
+        angle = 2*math.pi*(sector + rng.uniform(0.2, 0.8))/count
+        radius = size*rng.uniform(0.5, 1)
+        outline.append((center[0] + 0.4*radius*math.cos(angle),
+                        center[1] + radius*math.sin(angle)))
+    return outline
+
+def write_ship(path, sections):
+    """Write the sections like the game does: no spaces around the = sign"""
+    ini_file = IniFile()
+    for name, options in sections.items():
+        ini_file[name] = options
+    with open(path, "w", newline="") as file:
+        ini_file.write(file)
+
+def _generate_range(folder, start, stop, parameters, seed):
+    for index in range(start, stop):
+        path = pathlib.Path(folder).joinpath(ship_file_name(index))
+        if not path.exists():
+            sections = generate_ship(index, parameters, seed)
+            write_ship(path, sections)
+            picture = path.with_name(sections["Data"]["PictureName"])
+            if not picture.exists():
+                shutil.copyfile(SIDE_PICTURE, picture)
+    return stop - start
+
+def generate_corpus(folder, count, parameters, seed=DEFAULT_SEED, workers=None):
+    """Make sure the folder has the count first ships of the corpus
+
+    The existing files are kept, so a bigger corpus reuses a smaller one
+
+    Returns:
+        list of the paths of the count ships
+    """
+    folder = pathlib.Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    chunk = 2000
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_generate_range, folder, start, min(start + chunk, count),
+                                   parameters, seed)
+                   for start in range(0, count, chunk)]
+        for future in futures:
+            future.result()
+    return [folder.joinpath(ship_file_name(index)) for index in range(count)]
+
+def benchmark(paths, parameters, output_folder):
+    """Time the loading and saving stages on all the files, in this process
+
+    Args:
+        paths (list): ship files
+        parameters (parameters_loader.Parameters)
+        output_folder (pathlib.Path): where the files are saved
+    Returns:
+        dict {stage: total seconds}
+    """
+    timings = collections.defaultdict(float)
+    clock = time.perf_counter
+    for path in paths:
+        start = clock()
+        config_parser = configparser.ConfigParser()
+        config_parser.optionxform = str
+        with open(path) as file:
+            config_parser.read_file(file)
+        timings["read ini (configparser)"] += clock() - start
+
+        start = clock()
+        with open(path, newline="") as file:
+            parser = IniFile.read(file)
+        timings["read ini"] += clock() - start
+
+        start = clock()
+        for section, content in parser.items():
+            if "Superstructure" in section:
+                Structure(section, content)
+        timings["structures"] += clock() - start
+
+        start = clock()
+        turret_data = {parser[section]["Pos"]: parser[section].getint("Guns")
+                       for section in parser.sections() if "Turret" in section}
+        half_length = parameters.ship_dimensions.half_length(parser["Data"]["ShipType"],
+                                                             parser["Data"].getint("Displacement"))
+        for pos, guns in turret_data.items():
+            Turret(parser["Guns"].getint("Main"), pos, guns, half_length, turret_data, parameters)
+        timings["turrets"] += clock() - start
+
+        start = clock()
+        with open(path, newline="") as file:
+            ship_data = sd.ShipData(file, parameters)
+        timings["load ShipData"] += clock() - start
+
+        start = clock()
+        for structure in ship_data.structures:
+            structure.as_ini_section()
+        timings["as_ini_section"] += clock() - start
+
+        #everything edited: the worst case
+        ship_data.dirty_sections.update(structure.name for structure in ship_data.structures)
+        ship_data.dirty_sections.add("Funnels")
+        target = output_folder.joinpath(path.name)
+        start = clock()
+        ship_data.write_as_ini(file_path=target)
+        timings["write_as_ini"] += clock() - start
+
+        start = clock()
+        ship_data.write_as_ini(file_path=target)
+        timings["write_as_ini unchanged"] += clock() - start
+    return timings
+
+def report(count, timings, out=sys.stdout):
+    """Print the files per second of load and save, and the time per file of each stage"""
+    load = timings["load ShipData"]
+    save = timings["write_as_ini"]
+    print(f"{count} files: load {count/load if load else 0:.0f} files/s, "
+          f"save {count/save if save else 0:.0f} files/s", file=out)
+    for stage in STAGES:
+        print(f"    {stage:<24}{timings[stage]/count*1e6:10.1f} µs/file"
+              f"{timings[stage]:10.3f} s total", file=out)
+
+def make_arg_parser():
+    """Command line arguments"""
+    parser = argparse.ArgumentParser(description="Generate synthetic ship files and time "
+                                                 "their loading and saving")
+    parser.add_argument("--corpus", default="bench_corpus",
+                        help="folder of the generated ship files, reused between runs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="amounts of files to benchmark, default: "
+                             + " ".join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                        help="seed of the generated ships")
+    parser.add_argument("--generate-only", action="store_true",
+                        help="only generate the corpus")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="processes to generate the corpus, default: one per processor")
+    return parser
+
+def main(argv=None):
+    """Generate the corpus for the biggest size, then benchmark each size"""
+    args = make_arg_parser().parse_args(argv)
+    parameters = parameters_loader.Parameters("")
+    start = time.perf_counter()
+    paths = generate_corpus(args.corpus, max(args.sizes), parameters, args.seed, args.workers)
+    print(f"corpus of {len(paths)} files ready in {time.perf_counter() - start:.1f} s")
+    if args.generate_only:
+        return 0
+
+    for size in sorted(args.sizes):
+        output_folder = pathlib.Path(tempfile.mkdtemp(prefix="draftnought_bench_"))
+        try:
+            report(size, benchmark(paths[:size], parameters, output_folder))
+        finally:
+            shutil.rmtree(output_folder, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Fit lengths.json and turrets_positions.json to measured reference ships
+
+Each reference ship is a ship file with its measures next to it, in a JSON file named
+like the ship file with .json added, "Yamato.10d.json" for "Yamato.10d":
+
+    {"view": "top", "bow": [12, 240], "stern": [1590, 236], "scale": 0.31,
+     "turrets": {"A": [330, 238], "B": [420, 238], "X": [1250, 237]}}
+
+bow, stern and turrets are pixels of a picture of the ship, seen from the "top" or the "side".
+On a side picture, the turrets are only measured along the length.
+"half_length" in funnel coordinates, or "scale" in funnel coordinates per pixel,
+are needed to fit the lengths, the turret positions only need the pixels.
+The new data files are checked against the schemas and written to the output folder,
+the files of the data folder are not changed.
+
+Example:
+    python calibrate.py ./reference_ships --output ./calibrated
+"""
+import argparse
+import json
+import logging
+import pathlib
+import sys
+import jsonschema
+import schemas
+import parameters_loader
+import model.shipdata as sd
+import model.calibration
+from batch import find_ship_files
+
+summary = logging.getLogger("Summary")
+
+def collect_samples(files, parameters):
+    """Read the reference ships and their measures
+
+    Args:
+        files (list): (root, path) tuples as given by batch.find_ship_files
+        parameters (parameters_loader.Parameters)
+    Returns:
+        (list of LengthSample, list of TurretSample, list of (path, problem) for the
+         ships that could not be used)
+    """
+    length_samples = []
+    turret_samples = []
+    skipped = []
+    for _root, path in files:
+        measures_path = path.with_name(path.name + schemas.CALIBRATION_MEASURES_SUFFIX)
+        if not measures_path.exists():
+            skipped.append((path, "no measures"))
+            continue
+        try:
+            measures = model.calibration.read_measures(measures_path)
+            with open(path, newline="") as file:
+                ship_data = sd.ShipData(file, parameters)
+            length_sample, samples = model.calibration.ship_samples(ship_data, measures,
+                                                                     parameters)
+        except (OSError, json.JSONDecodeError, jsonschema.ValidationError,
+                sd.ShipFileInvalidException, KeyError, IndexError, ValueError) as error:
+            skipped.append((path, f"{type(error).__name__}: {str(error).splitlines()[0]}"))
+            continue
+        if length_sample is not None:
+            length_samples.append(length_sample)
+        turret_samples.extend(samples)
+    return length_samples, turret_samples, skipped
+
+def write_json(path, data, json_schema):
+    """Check the data against its schema and write it"""
+    jsonschema.validate(data, json_schema)
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2)
+
+def print_fits(title, fits, out=sys.stdout):
+    """Print the old and new values"""
+    print(f"\n{title}", file=out)
+    for fit in fits:
+        name = " ".join(str(part) for part in fit.key)
+        print(f"  {name:<16}{fit.samples:5} samples  {fit.old:>9} -> {fit.new:<9} "
+              f"rms {fit.rms:.3f}", file=out)
+
+def make_arg_parser():
+    """Command line arguments"""
+    parser = argparse.ArgumentParser(description="Fit the ship lengths and the turret positions "
+                                                 "data to measured reference ships")
+    parser.add_argument("folders", nargs="+", help="folders with the reference ships")
+    parser.add_argument("-o", "--output", default="calibrated",
+                        help="folder of the new data files, default: calibrated")
+    parser.add_argument("-p", "--pattern", default=sd.SHIP_FILE_PATTERN,
+                        help=f"glob pattern of the ship files, default: {sd.SHIP_FILE_PATTERN}")
+    return parser
+
+def main(argv=None):
+    """Fit the data, print what changed and write the new files
+
+    Returns:
+        the exit code: 0 if something could be fitted, 1 if not
+    """
+    args = make_arg_parser().parse_args(argv)
+    logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.WARNING)
+    parameters = parameters_loader.Parameters("")
+
+    length_samples, turret_samples, skipped = collect_samples(
+        find_ship_files(args.folders, args.pattern), parameters)
+    for path, problem in skipped:
+        print(f"skipped {path}: {problem}")
+    if not length_samples and not turret_samples:
+        summary.warning("No measured reference ship in %s", ", ".join(args.folders))
+        return 1
+
+    hlengths, length_fits, ignored = model.calibration.fit_lengths(length_samples,
+                                                                   parameters.ships_hlengths,
+                                                                   parameters.ship_dimensions)
+    positions, turret_fits = model.calibration.fit_turrets(turret_samples,
+                                                           parameters.turrets_positions)
+    for sample in ignored:
+        print(f"ignored the length of a {sample.ship_type} of {sample.displacement} t: "
+              "heavier than the last bucket")
+    print_fits("Half lengths (ship type, max displacement)", length_fits)
+    print_fits("Turret positions (turret, index, coordinate)", turret_fits)
+    for ship_type in model.calibration.unordered_buckets(hlengths):
+        print(f"warning: the {ship_type} half lengths do not grow with the displacement")
+
+    output = pathlib.Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    write_json(output.joinpath(pathlib.Path(schemas.HALF_LENGTHS_PATH).name),
+               model.calibration.lengths_as_json(hlengths), schemas.HALF_LENGTHS_SCHEMA)
+    write_json(output.joinpath(pathlib.Path(schemas.TURRETS_POSITION_PATH).name),
+               positions, schemas.TURRETS_POSITION_SCHEMA)
+    print(f"\nwritten to {output.resolve()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Check the turret rules data file
+
+The rules of turrets_rules.json were first an if/elif chain in rel_tur_or_torp_position.
+REFERENCE_CASES keeps the positions that chain gave, for the turrets of each "when" of the rules
+and for the same turrets less one. The rules themselves are checked too: the positions must
+exist, and a "when" must not include one of an earlier rule of the same turret, it would never
+be used.
+
+Example:
+    python check_turrets_rules.py
+"""
+import itertools
+import sys
+import parameters_loader
+from model.turrets_torps import TurretPositionResolver
+
+#{turret: {the other turrets of the ship: index of the position of the turret}}
+REFERENCE_CASES = {
+    "X": {"": 0, "W": 1, "V": 1, "R": 1, "C": 1},
+    "W": {"": 0, "X": 1, "V": 1, "B": 1},
+    "A": {"": 0, "V": 2, "WXY": 2, "CX": 2, "BRW": 2, "BRX": 2, "BRY": 2,
+          "X": 1, "W": 1, "XY": 1, "WY": 1, "WX": 1, "BC": 1, "BW": 1, "BR": 1, "RW": 1,
+          "RX": 1, "BX": 1, "B": 0, "C": 0, "R": 0, "RY": 0, "BY": 0},
+    "B": {"": 0, "V": 2, "W": 2, "CX": 2, "CY": 2, "ARX": 2, "ARY": 2,
+          "X": 1, "Y": 1, "C": 1, "R": 1, "RX": 1, "AX": 1, "AR": 1, "RY": 1, "AY": 1},
+    "Y": {"": 0, "WX": 3, "VW": 3, "V": 2, "W": 2, "ABC": 2, "ABR": 2,
+          "B": 1, "C": 1, "R": 1, "X": 1, "BC": 1, "AC": 1, "AB": 1, "BR": 1, "AR": 1},
+}
+
+def check_rules(turrets_positions, turrets_rules):
+    """Check that the rules can be used
+
+    Args:
+        turrets_positions (dict): as in turrets_positions.json
+        turrets_rules (dict): as in turrets_rules.json
+    Returns:
+        list of str, the problems
+    """
+    problems = []
+    for pos, rules in turrets_rules.items():
+        if pos not in turrets_positions:
+            problems.append(f"{pos}: no positions for this turret")
+            continue
+        earlier = []
+        for rule in rules:
+            if not 0 <= rule["position"] < len(turrets_positions[pos]["positions"]):
+                problems.append(f"{pos}: no position {rule['position']}")
+            for turrets in rule["when"]:
+                unknown = set(turrets) - set(turrets_positions)
+                if unknown:
+                    problems.append(f"{pos}: unknown turrets {sorted(unknown)}")
+                if any(turrets_before <= set(turrets) for turrets_before in earlier):
+                    problems.append(f"{pos}: {turrets} is never used, an earlier rule matches")
+            earlier.extend(set(turrets) for turrets in rule["when"])
+    return problems
+
+def check(parameters):
+    """Check the rules, and compare them with the reference cases
+
+    Args:
+        parameters (parameters_loader.Parameters)
+    Returns:
+        list of str, the problems and the differences
+    """
+    problems = check_rules(parameters.turrets_positions, parameters.turrets_rules)
+    resolver = TurretPositionResolver(parameters.turrets_positions, parameters.turrets_rules)
+    for pos, cases in REFERENCE_CASES.items():
+        for others, expected in cases.items():
+            found = resolver.position_index(pos, frozenset(others) | {pos})
+            if found != expected:
+                problems.append(f"{pos} with {others or 'no other turret'}: position {found}, "
+                                f"expected {expected}")
+    #the kept layouts must give the same positions as fresh ones
+    named = sorted({turret for rules in parameters.turrets_rules.values()
+                    for rule in rules for turrets in rule["when"] for turret in turrets}
+                   | set(parameters.turrets_rules))
+    for size in range(len(named) + 1):
+        for layout in itertools.combinations(named, size):
+            resolved = resolver.layout_positions(layout)
+            if resolved != resolver.layout_positions(set(layout)) or resolved != {
+                    pos: parameters.turrets_positions[pos]["positions"][
+                        resolver.position_index(pos, frozenset(layout))]
+                    for pos in layout if pos in parameters.turrets_positions}:
+                problems.append(f"positions of {sorted(layout)} differ")
+    return problems
+
+def main():
+    """Check the rules of the data folder and print the problems
+
+    Returns:
+        the exit code, 1 if there is a problem
+    """
+    problems = check(parameters_loader.Parameters(""))
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problems in the turret rules")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,16 +4,25 @@ Builds the main window menu bar and associated keyboard shortcuts
 Manages root functions: load program config, load file, save file.
 """
 import tkinter as tk
-from tkinter import filedialog, Text
+from tkinter import filedialog, messagebox, Text
 from tkinter import ttk
 import logging
 import logging.handlers
+import multiprocessing
 import pathlib
+import queue
+import sqlite3
+import threading
 import appdirs
-from window import topview, structeditor, funnelseditor, sideview
+from window import topview, structeditor, funnelseditor, sideview, indexdialog
 from window.framework import CommandStack
 import model.shipdata as sd
+import model.metrics
+from model.shipcache import ShipCache
+from model.shipindex import ShipIndex
+from model.filewatcher import FileWatcher
 import parameters_loader
+import batch
 
 summary = logging.getLogger("Summary")
 summary.setLevel(logging.DEBUG)
@@ -31,6 +40,11 @@ _MAIN_ROW = 0
 
 _LOG_ROW = _MAIN_ROW +1
 
+#how often the changes to the current ship file are checked, in ms
+_WATCH_POLL_MS = 500
+#how often the results of the background jobs are checked, in ms
+_JOBS_POLL_MS = 100
+
 class MainWindow(tk.Tk):
     """Base class for the whole UI"""
     def __init__(self):
@@ -39,6 +53,7 @@ class MainWindow(tk.Tk):
         self.iconbitmap('icon.ico')
         self.resizable(False, False)
         self.command_stack = CommandStack()
+        self._ship_cache = ShipCache()
 
         logging_frame = tk.Frame(self)
         log_scroll = tk.Scrollbar(logging_frame)
@@ -59,6 +74,10 @@ class MainWindow(tk.Tk):
 
         filemenu = tk.Menu(menubar, tearoff=0)
         filemenu.add_command(label='Open File', command=self.do_load, accelerator="Ctrl+O")
+        filemenu.add_command(label='Open from index', command=self.do_open_from_index,
+                             accelerator="Ctrl+F")
+        filemenu.add_separator()
+        filemenu.add_command(label='Propagate to...', command=self.do_propagate)
         filemenu.add_separator()
         filemenu.add_command(label='Save as', command=self.do_save_as, accelerator="Ctrl+Shift+S")
         filemenu.add_command(label='Save', command=self.do_save, accelerator="Ctrl+S")
@@ -72,6 +91,10 @@ class MainWindow(tk.Tk):
         self.grid_var.set(int(self.parameters.grid))
         self.grid_var.trace_add("write", self._set_grid)
         viewmenu.add_checkbutton(label="Grid", variable=self.grid_var)
+        self.watch_var = tk.IntVar()
+        self.watch_var.set(1)
+        viewmenu.add_checkbutton(label="Reload file when changed by the game",
+                                 variable=self.watch_var)
 
         menubar.add_cascade(label='File', menu=filemenu)
         menubar.add_cascade(label='Edit', menu=editmenu)
@@ -79,6 +102,7 @@ class MainWindow(tk.Tk):
 
         self.bind("<Control-s>", self.do_save)
         self.bind("<Control-o>", self.do_load)
+        self.bind("<Control-f>", self.do_open_from_index)
         self.bind("<Control-S>", self.do_save_as_keyboard)
         self.bind("<Control-z>", self.do_undo)
         self.bind("<Control-y>", self.do_redo)
@@ -86,6 +110,9 @@ class MainWindow(tk.Tk):
         self.center_frame = ttk.Button(self, text="Load ship file", command=self.do_load)
         self.center_frame.grid(row=_MAIN_ROW)
 
+        self._watcher = FileWatcher()
+        self.after(_WATCH_POLL_MS, self._check_file_changes)
+
         try:
             with open(self.parameters.last_file_path) as file:
                 self.load(file.name)
@@ -97,6 +124,68 @@ class MainWindow(tk.Tk):
         if isinstance(self.center_frame, ShipEditor):
             self.center_frame.set_grid(bool(self.grid_var.get()))
 
+    def _check_file_changes(self):
+        """Called from the Tk loop: react to the changes of the current file and its siblings"""
+        try:
+            changed = self._watcher.changes()
+            if self.watch_var.get() and isinstance(self.center_frame, ShipEditor):
+                for path in changed:
+                    if path == self._watcher.path:
+                        self._on_file_changed(path)
+                    else:
+                        summary.debug("%s was modified on disk", path.name)
+        finally:
+            #not before: no new check while a dialog waits for the user
+            self.after(_WATCH_POLL_MS, self._check_file_changes)
+
+    def _on_file_changed(self, path):
+        """The current file was modified by another program, probably the game
+
+        Without unsaved edits, the changes are merged or the file is loaded again.
+        With unsaved edits, the user chooses between reloading, merging or keeping their version
+        """
+        ship_data = self.current_ship_data
+        try:
+            with open(path, newline="") as file:
+                changes = ship_data.read_changes(file)
+        except (OSError, sd.ShipFileInvalidException) as error:
+            #probably still being written, there will be another change
+            details.warning("Could not read the modified file %s\n%s", path, error)
+            return
+        if not changes.sections:
+            #same content, like after our own save
+            return
+
+        if not ship_data.dirty_sections:
+            action = "reload" if changes.reload_needed else "merge"
+        elif changes.reload_needed:
+            answer = messagebox.askyesno(
+                "File changed on disk",
+                f"{path.name} was modified by another program and you have unsaved edits.\n\n"
+                "Yes: load the new version, your edits are lost\n"
+                "No: keep your version, it will replace the new one when you save")
+            action = "reload" if answer else "keep"
+        else:
+            answer = messagebox.askyesnocancel(
+                "File changed on disk",
+                f"{path.name} was modified by another program and you have unsaved edits.\n\n"
+                "Yes: load the new version, your edits are lost\n"
+                "No: merge the new version in the parts you did not edit\n"
+                "Cancel: keep your version, it will replace the new one when you save")
+            action = {True: "reload", False: "merge", None: "keep"}[answer]
+
+        if action == "reload":
+            summary.info("%s was modified on disk, loading it again", path.name)
+            self.load(str(path))
+        elif action == "merge":
+            merged = ship_data.merge_changes(changes, keep_edited=True)
+            #the commands might refer to points that do not exist anymore
+            self.command_stack.clear()
+            summary.info("%s was modified on disk, updated: %s", path.name,
+                         ", ".join(sorted(merged)))
+            if changes.conflicts:
+                summary.warning("Kept your edits of: %s", ", ".join(sorted(changes.conflicts)))
+
     def do_undo(self, *_args):
         """undo last command, or deeper in the undoing stack"""
         self.command_stack.undo()
@@ -107,13 +196,97 @@ class MainWindow(tk.Tk):
 
     def do_load(self, *_args):
         """React to keyboard shortcut"""
-        path = filedialog.askopenfilename(filetypes=(("ship files", "*.?0d"),
+        path = filedialog.askopenfilename(filetypes=(("ship files", sd.SHIP_FILE_PATTERN),
                                                      ("all files", "*.*")))
         if path == "":
             return
         else:
             self.load(path)
 
+    def do_open_from_index(self, *_args):
+        """Open the dialog to search the index of all ship files"""
+        try:
+            ship_index = ShipIndex()
+        except (sqlite3.Error, OSError) as error:
+            summary.error("Could not open the ship index:\n%s", error)
+            details.error("Could not open the ship index:\n%s", error)
+            return
+        indexdialog.IndexDialog(self, ship_index, self.parameters, self.load)
+
+    def do_propagate(self, *_args):
+        """Give the superstructures and funnels of the current ship to other ship files
+
+        The files are processed in parallel worker processes.
+        A dry run first reports what would change, then the user confirms
+        """
+        if not isinstance(self.center_frame, ShipEditor):
+            return
+        current_path = pathlib.Path(self.parameters.current_file_path).resolve()
+        paths = filedialog.askopenfilenames(title="Propagate superstructures and funnels to",
+                                            initialdir=current_path.parent,
+                                            filetypes=(("ship files", sd.SHIP_FILE_PATTERN),
+                                                       ("all files", "*.*")))
+        files = [(path.parent, path) for path in (pathlib.Path(p).resolve() for p in paths)
+                 if path != current_path]
+        if not files:
+            return
+        sections = self.current_ship_data.structures_and_funnels_sections()
+
+        def confirm(results):
+            to_change = [(path.parent, path) for path in
+                         (pathlib.Path(result.path) for result in results
+                          if result.status == "ok" and result.message != "already the same")]
+            if not to_change:
+                summary.info("Nothing to propagate")
+            elif messagebox.askyesno("Propagate",
+                                     f"Change the superstructures and funnels of "
+                                     f"{len(to_change)} files?"):
+                self._run_jobs(batch.propagate_job, to_change, (sections, False, None),
+                               lambda _results: summary.info("Propagation done"))
+
+        summary.info("Checking %s files...", len(files))
+        self._run_jobs(batch.propagate_job, files, (sections, True, None), confirm)
+
+    def _run_jobs(self, job, files, job_args, on_done):
+        """Run a batch job on files in worker processes, without blocking the Tk loop
+
+        Each result is logged as it arrives
+
+        Args:
+            job, files, job_args: see batch.run_pool
+            on_done (function): called from the Tk loop with the list of batch.FileResult
+        """
+        results = queue.Queue()
+        parameters = self.parameters
+
+        def work():
+            try:
+                for result in batch.run_pool(job, files, parameters, job_args):
+                    results.put(result)
+            except Exception as error:
+                details.error("Batch job failed:\n%s", error)
+            finally:
+                results.put(None)
+
+        finished = []
+        def poll():
+            try:
+                while True:
+                    result = results.get_nowait()
+                    if result is None:
+                        on_done(finished)
+                        return
+                    finished.append(result)
+                    if result.status == "ok":
+                        summary.info("%s: %s", pathlib.Path(result.path).name, result.message)
+                    else:
+                        summary.error("%s: %s", pathlib.Path(result.path).name, result.message)
+            except queue.Empty:
+                self.after(_JOBS_POLL_MS, poll)
+
+        threading.Thread(target=work, daemon=True).start()
+        self.after(_JOBS_POLL_MS, poll)
+
     def do_save_as_keyboard(self, *_args):
         """React to keyboard shortcut"""
         self.do_save_as()
@@ -134,8 +307,7 @@ class MainWindow(tk.Tk):
         old_parameters = self.parameters
         self.parameters = parameters_loader.Parameters(path)
         try:
-            with open(path) as file:
-                self.current_ship_data = sd.ShipData(file, self.parameters)
+            self.current_ship_data = self._ship_cache.load(path, self.parameters)
         except sd.ShipFileInvalidException as error:
             details.error("The file is not correctly formatted to be a ship file:\n%s\n%s",
                           path, error)
@@ -145,6 +317,9 @@ class MainWindow(tk.Tk):
             return
 
         summary.info("loading successful!")
+        #decode the side picture while the editor is built
+        if self.current_ship_data.side_pict is not None:
+            self.current_ship_data.side_pict.start()
         self.center_frame.destroy()
         #reset the command stack
         new_command_stack = CommandStack()
@@ -161,6 +336,7 @@ class MainWindow(tk.Tk):
         self.command_stack = new_command_stack
         self.grid_var.set(int(self.parameters.grid))
         self.winfo_toplevel().title(pathlib.Path(path).name)
+        self._watcher.watch(path)
 
     def do_save_as(self, path=None):
         """Save the current file, path choosable
@@ -176,28 +352,26 @@ class MainWindow(tk.Tk):
             if not current_file_path:
                 return
             extension = pathlib.Path(current_file_path).suffix
-            file = filedialog.asksaveasfile(defaultextension=extension,
-                                            initialdir=pathlib.Path(current_file_path).parent,
-                                            initialfile=pathlib.Path(current_file_path).name,
-                                            filetypes=(("ship files", extension),
-                                                       ("all files", "*.*")))
-            if file is not None:
-                summary.debug("saving file to %s", file.name)
-                self.current_ship_data.write_as_ini(file_object=file)
-                file.close()
-                self.parameters.write_app_param(file.name)
-        elif path:
+            path = filedialog.asksaveasfilename(defaultextension=extension,
+                                                initialdir=pathlib.Path(current_file_path).parent,
+                                                initialfile=pathlib.Path(current_file_path).name,
+                                                filetypes=(("ship files", extension),
+                                                           ("all files", "*.*")))
+        if path:
             summary.debug("saving file to %s", path)
             try:
-                with open(path, "w") as file:
-                    self.current_ship_data.write_as_ini(file_object=file)
+                written = self.current_ship_data.write_as_ini(file_path=path)
             except OSError as error:
                 summary.error("Could not save file:\n%s", error)
                 details.error("Could not save file:\n%s", error)
                 return
 
-            summary.info("save successful!")
-            self.parameters.write_app_param(file.name)
+            self._watcher.watch(path)
+            if written:
+                summary.info("save successful!")
+            else:
+                summary.info("no change to save")
+            self.parameters.write_app_param(path)
 
 class ShipEditor(tk.Frame):
     """class for the display of the whole editor
@@ -219,9 +393,20 @@ class ShipEditor(tk.Frame):
             funnels_editors.append(funnel_editor)
         st_editors = []
         for index, structure in enumerate(ship_data.structures):
-            new_st_display = structeditor.StructEditor(self, structure, command_stack)
+            new_st_display = structeditor.StructEditor(self, structure, command_stack,
+                                                       ship_data.structures,
+                                                       ship_data.half_length)
             new_st_display.grid(row=(index//2)+3, column=index%2)
+            new_st_display.subscribe(self._on_structure_edited)
             st_editors.append(new_st_display)
+        self._st_editors = st_editors
+        self._half_length = ship_data.half_length
+        #area and balance of all the superstructures together
+        self._summary_var = tk.StringVar()
+        tk.Label(self, textvariable=self._summary_var, justify=tk.LEFT).grid(row=0, column=0,
+                                                                             columnspan=2,
+                                                                             sticky=tk.S+tk.W)
+        self._on_structure_edited()
 
         views = tk.Frame(self)
         self._top_view = topview.TopView(views, ship_data, st_editors,
@@ -240,6 +425,12 @@ class ShipEditor(tk.Frame):
 
         st_editors[0].focus_set()
 
+    def _on_structure_edited(self, *_args):
+        """Update the summary of all the superstructures"""
+        ship_metrics = model.metrics.combine(editor.metrics.metrics for editor in self._st_editors)
+        self._summary_var.set("All superstructures: "
+                              + structeditor.format_metrics(ship_metrics, self._half_length))
+
     def set_grid(self, grid_state):
         """set the grid for both top and side view according to grid_state"""
         self._side_view.refresh_grid(grid_state)
@@ -271,4 +462,6 @@ class LogToWidget(logging.Handler):
         self._text_widget.see(tk.END)
 
 if __name__ == "__main__":
+    #the batch jobs run in worker processes, also from the compiled executable
+    multiprocessing.freeze_support()
     MainWindow().mainloop()
@@ -0,0 +1,216 @@
+"""Fit the ship lengths and the turret positions data to measured reference ships
+
+A reference ship is a ship file and the pixel coordinates of its bow, stern and turrets
+in a top or side picture of the ship. The positions are made relative to the bow and stern,
+like the ones of turrets_positions.json: -1 at the bow, +1 at the stern, x to starboard.
+The pixels give no size: the half length of a ship is only known if its measures give it,
+or give the funnel coordinates per pixel.
+
+Both data files hold constants: a half length per tonnage bucket, a position per turret and
+index. The least-squares fit of a constant to samples is their mean, computed for all the
+buckets or positions at once with numpy if it is installed.
+"""
+import collections
+import json
+import jsonschema
+import schemas
+from model.turrets_torps import Turret
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#half_length in funnel coordinates of a ship of this type and displacement
+LengthSample = collections.namedtuple("LengthSample", ["ship_type", "displacement", "half_length"])
+#position of the turret, at this index of its possible positions, relative to the half length
+#x is None if the turret was measured on a side picture
+TurretSample = collections.namedtuple("TurretSample", ["pos", "index", "x", "y"])
+
+#fitted value of a length bucket or of a coordinate of a turret position
+#rms is the root mean square of the samples' distance to the new value
+Fit = collections.namedtuple("Fit", ["key", "samples", "old", "new", "rms"])
+
+def read_measures(path):
+    """Read and check the measures of a reference ship
+
+    Args:
+        path (str): path to the JSON file, see schemas.CALIBRATION_MEASURES_SCHEMA
+    Returns:
+        dict
+    Raises:
+        OSError, json.JSONDecodeError, jsonschema.ValidationError
+    """
+    with open(path) as file:
+        measures = json.load(file)
+    jsonschema.validate(measures, schemas.CALIBRATION_MEASURES_SCHEMA)
+    return measures
+
+def relative_position(point, bow, stern):
+    """Position of a point of a picture relative to the ship
+
+    Works whatever the orientation of the ship in the picture, as long as it is not mirrored:
+    a ship seen from the top with the bow on the left has its starboard up.
+
+    Args:
+        point, bow, stern (x, y): in pixels, y down
+    Returns:
+        (x, y) relative to the half length, y from -1 at the bow to +1 at the stern
+    """
+    axis = (stern[0] - bow[0], stern[1] - bow[1])
+    offset = (point[0] - bow[0], point[1] - bow[1])
+    length_squared = axis[0]*axis[0] + axis[1]*axis[1]
+    along = (offset[0]*axis[0] + offset[1]*axis[1])/length_squared
+    across = (axis[0]*offset[1] - axis[1]*offset[0])/length_squared
+    return (-2*across, 2*along - 1)
+
+def measured_half_length(measures):
+    """Half length in funnel coordinates given by the measures, None if they do not give it"""
+    if "half_length" in measures:
+        return measures["half_length"]
+    if "scale" in measures:
+        bow, stern = measures["bow"], measures["stern"]
+        pixels = ((stern[0] - bow[0])**2 + (stern[1] - bow[1])**2)**0.5
+        return pixels*measures["scale"]/2
+    return None
+
+def ship_samples(ship_data, measures, parameters):
+    """The samples given by a reference ship
+
+    Args:
+        ship_data (model.shipdata.ShipData): the reference ship
+        measures (dict): its measures, as given by read_measures
+        parameters (parameters_loader.Parameters)
+    Returns:
+        (LengthSample or None, list of TurretSample)
+    Raises:
+        ValueError if a measured turret is not on the ship
+    """
+    half_length = measured_half_length(measures)
+    length_sample = (None if half_length is None
+                     else LengthSample(ship_data.ship_type, ship_data.displacement, half_length))
+
+    layout = frozenset(part.pos for part in ship_data.turrets_torps if isinstance(part, Turret))
+    turret_samples = []
+    for pos, point in measures.get("turrets", {}).items():
+        if pos not in layout:
+            raise ValueError(f"turret {pos} is measured but is not on the ship")
+        index = parameters.turrets_resolver.position_index(pos, layout)
+        x, y = relative_position(point, measures["bow"], measures["stern"])
+        turret_samples.append(TurretSample(pos, index, x if measures["view"] == "top" else None, y))
+    return length_sample, turret_samples
+
+def fit_lengths(samples, ships_hlengths, ship_dimensions):
+    """Fit the half length of the buckets to the measured ships
+
+    The buckets without samples keep their value
+
+    Args:
+        samples (list): LengthSample
+        ships_hlengths (dict): {ship type: {max displacement: half length}}, as in Parameters
+        ship_dimensions (model.dimensions.ShipDimensions): the same lengths, as in Parameters,
+            to find the bucket of each ship as ShipData does
+    Returns:
+        (the new ships_hlengths, list of Fit with (ship type, max displacement) keys,
+         list of the samples above the last bucket of their ship type)
+    """
+    #{key: group}
+    group_of = {}
+    groups = []
+    values = []
+    ignored = []
+    for sample in samples:
+        bucket = ship_dimensions.bucket(sample.ship_type, sample.displacement)
+        if bucket is None:
+            ignored.append(sample)
+            continue
+        groups.append(group_of.setdefault((sample.ship_type, bucket), len(group_of)))
+        values.append(sample.half_length)
+
+    keys = list(group_of)
+    means, rms, counts = group_means(groups, values, len(keys))
+    new_hlengths = {ship_type: dict(lengths) for ship_type, lengths in ships_hlengths.items()}
+    fits = []
+    for rank, (ship_type, bucket) in enumerate(keys):
+        new_hlengths[ship_type][bucket] = round(means[rank])
+        fits.append(Fit((ship_type, bucket), counts[rank], ships_hlengths[ship_type][bucket],
+                        new_hlengths[ship_type][bucket], rms[rank]))
+    return new_hlengths, sorted(fits), ignored
+
+def fit_turrets(samples, turrets_positions):
+    """Fit the turret positions to the measured turrets
+
+    x is only fitted to the top pictures, y to all. The positions without samples keep
+    their value
+
+    Args:
+        samples (list): TurretSample
+        turrets_positions (dict): as in Parameters
+    Returns:
+        (the new turrets_positions, list of Fit with (turret, index, "x" or "y") keys)
+    """
+    new_positions = {pos: {"positions": [list(position) for position in data["positions"]],
+                           "to_bow": data["to_bow"]}
+                     for pos, data in turrets_positions.items()}
+    fits = []
+    for coordinate, rank in (("x", 0), ("y", 1)):
+        group_of = {}
+        groups = []
+        values = []
+        for sample in samples:
+            value = getattr(sample, coordinate)
+            if value is None:
+                continue
+            groups.append(group_of.setdefault((sample.pos, sample.index, coordinate),
+                                              len(group_of)))
+            values.append(value)
+        keys = list(group_of)
+        means, rms, counts = group_means(groups, values, len(keys))
+        for group, key in enumerate(keys):
+            position = new_positions[key[0]]["positions"][key[1]]
+            old = position[rank]
+            position[rank] = round(means[group], 3)
+            fits.append(Fit(key, counts[group], old, position[rank], rms[group]))
+    return new_positions, sorted(fits)
+
+def group_means(groups, values, size):
+    """Mean, root mean square deviation and count of the values of each group
+
+    Args:
+        groups (list[int]): the group of each value, from 0 to size-1
+        values (list[number])
+        size (int): amount of groups
+    Returns:
+        (list of means, list of rms deviations, list of counts), one per group
+    """
+    if numpy is not None:
+        groups = numpy.array(groups, dtype=numpy.int64)
+        values = numpy.array(values, dtype=float)
+        counts = numpy.bincount(groups, minlength=size)
+        means = numpy.bincount(groups, values, size)/numpy.maximum(counts, 1)
+        deviations = values - means[groups]
+        rms = numpy.sqrt(numpy.bincount(groups, deviations*deviations, size)
+                         /numpy.maximum(counts, 1))
+        return means.tolist(), rms.tolist(), counts.tolist()
+    counts = [0]*size
+    sums = [0.0]*size
+    for group, value in zip(groups, values):
+        counts[group] += 1
+        sums[group] += value
+    means = [total/count if count else 0.0 for total, count in zip(sums, counts)]
+    squares = [0.0]*size
+    for group, value in zip(groups, values):
+        squares[group] += (value - means[group])**2
+    rms = [(square/count)**0.5 if count else 0.0 for square, count in zip(squares, counts)]
+    return means, rms, counts
+
+def lengths_as_json(ships_hlengths):
+    """ships_hlengths as in lengths.json, with string keys"""
+    return {ship_type: {str(key): value for key, value in lengths.items()}
+            for ship_type, lengths in ships_hlengths.items()}
+
+def unordered_buckets(ships_hlengths):
+    """The ship types whose half lengths do not grow with the displacement"""
+    return [ship_type for ship_type, lengths in ships_hlengths.items()
+            if any(shorter > longer for shorter, longer
+                   in zip(list(lengths.values()), list(lengths.values())[1:]))]
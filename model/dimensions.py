@@ -0,0 +1,100 @@
+"""Half length of the ships from their type and displacement
+
+lengths.json gives, for each ship type, half lengths up to some displacements.
+A ship gets the half length of the first displacement above its own, as in the game:
+the length grows by steps. Heavier ships than the last displacement get the last half length.
+
+The half lengths can also be interpolated: each step starts at the displacement where the
+step before ends, and the interpolated length goes straight from the start of a step
+to the start of the next one. Both give the same length at the start of each step.
+Below the first displacement and on the last step, the length is the same for all ships.
+"""
+import bisect
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class ShipDimensions:
+    """The half lengths of all the ship types, sorted once for all the ships
+
+    Args:
+        ships_hlengths (dict): {ship type: {max displacement: half length}}, as in Parameters
+    """
+    def __init__(self, ships_hlengths):
+        #{ship type: (max displacements sorted, their half lengths)}
+        self._steps = {}
+        #the same as numpy arrays, for the queries of many displacements
+        self._arrays = {}
+        for ship_type, lengths in ships_hlengths.items():
+            displacements = sorted(lengths)
+            self._steps[ship_type] = (displacements, [lengths[key] for key in displacements])
+            if numpy is not None:
+                self._arrays[ship_type] = (numpy.array(displacements, dtype=float),
+                                           numpy.array(self._steps[ship_type][1], dtype=float))
+
+    def half_length(self, ship_type, displacement, interpolate=False):
+        """Half length of a ship
+
+        Args:
+            ship_type (str): like "BC", "DD"...
+            displacement (number): in tons
+            interpolate (bool): False for the steps of the game
+        Returns:
+            the half length in funnel coordinates
+        Raises:
+            KeyError if there are no lengths for the ship type
+        """
+        displacements, lengths = self._steps[ship_type]
+        step = bisect.bisect_right(displacements, displacement)
+        if step >= len(lengths):
+            return lengths[-1]
+        if not interpolate or step == 0 or step == len(lengths) - 1:
+            return lengths[step]
+        start, end = displacements[step - 1], displacements[step]
+        return (lengths[step]
+                + (lengths[step + 1] - lengths[step])*(displacement - start)/(end - start))
+
+    def bucket(self, ship_type, displacement):
+        """The max displacement of the step of a ship, its key in lengths.json
+
+        Args:
+            ship_type (str): like "BC", "DD"...
+            displacement (number): in tons
+        Returns:
+            the smallest max displacement above the displacement, None if there is none
+        Raises:
+            KeyError if there are no lengths for the ship type
+        """
+        displacements = self._steps[ship_type][0]
+        step = bisect.bisect_right(displacements, displacement)
+        return displacements[step] if step < len(displacements) else None
+
+    def half_lengths(self, ship_type, displacements, interpolate=False):
+        """Half lengths of many ships of the same type at once, with numpy
+
+        Falls back to half_length() for each ship if numpy is not installed.
+
+        Args:
+            ship_type (str): like "BC", "DD"...
+            displacements (iterable): in tons
+            interpolate (bool): False for the steps of the game
+        Returns:
+            list of half lengths, one per displacement
+        Raises:
+            KeyError if there are no lengths for the ship type
+        """
+        if numpy is None:
+            return [self.half_length(ship_type, displacement, interpolate)
+                    for displacement in displacements]
+        steps_displacements, steps_lengths = self._arrays[ship_type]
+        displacements = numpy.asarray(list(displacements), dtype=float)
+        if not interpolate or len(steps_lengths) < 2:
+            steps = numpy.searchsorted(steps_displacements, displacements, side="right")
+            lengths = self._steps[ship_type][1]
+            return [lengths[step] for step in numpy.minimum(steps, len(lengths) - 1).tolist()]
+        #from the start of each step, the end of the one before, to the start of the next one
+        interpolated = numpy.interp(displacements, steps_displacements[:-1], steps_lengths[1:])
+        return numpy.where(displacements < steps_displacements[0], steps_lengths[0],
+                           interpolated).tolist()
@@ -0,0 +1,102 @@
+"""Polls a ship file and its sibling ship files for changes made by other programs
+
+The polling runs in a background thread, the changes are collected until asked for,
+so the user interface only has to check them from its own loop.
+"""
+import logging
+import pathlib
+import threading
+import model.shipdata as sd
+
+details = logging.getLogger("Details")
+
+class FileWatcher:
+    """Watch a file and the files matching a pattern in the same folder
+
+    Args:
+        interval (number): time between two polls, in seconds
+        pattern (str): glob pattern of the sibling files to watch
+    """
+    def __init__(self, interval=1.0, pattern=sd.SHIP_FILE_PATTERN):
+        self._interval = interval
+        self._pattern = pattern
+        self._lock = threading.Lock()
+        self._path = None
+        self._stamps = {}
+        self._changed = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def path(self):
+        """The watched file, None if none"""
+        return self._path
+
+    def watch(self, path):
+        """Watch a new file and its siblings instead of the previous ones
+
+        The changes not yet collected for the previous file are dropped
+
+        Args:
+            path (str): path to the file
+        """
+        path = pathlib.Path(path).resolve()
+        stamps = self._scan(path)
+        with self._lock:
+            self._path = path
+            self._stamps = stamps
+            self._changed = []
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def changes(self):
+        """The files that were modified, created or deleted since the last call
+
+        Returns:
+            list of pathlib.Path, the watched file first if it changed
+        """
+        with self._lock:
+            changed, self._changed = self._changed, []
+        changed.sort(key=lambda path: path != self._path)
+        return changed
+
+    def stop(self):
+        """Stop the polling thread"""
+        self._stop.set()
+
+    def _scan(self, path):
+        """Modification time and size of the file and its siblings
+
+        Returns:
+            dict {pathlib.Path: (mtime, size)}
+        """
+        stamps = {}
+        try:
+            siblings = list(path.parent.glob(self._pattern))
+        except OSError as error:
+            details.warning("Could not list the folder %s\n%s", path.parent, error)
+            siblings = []
+        for file_path in set(siblings) | {path}:
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            stamps[file_path.resolve()] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def _run(self):
+        """Polling loop of the background thread"""
+        while not self._stop.wait(self._interval):
+            with self._lock:
+                path = self._path
+            stamps = self._scan(path)
+            with self._lock:
+                if path != self._path:
+                    #watch() was called during the scan
+                    continue
+                for file_path in set(stamps) | set(self._stamps):
+                    if (stamps.get(file_path) != self._stamps.get(file_path)
+                            and file_path not in self._changed):
+                        self._changed.append(file_path)
+                self._stamps = stamps
@@ -1,6 +1,14 @@
 """docstring"""
+from math import sin, cos, pi
 from window.framework import Observable, Command
 
+#half width of the funnels, relative to the half length of the ship
+HALF_WIDTH_TO_HALF_LENGTH = 0.028
+#the oval funnels are longer by this factor
+OVAL_STRETCH = 1.38
+#points of the funnel's outline, for the computations on its footprint
+_OUTLINE_POINTS = 16
+
 class Funnel(Observable):
     """Container for the data needed to draw a funnel
 
@@ -39,6 +47,22 @@ class Funnel(Observable):
             self._position = value
             self._notify("set_position", {"position":value})
 
+    def outline(self, half_length):
+        """The footprint of the funnel, as a polygon in funnel coordinates
+
+        Args:
+            half_length (number): the half length of the ship, the funnel's size depends on it
+        Returns:
+            list of (x, y) points, empty if the funnel is not on the ship
+        """
+        if self._position == 0:
+            return []
+        half_width = half_length*HALF_WIDTH_TO_HALF_LENGTH
+        half_long = half_width*OVAL_STRETCH if self._oval else half_width
+        return [(half_width*cos(2*pi*index/_OUTLINE_POINTS),
+                 self._position + half_long*sin(2*pi*index/_OUTLINE_POINTS))
+                for index in range(_OUTLINE_POINTS)]
+
 class MoveFunnel(Command):
     """Moves a funnel to a given position
 
@@ -0,0 +1,297 @@
+"""Conversions between the ship file's coordinates and the funnel coordinates
+
+The superstructures' points are stored in the ship file as an angle and a distance,
+and edited as x, y in funnel coordinates: x to starboard, y to the bow.
+snap_points gives the nearest points that the file can store, with their angles and distances,
+so a structure shows exactly what will be saved.
+"""
+import heapq
+from math import sin, cos, atan2, pi, hypot, inf
+import model.shipdata as sd
+
+def rtw_to_funnel(rtw_points):
+    """Convert (angle, distance) points of the ship file to funnel coordinates
+
+    The points on the axes get an exact 0, not the rounding error of sin(pi)
+
+    Args:
+        rtw_points (iterable): (angle, distance) tuples
+    Returns:
+        list of (x, y) tuples
+    """
+    angle_to_rads = sd.ANGLE_TO_RADS
+    to_funnel = sd.STRUCTURE_TO_FUNNEL
+    quarter = _beam_angle()
+    return [(0.0 if angle % (2*quarter) == 0 else -distance*sin(angle*angle_to_rads)*to_funnel,
+             0.0 if angle % (2*quarter) == quarter
+             else -distance*cos(angle*angle_to_rads)*to_funnel)
+            for angle, distance in rtw_points]
+
+def snap_points(points):
+    """The nearest points that the ship file can store
+
+    Snapping a snapped point gives it back, and snapping (-x, y) gives the mirror of
+    the snapped (x, y), with the opposite angle.
+    Except on the centerline, where each point has one angle: the half turn toward the bow,
+    and the angle of the beam at the origin, at the angle 0 it would be an empty point
+    that the loading drops.
+
+    Args:
+        points (iterable): (x, y) tuples in funnel coordinates
+    Returns:
+        (list of (angle, distance) tuples of ints as written in the file,
+         list of the (x, y) tuples they are in funnel coordinates)
+    """
+    angle_to_rads = sd.ANGLE_TO_RADS
+    to_structure = sd.STRUCTURE_TO_FUNNEL
+    beam_angle = _beam_angle()
+    rtw_points = []
+    for x, y in points:
+        distance = round(hypot(x, y)/to_structure)
+        angle = round(atan2(-x, -y)/angle_to_rads) if distance else beam_angle
+        rtw_points.append((2*beam_angle if angle == -2*beam_angle else angle, distance))
+    return rtw_points, rtw_to_funnel(rtw_points)
+
+def snap_outline(points):
+    """snap_points, with the points snapped on the point before them merged into it
+
+    The loading merges these consecutive duplicates, so the outline is the one
+    that will be loaded again
+
+    Args:
+        points (iterable): (x, y) tuples in funnel coordinates
+    Returns:
+        same as snap_points
+    """
+    rtw_points, snapped = snap_points(points)
+    kept = [index for index in range(len(rtw_points))
+            if index == 0 or rtw_points[index] != rtw_points[index - 1]]
+    return [rtw_points[index] for index in kept], [snapped[index] for index in kept]
+
+def has_duplicates(rtw_points, indices):
+    """True if one of the points at the indices is the same as the point before or after it
+
+    Args:
+        rtw_points (list): (angle, distance) tuples
+        indices (iterable): indices in rtw_points
+    """
+    return any(rtw_points[index] == rtw_points[neighbour]
+               for index in indices for neighbour in (index - 1, index + 1)
+               if 0 <= neighbour < len(rtw_points))
+
+def _beam_angle():
+    """Angle of a quarter turn, toward the beam"""
+    return int(pi/2.0 * 1.0/sd.ANGLE_TO_RADS)
+
+def polygon_area(points):
+    """Signed area of the polygon, positive if the points turn counterclockwise
+
+    Args:
+        points (list): (x, y) tuples, the polygon is closed from the last point to the first
+    """
+    area = 0.0
+    for index, (x, y) in enumerate(points):
+        next_x, next_y = points[index - len(points) + 1]
+        area += x*next_y - next_x*y
+    return area/2
+
+def _triangle_area(point1, point2, point3):
+    return abs((point2[0] - point1[0])*(point3[1] - point1[1])
+               - (point3[0] - point1[0])*(point2[1] - point1[1]))/2
+
+def simplify(points, max_points, tolerance=0.0, closed=True):
+    """Remove the points that change the outline the least, with the Visvalingam-Whyatt method
+
+    Each point is worth the area of the triangle it makes with its neighbours,
+    the point of least area is removed and the area of its neighbours recomputed,
+    until there are at most max_points and the least area is above the tolerance
+
+    Args:
+        points (list): (x, y) tuples
+        max_points (int): the most points to keep
+        tolerance (number): the points worth less than this area are removed even
+            if there are not too many points
+        closed (bool): True for a polygon, False for a line whose ends are kept
+    Returns:
+        list of the kept points, in the same order
+    """
+    count = len(points)
+    min_points = 3 if closed else 2
+    if count <= min_points:
+        return list(points)
+    previous = [index - 1 for index in range(count)]
+    following = [index + 1 for index in range(count)]
+    if closed:
+        previous[0] = count - 1
+        following[-1] = 0
+    areas = [inf]*count
+    for index in range(count):
+        if closed or 0 < index < count - 1:
+            areas[index] = _triangle_area(points[previous[index]], points[index],
+                                          points[following[index]])
+    heap = [(area, index) for index, area in enumerate(areas)]
+    heapq.heapify(heap)
+    removed = [False]*count
+    while heap and count > min_points:
+        area, index = heapq.heappop(heap)
+        if removed[index] or area != areas[index]:
+            #outdated entry, the area of the point was recomputed
+            continue
+        if count <= max_points and area > tolerance:
+            break
+        removed[index] = True
+        count -= 1
+        before, after = previous[index], following[index]
+        following[before] = after
+        previous[after] = before
+        for neighbour in (before, after):
+            if areas[neighbour] != inf:
+                #never less than the removed point's, so the points are removed in order
+                areas[neighbour] = max(area, _triangle_area(points[previous[neighbour]],
+                                                            points[neighbour],
+                                                            points[following[neighbour]]))
+                heapq.heappush(heap, (areas[neighbour], neighbour))
+    return [point for index, point in enumerate(points) if not removed[index]]
+
+def _distance_to_segment(point, start, end):
+    segment_x, segment_y = end[0] - start[0], end[1] - start[1]
+    length = segment_x*segment_x + segment_y*segment_y
+    if length == 0:
+        return hypot(point[0] - start[0], point[1] - start[1])
+    ratio = ((point[0] - start[0])*segment_x + (point[1] - start[1])*segment_y)/length
+    ratio = min(1.0, max(0.0, ratio))
+    return hypot(point[0] - start[0] - ratio*segment_x, point[1] - start[1] - ratio*segment_y)
+
+def outline_deviation(original, simplified, closed=True):
+    """How much a simplified outline is away from the original one
+
+    Args:
+        original (list): (x, y) tuples
+        simplified (list): (x, y) tuples
+        closed (bool): True for polygons, False for lines
+    Returns:
+        (the largest distance from an original point to the simplified outline,
+         the area difference, 0 for lines)
+    """
+    if not simplified:
+        return (0.0, 0.0)
+    segments = list(zip(simplified, simplified[1:]))
+    if closed:
+        segments.append((simplified[-1], simplified[0]))
+    if not segments:
+        segments = [(simplified[0], simplified[0])]
+    distance = max((min(_distance_to_segment(point, start, end) for start, end in segments)
+                    for point in original), default=0.0)
+    area = abs(abs(polygon_area(original)) - abs(polygon_area(simplified))) if closed else 0.0
+    return (distance, area)
+
+def bounding_box(points):
+    """(min x, min y, max x, max y) of the points"""
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def boxes_overlap(box1, box2):
+    """True if the two bounding boxes overlap"""
+    return (box1[0] < box2[2] and box2[0] < box1[2]
+            and box1[1] < box2[3] and box2[1] < box1[3])
+
+def _cross(origin, point1, point2):
+    return ((point1[0] - origin[0])*(point2[1] - origin[1])
+            - (point1[1] - origin[1])*(point2[0] - origin[0]))
+
+def _in_triangle(point, point1, point2, point3):
+    """True if the point is in the counterclockwise triangle or on its border"""
+    return (_cross(point1, point2, point) >= 0 and _cross(point2, point3, point) >= 0
+            and _cross(point3, point1, point) >= 0)
+
+def triangulate(points):
+    """Cut the polygon in triangles by ear clipping
+
+    Args:
+        points (list): (x, y) tuples of a polygon that does not cross itself
+    Returns:
+        list of counterclockwise triangles, each a list of 3 points.
+        The flat triangles are left out.
+        A polygon that crosses itself is cut in triangles that may overlap.
+    """
+    remaining = list(points)
+    if polygon_area(remaining) < 0:
+        remaining.reverse()
+    triangles = []
+    while len(remaining) > 3:
+        count = len(remaining)
+        for index in range(count):
+            before, point = remaining[index - 1], remaining[index]
+            after = remaining[(index + 1) % count]
+            if _cross(before, point, after) < 0:
+                continue
+            if any(_in_triangle(other, before, point, after) for other in remaining
+                   if other not in (before, point, after)):
+                continue
+            break
+        else:
+            #no ear, the polygon crosses itself: cut the next triangle anyway
+            index = 1
+            before, point, after = remaining[0], remaining[1], remaining[2]
+        if _cross(before, point, after) > 0:
+            triangles.append([before, point, after])
+        del remaining[index]
+    if len(remaining) == 3 and _cross(*remaining) > 0:
+        triangles.append(remaining)
+    return triangles
+
+def clip_convex(subject, clip):
+    """The part of a polygon inside a convex one, Sutherland-Hodgman method
+
+    Args:
+        subject (list): (x, y) tuples of a convex polygon
+        clip (list): (x, y) tuples of a counterclockwise convex polygon
+    Returns:
+        list of the (x, y) points of the intersection, less than 3 if it is empty
+    """
+    output = list(subject)
+    for index, start in enumerate(clip):
+        end = clip[(index + 1) % len(clip)]
+        if not output:
+            break
+        points, output = output, []
+        for point_index, point in enumerate(points):
+            previous = points[point_index - 1]
+            point_inside = _cross(start, end, point) >= 0
+            previous_inside = _cross(start, end, previous) >= 0
+            if point_inside != previous_inside:
+                output.append(_line_intersection(previous, point, start, end))
+            if point_inside:
+                output.append(point)
+    return output
+
+def _line_intersection(start1, end1, start2, end2):
+    """Where the segment 1 crosses the line 2"""
+    direction_x, direction_y = end1[0] - start1[0], end1[1] - start1[1]
+    denominator = direction_x*(end2[1] - start2[1]) - direction_y*(end2[0] - start2[0])
+    ratio = _cross(start2, end2, start1)/denominator if denominator else 0.0
+    return (start1[0] + ratio*direction_x, start1[1] + ratio*direction_y)
+
+def intersection_pieces(triangles1, triangles2, min_area=1e-9):
+    """Intersection of two polygons cut in triangles
+
+    Args:
+        triangles1 (list): the triangles of the first polygon, from triangulate
+        triangles2 (list): the triangles of the second polygon
+        min_area (number): smaller pieces are left out
+    Returns:
+        list of convex polygons, together they are the intersection.
+        Empty if the polygons do not overlap.
+    """
+    boxes2 = [bounding_box(triangle) for triangle in triangles2]
+    pieces = []
+    for triangle1 in triangles1:
+        box1 = bounding_box(triangle1)
+        for triangle2, box2 in zip(triangles2, boxes2):
+            if not boxes_overlap(box1, box2):
+                continue
+            piece = clip_convex(triangle1, triangle2)
+            if len(piece) >= 3 and polygon_area(piece) > min_area:
+                pieces.append(piece)
+    return pieces
@@ -0,0 +1,262 @@
+"""Reader and writer for the INI files of the game, faster than configparser and lossless
+
+The text is split once in sections, each one remembers where it is in the original text.
+When writing, the sections that were not replaced are copied from the original text as is,
+so an untouched file is written back exactly as it was read. For that the files must be
+opened with newline="", to read and write their line endings as they are.
+Only what the ship files use is supported: no interpolation, no default section,
+no inline comments. The option names are case sensitive.
+"""
+import os
+
+_COMMENT_PREFIXES = ("#", ";")
+_BOOLEAN_STATES = {"1": True, "yes": True, "true": True, "on": True,
+                   "0": False, "no": False, "false": False, "off": False}
+
+class IniError(Exception):
+    """The text cannot be read as an INI file
+
+    Args:
+        message (str): what is wrong
+        line_number (int): line where the error is, starting at 1
+    """
+    def __init__(self, message, line_number=None):
+        if line_number is not None:
+            message = f"line {line_number}: {message}"
+        super().__init__(message)
+        self.message = message
+
+class Section(dict):
+    """The options of a section, as strings, with typed getters
+
+    A section changed in place is edited: it is written again, not copied from the text
+
+    Args:
+        name (str): name of the section, in the header between []
+    """
+    def __init__(self, name, *args):
+        super().__init__(*args)
+        self.name = name
+        self.edited = False
+
+    def __setitem__(self, option, value):
+        self.edited = True
+        super().__setitem__(option, value)
+
+    def __delitem__(self, option):
+        self.edited = True
+        super().__delitem__(option)
+
+    def __ior__(self, other):
+        self.edited = True
+        return super().__ior__(other)
+
+    def pop(self, *args):
+        self.edited = True
+        return super().pop(*args)
+
+    def popitem(self):
+        self.edited = True
+        return super().popitem()
+
+    def setdefault(self, option, default=None):
+        self.edited = True
+        return super().setdefault(option, default)
+
+    def update(self, *args, **kwargs):
+        self.edited = True
+        super().update(*args, **kwargs)
+
+    def clear(self):
+        self.edited = True
+        super().clear()
+
+    def getint(self, option, fallback=None):
+        """The value of the option as an int, fallback if there is no such option,
+        like configparser
+
+        Raises:
+            ValueError if it is not an int
+        """
+        if option not in self:
+            return fallback
+        return int(self[option])
+
+    def getboolean(self, option, fallback=None):
+        """The value of the option as a bool, like configparser: 1/0, yes/no, true/false, on/off
+
+        fallback if there is no such option
+        Raises:
+            ValueError if it is not a boolean
+        """
+        if option not in self:
+            return fallback
+        value = self[option]
+        try:
+            return _BOOLEAN_STATES[value.lower()]
+        except KeyError:
+            raise ValueError(f"Not a boolean: {value}") from None
+
+class IniFile:
+    """The sections of an INI file, that can be edited and written back
+
+    To edit a section, replace it with ini_file[name] = {option: value},
+    or change it in place
+
+    Args:
+        text (str): the whole content of the file
+    Raises:
+        IniError
+    """
+    def __init__(self, text=""):
+        self._text = text
+        #line ending of the written sections: the one of the text, the platform's if none
+        self._newline = _line_ending(text)
+        #{name: Section}, in the file's order, then the added sections
+        self._sections = {}
+        #{name: (start, end)} of the sections in the original text, that are not replaced
+        self._spans = {}
+        #what comes before the first section, like comments
+        self._preamble_end = 0
+        self._tokenize(text)
+
+    @classmethod
+    def read(cls, file):
+        """Read a whole file object"""
+        return cls(file.read())
+
+    def _tokenize(self, text):
+        section = None
+        section_start = 0
+        option = None
+        offset = 0
+        for line_number, line in enumerate(text.splitlines(keepends=True), start=1):
+            line_start = offset
+            offset += len(line)
+            stripped = line.strip()
+            if not stripped or stripped.startswith(_COMMENT_PREFIXES):
+                option = None if not stripped else option
+                continue
+
+            if line[0] in " \t" and option is not None:
+                #continuation of a multi-line value
+                section[option] += "\n" + stripped
+                continue
+
+            if stripped[0] == "[" and stripped[-1] == "]":
+                name = stripped[1:-1]
+                if not name:
+                    raise IniError("empty section name", line_number)
+                if name in self._sections:
+                    raise IniError(f"duplicate section {name}", line_number)
+                if section is None:
+                    self._preamble_end = line_start
+                else:
+                    self._spans[section.name] = (section_start, line_start)
+                section = Section(name)
+                section_start = line_start
+                self._sections[name] = section
+                option = None
+                continue
+
+            if section is None:
+                raise IniError("option before the first section header", line_number)
+            delimiter = _delimiter_index(stripped)
+            if delimiter <= 0:
+                raise IniError(f"not an option: {stripped}", line_number)
+            option = stripped[:delimiter].rstrip()
+            if option in section:
+                raise IniError(f"duplicate option {option} in section {section.name}",
+                               line_number)
+            section[option] = stripped[delimiter+1:].lstrip()
+
+        if section is not None:
+            self._spans[section.name] = (section_start, len(text))
+        else:
+            self._preamble_end = len(text)
+        for section in self._sections.values():
+            section.edited = False
+
+    def sections(self):
+        """Names of the sections, in order"""
+        return list(self._sections)
+
+    def keys(self):
+        """Names of the sections, in order"""
+        return self._sections.keys()
+
+    def items(self):
+        """(name, Section) of all the sections, in order"""
+        return self._sections.items()
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def __getitem__(self, name):
+        return self._sections[name]
+
+    def __setitem__(self, name, options):
+        """Replace the content of a section, or add it at the end
+
+        Args:
+            name (str): the section's name
+            options (dict): {option: value}, the values are converted to strings
+        """
+        self._sections[name] = Section(name, {option: str(value)
+                                              for option, value in options.items()})
+        self._spans.pop(name, None)
+
+    def remove_section(self, name):
+        """Remove the section, if it exists
+
+        Returns:
+            True if the section existed
+        """
+        self._spans.pop(name, None)
+        return self._sections.pop(name, None) is not None
+
+    def to_text(self):
+        """The whole file, with the sections that were not replaced exactly as they were read"""
+        parts = [self._text[:self._preamble_end]]
+        for name, section in self._sections.items():
+            span = self._spans.get(name)
+            if span is not None and not section.edited:
+                parts.append(self._text[span[0]:span[1]])
+            else:
+                #a blank line between the sections
+                newline = self._newline
+                if parts[-1] and not parts[-1].endswith(2*newline):
+                    parts.append(newline if parts[-1].endswith(newline) else 2*newline)
+                parts.append(_render_section(section).replace("\n", newline))
+        return "".join(parts)
+
+    def write(self, file):
+        """Write the whole file to a file object opened as text, without newline translation"""
+        file.write(self.to_text())
+
+def _line_ending(text):
+    """The line ending of the first line, os.linesep if there is only one line"""
+    end = text.find("\n")
+    if end == -1:
+        return os.linesep
+    return "\r\n" if text[end-1:end] == "\r" else "\n"
+
+def _delimiter_index(line):
+    """Index of the first = or :, -1 if none"""
+    equal = line.find("=")
+    colon = line.find(":")
+    if equal == -1:
+        return colon
+    if colon == -1:
+        return equal
+    return min(equal, colon)
+
+def _render_section(section):
+    """A section in the same format as the game, and as configparser without spaces around ="""
+    lines = [f"[{section.name}]\n"]
+    for option, value in section.items():
+        #the following lines of a multi-line value are indented
+        value = value.replace("\n", "\n\t")
+        lines.append(f"{option}={value}\n")
+    lines.append("\n")
+    return "".join(lines)
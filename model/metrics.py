@@ -0,0 +1,278 @@
+"""Area, centroid, length and beam of the superstructures, to balance them on the ship
+
+All the values are in funnel coordinates, x to starboard and y to the bow.
+relative() gives them relative to the ship's length, the only size the game gives.
+A filled structure is measured as a polygon. A line has no area, and its centroid
+is the middle of its points.
+"""
+import collections
+import model.geometry
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#centroid is (x, y), None if there is no point
+#box is (min x, min y, max x, max y), None if there is no point
+Metrics = collections.namedtuple("Metrics", ["area", "centroid", "length", "beam", "box"])
+
+EMPTY_METRICS = Metrics(0.0, None, 0.0, 0.0, None)
+
+#polygons with an area smaller than this part of their size squared are measured as lines
+_FLAT = 1e-9
+
+def _edge_terms(start, end):
+    """The contributions of one edge to the shoelace sums of the area and centroid"""
+    cross = start[0]*end[1] - end[0]*start[1]
+    return (cross, (start[0] + end[0])*cross, (start[1] + end[1])*cross)
+
+def _has_area(area_sum, box):
+    """False for the flat polygons, whose area is only rounding errors"""
+    size = max(box[2] - box[0], box[3] - box[1])
+    return size > 0 and abs(area_sum) > _FLAT*size*size
+
+def _make_metrics(area_sum, x_sum, y_sum, points_count, box, filled):
+    """Metrics from the shoelace sums of a polygon, or from the sums of the points of a line"""
+    if box is None:
+        return EMPTY_METRICS
+    if filled:
+        area = area_sum/2
+        centroid = (x_sum/(6*area), y_sum/(6*area))
+    else:
+        area = 0.0
+        centroid = (x_sum/points_count, y_sum/points_count)
+    return Metrics(abs(area), centroid, box[3] - box[1], box[2] - box[0], box)
+
+def measure(points, filled=True):
+    """The metrics of an outline
+
+    Args:
+        points (list): (x, y) tuples
+        filled (bool): True for a polygon, False for a line
+    Returns:
+        Metrics
+    """
+    if not points:
+        return EMPTY_METRICS
+    box = model.geometry.bounding_box(points)
+    if filled and len(points) >= 3:
+        terms = [_edge_terms(points[index - 1], points[index]) for index in range(len(points))]
+        sums = [sum(term[rank] for term in terms) for rank in range(3)]
+        if _has_area(sums[0], box):
+            return _make_metrics(*sums, len(points), box, True)
+    return _make_metrics(0.0, sum(point[0] for point in points),
+                         sum(point[1] for point in points), len(points), box, False)
+
+def combine(all_metrics):
+    """The metrics of several structures together, for the whole ship
+
+    The centroid is weighted by the areas, or is the middle of the centroids if
+    there is no area
+
+    Args:
+        all_metrics (iterable): Metrics
+    Returns:
+        Metrics
+    """
+    all_metrics = [metrics for metrics in all_metrics if metrics.box is not None]
+    if not all_metrics:
+        return EMPTY_METRICS
+    box = (min(metrics.box[0] for metrics in all_metrics),
+           min(metrics.box[1] for metrics in all_metrics),
+           max(metrics.box[2] for metrics in all_metrics),
+           max(metrics.box[3] for metrics in all_metrics))
+    area = sum(metrics.area for metrics in all_metrics)
+    weights = [metrics.area/area if area else 1/len(all_metrics) for metrics in all_metrics]
+    centroid = (sum(metrics.centroid[0]*weight for metrics, weight in zip(all_metrics, weights)),
+                sum(metrics.centroid[1]*weight for metrics, weight in zip(all_metrics, weights)))
+    return Metrics(area, centroid, box[3] - box[1], box[2] - box[0], box)
+
+def relative(metrics, half_length):
+    """The metrics relative to the ship's size
+
+    Args:
+        metrics (Metrics)
+        half_length (number): the half length of the ship
+    Returns:
+        dict with the area in percent of length², the centroid's y in percent of the half
+        length (+100 at the bow, -100 at the stern), the length and beam in percent of the length
+    """
+    ship_length = 2*half_length
+    return {"area": 100*metrics.area/(ship_length*ship_length),
+            "centroid": (None if metrics.centroid is None
+                         else 100*metrics.centroid[1]/half_length),
+            "length": 100*metrics.length/ship_length,
+            "beam": 100*metrics.beam/ship_length}
+
+class StructureMetrics:
+    """The metrics of a structure, updated on its notifications
+
+    When points move, only the terms of their edges are computed again, and the extents
+    are only searched again if a point at the border moved inward. Added or deleted points
+    change the terms of the edges next to them. The points replaced all at once are
+    measured again.
+    Create it before the subscribers that read the metrics on the notifications of the
+    structure, to be notified first. Call close() when the metrics are not used anymore.
+
+    Args:
+        structure (model.structure.Structure)
+    """
+    def __init__(self, structure):
+        self._structure = structure
+        #copy of the points, to know where the moved or deleted points were
+        self._points = []
+        #shoelace terms of each edge, the edge k goes from the point k-1 to the point k
+        self._terms = []
+        self._shoelace_sums = [0.0, 0.0, 0.0]
+        self._point_sums = [0.0, 0.0]
+        self._box = None
+        self._measure_all()
+        self._unsubscribe = structure.subscribe(self._on_structure_changed)
+
+    def close(self):
+        """Stop following the changes of the structure"""
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    @property
+    def metrics(self):
+        """Metrics of the structure"""
+        count = len(self._points)
+        if (self._structure.fill and count >= 3
+                and _has_area(self._shoelace_sums[0], self._box)):
+            return _make_metrics(*self._shoelace_sums, count, self._box, True)
+        return _make_metrics(0.0, *self._point_sums, count, self._box, False)
+
+    def _on_structure_changed(self, structure, event_type, event_info):
+        indices = event_info.get("indices", [event_info.get("index")])
+        if event_type == "replace_poits" or (
+                event_type in ("add_point", "delete_point")
+                and min(len(self._points), len(structure.points)) < 3):
+            self._measure_all()
+        elif event_type == "update":
+            self._update_moved(indices)
+        elif event_type == "add_point":
+            self._update_added(indices)
+        elif event_type == "delete_point":
+            self._update_deleted(indices)
+
+    def _measure_all(self):
+        points = list(self._structure.points)
+        self._points = points
+        self._box = model.geometry.bounding_box(points) if points else None
+        self._terms = [_edge_terms(points[index - 1], points[index])
+                       for index in range(len(points))]
+        self._shoelace_sums = [sum(term[rank] for term in self._terms) for rank in range(3)]
+        self._point_sums = [sum(point[0] for point in points),
+                            sum(point[1] for point in points)]
+
+    def _update_edge(self, index):
+        """Compute again the terms of the edge that ends at the point"""
+        index %= len(self._points)
+        new_terms = _edge_terms(self._points[index - 1], self._points[index])
+        for rank in range(3):
+            self._shoelace_sums[rank] += new_terms[rank] - self._terms[index][rank]
+        self._terms[index] = new_terms
+
+    def _add_to_point_sums(self, point, sign):
+        for rank in range(2):
+            self._point_sums[rank] += sign*point[rank]
+
+    def _update_moved(self, indices):
+        old_points = [self._points[index] for index in indices]
+        for index in indices:
+            self._add_to_point_sums(self._points[index], -1)
+            self._points[index] = self._structure.points[index]
+            self._add_to_point_sums(self._points[index], 1)
+        for index in {edge for index in indices for edge in (index, index + 1)}:
+            self._update_edge(index)
+        if self._on_border(old_points):
+            self._box = model.geometry.bounding_box(self._points)
+        else:
+            self._grow_box(self._points[index] for index in indices)
+
+    def _update_added(self, indices):
+        #the indices are the ones once all the points are added, in ascending order
+        for index in indices:
+            self._points.insert(index, self._structure.points[index])
+            self._terms.insert(index, (0.0, 0.0, 0.0))
+            self._add_to_point_sums(self._points[index], 1)
+        for index in {edge for index in indices for edge in (index, index + 1)}:
+            self._update_edge(index)
+        self._grow_box(self._points[index] for index in indices)
+
+    def _update_deleted(self, indices):
+        #from the last one, so the indices of the points still to delete do not change
+        old_points = [self._points[index] for index in indices]
+        for index in sorted(indices, reverse=True):
+            self._add_to_point_sums(self._points.pop(index), -1)
+            for rank, term in enumerate(self._terms.pop(index)):
+                self._shoelace_sums[rank] -= term
+            #the edge from the point before to the point after
+            self._update_edge(index)
+        if self._on_border(old_points):
+            self._box = model.geometry.bounding_box(self._points)
+
+    def _on_border(self, points):
+        """True if one of the points is on the extents"""
+        min_x, min_y, max_x, max_y = self._box
+        return any(x in (min_x, max_x) or y in (min_y, max_y) for x, y in points)
+
+    def _grow_box(self, points):
+        min_x, min_y, max_x, max_y = self._box
+        for x, y in points:
+            min_x, max_x = min(min_x, x), max(max_x, x)
+            min_y, max_y = min(min_y, y), max(max_y, y)
+        self._box = (min_x, min_y, max_x, max_y)
+
+def measure_many(structures):
+    """The metrics of many structures at once, with numpy, for the reports on whole folders
+
+    All the points are put in one array and the sums are reduced per structure.
+    Slower than measure() for the few structures of one ship, faster from a few hundreds.
+    Falls back to measure() for each structure if numpy is not installed.
+
+    Args:
+        structures (list): model.structure.Structure, of any amount of ships
+    Returns:
+        list of Metrics, one per structure
+    """
+    if numpy is None:
+        return [measure(structure.points, structure.fill) for structure in structures]
+    counts = numpy.array([len(structure.points) for structure in structures], dtype=numpy.int64)
+    if not counts.sum():
+        return [EMPTY_METRICS]*len(structures)
+    points = numpy.array([point for structure in structures for point in structure.points],
+                         dtype=float)
+    starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+    not_empty = counts > 0
+    #index of the previous point in the same structure, the last one for the first
+    previous = numpy.arange(len(points)) - 1
+    previous[starts[not_empty]] = (starts + counts - 1)[not_empty]
+    x, y = points[:, 0], points[:, 1]
+    cross = x[previous]*y - x*y[previous]
+    owners = numpy.repeat(numpy.arange(len(structures)), counts)
+    size = len(structures)
+    area_sums = numpy.bincount(owners, cross, size)
+    x_sums = numpy.bincount(owners, (x[previous] + x)*cross, size)
+    y_sums = numpy.bincount(owners, (y[previous] + y)*cross, size)
+    point_x_sums = numpy.bincount(owners, x, size)
+    point_y_sums = numpy.bincount(owners, y, size)
+    boxes = numpy.zeros((size, 4))
+    non_empty_starts = starts[not_empty]
+    boxes[not_empty, 0] = numpy.minimum.reduceat(x, non_empty_starts)
+    boxes[not_empty, 1] = numpy.minimum.reduceat(y, non_empty_starts)
+    boxes[not_empty, 2] = numpy.maximum.reduceat(x, non_empty_starts)
+    boxes[not_empty, 3] = numpy.maximum.reduceat(y, non_empty_starts)
+    sizes = numpy.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    filled = (numpy.array([structure.fill for structure in structures], dtype=bool)
+              & (counts >= 3) & (sizes > 0)
+              & (numpy.abs(area_sums) > _FLAT*sizes*sizes))
+    sums = numpy.where(filled[:, None],
+                       numpy.stack((area_sums, x_sums, y_sums), axis=1),
+                       numpy.stack((numpy.zeros(size), point_x_sums, point_y_sums), axis=1))
+    return [_make_metrics(*sums_row, count, tuple(box), is_filled) if count else EMPTY_METRICS
+            for sums_row, count, box, is_filled in zip(sums.tolist(), counts.tolist(),
+                                                       boxes.tolist(), filled.tolist())]
@@ -0,0 +1,237 @@
+"""Find the problems of the superstructures' outlines that the game draws as garbage
+
+- crossing: two edges of the outline cross or touch each other
+- zero_length: an edge is too short to be saved, its two points are the same in the file
+- spike: the outline goes to a point and comes back on itself
+
+The edge k goes from the point k to the point k+1, for a filled structure the last edge
+goes from the last point to the first one.
+"""
+import collections
+from math import floor, hypot
+import model.shipdata as sd
+
+#sine of the angle under which a point with its two neighbours is a spike
+SPIKE_SINE = 0.01
+#above this amount of edges, the crossings are searched with a grid
+_BRUTE_FORCE_MAX_EDGES = 64
+
+#kind is "crossing", "zero_length" or "spike"
+#indices are the two edges for a crossing, the edge for a zero length, the point for a spike
+OutlineProblem = collections.namedtuple("OutlineProblem", ["kind", "indices"])
+
+def edges_count(points, closed):
+    """Number of edges of the outline"""
+    if closed and len(points) >= 3:
+        return len(points)
+    return max(0, len(points) - 1)
+
+def edge(points, index):
+    """The two ends of the edge"""
+    return points[index], points[(index + 1) % len(points)]
+
+def find_problems(points, closed=True):
+    """All the problems of the outline
+
+    Args:
+        points (list): (x, y) tuples
+        closed (bool): True for a polygon (filled structure), False for a line
+    Returns:
+        list of OutlineProblem
+    """
+    count = edges_count(points, closed)
+    problems = [OutlineProblem("zero_length", (index,)) for index in range(count)
+                if is_zero_length(points, index)]
+    problems += [OutlineProblem("spike", (index,)) for index in range(len(points))
+                 if is_spike(points, index, closed)]
+    problems += [OutlineProblem("crossing", pair) for pair in sorted(find_crossings(points,
+                                                                                    closed))]
+    return problems
+
+def is_zero_length(points, index):
+    """True if the edge is too short to be saved"""
+    start, end = edge(points, index)
+    return hypot(end[0] - start[0], end[1] - start[1]) < _zero_length()
+
+def _zero_length():
+    """Edges shorter than that are saved as a single point"""
+    return sd.STRUCTURE_TO_FUNNEL
+
+def is_spike(points, index, closed):
+    """True if the outline comes back on itself at the point"""
+    count = len(points)
+    if count < 3 or (not closed and (index == 0 or index == count - 1)):
+        return False
+    point = points[index]
+    before = points[index - 1]
+    after = points[(index + 1) % count]
+    to_before = (before[0] - point[0], before[1] - point[1])
+    to_after = (after[0] - point[0], after[1] - point[1])
+    lengths = hypot(*to_before)*hypot(*to_after)
+    if lengths == 0:
+        #a zero length edge, not a spike
+        return False
+    cross = to_before[0]*to_after[1] - to_before[1]*to_after[0]
+    dot = to_before[0]*to_after[0] + to_before[1]*to_after[1]
+    return dot > 0 and abs(cross) <= SPIKE_SINE*lengths
+
+def _adjacent(index1, index2, count, closed):
+    """True if the edges share a point"""
+    difference = abs(index1 - index2)
+    return difference <= 1 or (closed and difference == count - 1)
+
+def _orientation(point1, point2, point3):
+    value = ((point2[0] - point1[0])*(point3[1] - point1[1])
+             - (point2[1] - point1[1])*(point3[0] - point1[0]))
+    return (value > 0) - (value < 0)
+
+def _on_segment(point, start, end):
+    """For a point aligned with the segment, True if it is between the ends"""
+    return (min(start[0], end[0]) <= point[0] <= max(start[0], end[0])
+            and min(start[1], end[1]) <= point[1] <= max(start[1], end[1]))
+
+def segments_intersect(start1, end1, start2, end2):
+    """True if the two segments cross or touch each other"""
+    orientation1 = _orientation(start1, end1, start2)
+    orientation2 = _orientation(start1, end1, end2)
+    orientation3 = _orientation(start2, end2, start1)
+    orientation4 = _orientation(start2, end2, end1)
+    if orientation1 != orientation2 and orientation3 != orientation4:
+        return True
+    return ((orientation1 == 0 and _on_segment(start2, start1, end1))
+            or (orientation2 == 0 and _on_segment(end2, start1, end1))
+            or (orientation3 == 0 and _on_segment(start1, start2, end2))
+            or (orientation4 == 0 and _on_segment(end1, start2, end2)))
+
+def edges_cross(points, index1, index2, closed):
+    """True if the two edges, that do not share a point, cross"""
+    if _adjacent(index1, index2, len(points), closed):
+        return False
+    return segments_intersect(*edge(points, index1), *edge(points, index2))
+
+def find_crossings(points, closed=True, edges=None):
+    """The pairs of edges that cross
+
+    Args:
+        points (list): (x, y) tuples
+        closed (bool): True for a polygon, False for a line
+        edges (iterable): only the crossings of these edges, all the edges if None
+    Returns:
+        set of (smaller edge index, bigger edge index)
+    """
+    count = edges_count(points, closed)
+    all_edges = range(count)
+    edges = all_edges if edges is None else [index for index in edges if index < count]
+    if count > _BRUTE_FORCE_MAX_EDGES:
+        candidates = _grid_candidates(points, closed, edges)
+    else:
+        candidates = ((index1, index2) for index1 in edges for index2 in all_edges)
+    crossings = set()
+    for index1, index2 in candidates:
+        pair = (min(index1, index2), max(index1, index2))
+        if index1 != index2 and pair not in crossings and edges_cross(points, *pair, closed):
+            crossings.add(pair)
+    return crossings
+
+def _grid_candidates(points, closed, edges):
+    """Pairs of edges that are in the same cells of a grid, for long outlines"""
+    count = edges_count(points, closed)
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    #about one edge per cell
+    cell_size = max(max(xs) - min(xs), max(ys) - min(ys), _zero_length())/max(1, count**0.5)
+    cells = collections.defaultdict(list)
+    edge_cells = {}
+    for index in range(count):
+        start, end = edge(points, index)
+        edge_cells[index] = [(column, row)
+                             for column in range(floor(min(start[0], end[0])/cell_size),
+                                                 floor(max(start[0], end[0])/cell_size) + 1)
+                             for row in range(floor(min(start[1], end[1])/cell_size),
+                                              floor(max(start[1], end[1])/cell_size) + 1)]
+        for cell in edge_cells[index]:
+            cells[cell].append(index)
+    for index in edges:
+        others = {other for cell in edge_cells[index] for other in cells[cell]}
+        for other in others:
+            yield index, other
+
+class OutlineChecker:
+    """The problems of a structure, checked again only where it changed
+
+    The points are compared with the ones of the last check: when some points moved,
+    only the edges around them are checked again. The checks are done when the problems
+    are asked for, so they are up to date whatever the order of the notifications.
+
+    Args:
+        structure (model.structure.Structure)
+    """
+    def __init__(self, structure):
+        self._structure = structure
+        self._zero_lengths = set()
+        self._spikes = set()
+        self._crossings = set()
+        #points and closing of the last check, None before the first one
+        self._points = None
+        self._closed = None
+
+    @property
+    def structure(self):
+        """The checked structure"""
+        return self._structure
+
+    @property
+    def problems(self):
+        """list of OutlineProblem of the structure"""
+        self._check()
+        return ([OutlineProblem("zero_length", (index,)) for index in sorted(self._zero_lengths)]
+                + [OutlineProblem("spike", (index,)) for index in sorted(self._spikes)]
+                + [OutlineProblem("crossing", pair) for pair in sorted(self._crossings)])
+
+    def _check(self):
+        points = list(self._structure.points)
+        #two points make a line, even when filled
+        closed = self._structure.fill and len(points) >= 3
+        if (self._points is None or len(points) != len(self._points)
+                or closed != self._closed):
+            count = edges_count(points, closed)
+            self._zero_lengths = {index for index in range(count)
+                                  if is_zero_length(points, index)}
+            self._spikes = {index for index in range(len(points))
+                            if is_spike(points, index, closed)}
+            self._crossings = find_crossings(points, closed)
+        else:
+            moved_points = [index for index, (point, old_point)
+                            in enumerate(zip(points, self._points)) if point != old_point]
+            if moved_points:
+                self._check_moved(points, closed, moved_points)
+        self._points = points
+        self._closed = closed
+
+    def _check_moved(self, points, closed, moved_points):
+        """Check again the edges and points around the moved points"""
+        count = len(points)
+        count_edges = edges_count(points, closed)
+        #the edges that end at the moved points, and their neighbours for the spikes
+        if closed:
+            edges = {index % count for point in moved_points for index in (point - 1, point)}
+        else:
+            edges = {index for point in moved_points for index in (point - 1, point)
+                     if 0 <= index < count_edges}
+        neighbours = {index % count for point in moved_points
+                      for index in (point - 1, point, point + 1)}
+        self._zero_lengths -= edges
+        self._zero_lengths |= {index for index in edges if is_zero_length(points, index)}
+        self._spikes -= neighbours
+        self._spikes |= {index for index in neighbours if is_spike(points, index, closed)}
+        self._crossings = {pair for pair in self._crossings
+                           if pair[0] not in edges and pair[1] not in edges}
+        self._crossings |= find_crossings(points, closed, edges)
+
+def describe(problem):
+    """The problem in words"""
+    if problem.kind == "crossing":
+        return f"edges {problem.indices[0]} and {problem.indices[1]} cross"
+    if problem.kind == "zero_length":
+        return f"edge {problem.indices[0]} has no length"
+    return f"spike at point {problem.indices[0]}"
@@ -0,0 +1,110 @@
+"""Find where the superstructures, funnels, turrets and torpedo mounts of a ship overlap
+
+Each part is cut once in triangles. Two parts are only intersected if their bounding boxes
+overlap, and then only the triangles whose bounding boxes overlap are clipped.
+Only the pairs of the superstructures and funnels that changed since the last analysis
+are computed again.
+"""
+import collections
+import itertools
+import model.geometry
+from model.turrets_torps import Turret
+
+#the pairs of kinds of parts whose overlaps are shown
+#superstructures are stacked on each other and so are turrets, it is not a mistake
+CHECKED_PAIRS = {frozenset(("structure", "turret")), frozenset(("structure", "torpedo")),
+                 frozenset(("structure", "funnel")), frozenset(("funnel", "turret")),
+                 frozenset(("funnel", "torpedo")), frozenset(("turret", "torpedo"))}
+
+#owner1 and owner2 are the overlapping Structure, Funnel, Turret or Torpedo
+#pieces is a list of convex polygons that together are the overlap region
+Overlap = collections.namedtuple("Overlap", ["owner1", "owner2", "pieces"])
+
+class _Part:
+    """The triangles and bounding box of one part of the ship"""
+    def __init__(self, kind, outline):
+        self.kind = kind
+        self.triangles = model.geometry.triangulate(outline) if len(outline) >= 3 else []
+        self.box = model.geometry.bounding_box(outline) if self.triangles else None
+
+class OverlapAnalyzer:
+    """The overlaps between the parts of a ship, computed again only for the changed parts
+
+    The superstructures and funnels are compared with their state of the last analysis,
+    only the pairs of the changed ones are intersected again. The analysis is done when the
+    overlaps are asked for, like the checks of model.outlinecheck.OutlineChecker.
+    Only the filled superstructures have an area, the lines are ignored.
+
+    Args:
+        ship_data (model.shipdata.ShipData): the ship
+    """
+    def __init__(self, ship_data):
+        self._half_length = ship_data.half_length
+        self._structures = list(ship_data.structures)
+        self._funnels = list(ship_data.funnels.values())
+        self._owners = self._structures + self._funnels + list(ship_data.turrets_torps)
+        #{owner: _Part}, empty before the first analysis
+        self._parts = {}
+        #{owner: state of the structure or funnel at the last analysis}
+        self._states = {}
+        #{frozenset((owner1, owner2)): Overlap}
+        self._overlaps = {}
+
+    @property
+    def overlaps(self):
+        """list of Overlap of the ship"""
+        self._analyze()
+        return list(self._overlaps.values())
+
+    def _state(self, owner):
+        if owner in self._structures:
+            return (owner.fill, tuple(owner.points))
+        return (owner.oval, owner.position)
+
+    def _make_part(self, owner):
+        if owner in self._structures:
+            return _Part("structure", owner.points if owner.fill else [])
+        if owner in self._funnels:
+            return _Part("funnel", owner.outline(self._half_length))
+        return _Part("turret" if isinstance(owner, Turret) else "torpedo", owner.outline)
+
+    def _analyze(self):
+        if not self._parts:
+            self._parts = {owner: self._make_part(owner) for owner in self._owners}
+            self._states = {owner: self._state(owner)
+                            for owner in self._structures + self._funnels}
+            pairs = itertools.combinations(self._owners, 2)
+        else:
+            changed = set()
+            for owner, state in self._states.items():
+                new_state = self._state(owner)
+                if new_state != state:
+                    self._states[owner] = new_state
+                    self._parts[owner] = self._make_part(owner)
+                    changed.add(owner)
+            if not changed:
+                return
+            self._overlaps = {key: overlap for key, overlap in self._overlaps.items()
+                              if not key & changed}
+            pairs = {frozenset((owner, other)) for owner in changed
+                     for other in self._owners if other is not owner}
+        for owner1, owner2 in pairs:
+            overlap = self._intersect(owner1, owner2)
+            if overlap is not None:
+                self._overlaps[frozenset((owner1, owner2))] = overlap
+
+    def _intersect(self, owner1, owner2):
+        """The Overlap of the two parts, None if they do not overlap"""
+        part1, part2 = self._parts[owner1], self._parts[owner2]
+        if (frozenset((part1.kind, part2.kind)) not in CHECKED_PAIRS
+                or part1.box is None or part2.box is None
+                or not model.geometry.boxes_overlap(part1.box, part2.box)):
+            return None
+        pieces = model.geometry.intersection_pieces(part1.triangles, part2.triangles)
+        if not pieces:
+            return None
+        return Overlap(owner1, owner2, pieces)
+
+def overlap_area(overlap):
+    """Area of the overlap region, in funnel coordinates"""
+    return sum(model.geometry.polygon_area(piece) for piece in overlap.pieces)
@@ -0,0 +1,143 @@
+"""On-disk cache of parsed ship files
+
+A snapshot of the ShipData is pickled in the user data folder after each parse.
+It is used instead of parsing the file again as long as the file has the same path,
+size and modification time, and the parameters used to build it have not changed.
+The least recently used snapshots are deleted when the cache grows over its size limit.
+"""
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import pickle
+import schemas
+import model.shipdata as sd
+
+summary = logging.getLogger("Summary")
+details = logging.getLogger("Details")
+
+#change it when ShipData, Structure... change, to invalidate the old snapshots
+CACHE_VERSION = 10
+
+_SNAPSHOT_SUFFIX = ".pickle"
+
+class ShipCache:
+    """Cache of ShipData snapshots, one file per ship file
+
+    Args:
+        directory (str): folder where the snapshots are stored
+        max_bytes (int): when the snapshots take more space than that,
+            the least recently used are deleted
+    """
+    def __init__(self, directory=schemas.SHIP_CACHE_PATH, max_bytes=schemas.SHIP_CACHE_MAX_BYTES):
+        self._directory = pathlib.Path(directory)
+        self._max_bytes = max_bytes
+
+    def load(self, path, parameters):
+        """Get the ShipData of the file from the cache, or by parsing the file if needed
+
+        Args:
+            path (str): path to the ship file
+            parameters (parameters_loader.Parameters): parameters for the whole program
+        Returns:
+            model.shipdata.ShipData
+        Raises:
+            ShipFileInvalidException, OSError: as when parsing the file
+        """
+        stat = os.stat(path)
+        key = _snapshot_key(path, stat, parameters)
+        ship_data = self.get(path, key)
+        if ship_data is not None:
+            details.info("loaded %s from the cache", path)
+            return ship_data
+
+        with open(path, newline="") as file:
+            ship_data = sd.ShipData(file, parameters)
+        self.put(path, key, ship_data)
+        return ship_data
+
+    def get(self, path, key):
+        """Read the snapshot for the file if it is there and up to date
+
+        Args:
+            path (str): path to the ship file
+            key (dict): what the snapshot must have been made from, see _snapshot_key
+        Returns:
+            ShipData or None
+        """
+        snapshot_path = self._snapshot_path(path)
+        try:
+            with open(snapshot_path, "rb") as file:
+                snapshot = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as error:
+            details.warning("Could not read the cached ship %s\n%s", snapshot_path, error)
+            return None
+
+        if not isinstance(snapshot, dict) or snapshot.get("key") != key:
+            return None
+        try:
+            #mark as recently used
+            os.utime(snapshot_path)
+        except OSError:
+            pass
+        return snapshot["ship_data"]
+
+    def put(self, path, key, ship_data):
+        """Store the snapshot of a ShipData, then trim the cache to its size limit
+
+        Failures are logged, not raised: the cache is only there to go faster
+        """
+        snapshot_path = self._snapshot_path(path)
+        temp_path = snapshot_path.with_suffix(".tmp")
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, "wb") as file:
+                pickle.dump({"key": key, "ship_data": ship_data}, file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, snapshot_path)
+        except (OSError, pickle.PicklingError) as error:
+            details.warning("Could not cache the ship %s\n%s", path, error)
+            return
+        self.trim()
+
+    def trim(self):
+        """Delete the least recently used snapshots until the cache fits in max_bytes"""
+        try:
+            snapshots = [(entry.stat().st_mtime, entry.stat().st_size, entry)
+                         for entry in self._directory.glob("*" + _SNAPSHOT_SUFFIX)]
+        except OSError as error:
+            details.warning("Could not list the ship cache %s\n%s", self._directory, error)
+            return
+        total = sum(size for _mtime, size, _entry in snapshots)
+        for _mtime, size, entry in sorted(snapshots, key=lambda snapshot: snapshot[0]):
+            if total <= self._max_bytes:
+                break
+            try:
+                entry.unlink()
+                total -= size
+            except OSError as error:
+                details.warning("Could not delete the cached ship %s\n%s", entry, error)
+
+    def _snapshot_path(self, path):
+        name = hashlib.sha1(str(pathlib.Path(path).resolve()).encode("utf-8")).hexdigest()
+        return self._directory.joinpath(name + _SNAPSHOT_SUFFIX)
+
+def _snapshot_key(path, stat, parameters):
+    """What identifies a snapshot as still valid
+
+    The file's path, size and modification time, and the parameters that change the parsed data
+    """
+    return {"version": CACHE_VERSION,
+            "path": str(pathlib.Path(path).resolve()),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "parameters": parameters_fingerprint(parameters)}
+
+def parameters_fingerprint(parameters):
+    """A hash of the parameters used to parse a ship file"""
+    used = [parameters.ships_hlengths, parameters.turrets_positions, parameters.turrets_rules,
+            parameters.turrets_scale, parameters.turrets_outlines, parameters.torpedo_outlines]
+    return hashlib.sha1(json.dumps(used, sort_keys=True).encode("utf-8")).hexdigest()
@@ -1,12 +1,20 @@
 """Reads and write ship data from/to RTW's ship files
 """
-import configparser
+import logging
+import os
 import pathlib
+import stat
+import tempfile
+import threading
 from math import pi
 from PIL import Image
-from model.structure import Structure
+from model.structure import Structure, STRUCTURE_POINTS_MAX
 from model.turrets_torps import Turret, Torpedo
 from model.funnel import funnels_as_ini_section, parse_funnels
+from model.inifile import IniFile, IniError
+import model.outlinecheck
+
+summary = logging.getLogger("Summary")
 
 #superstructures and funnels have different coordinates system
 #I decide to use the funnel
@@ -20,9 +28,17 @@ ANGLE_TO_RADS = pi/972000000.0
 DEFAULT_HALF_LENGTH = 200
 DEFAULT_SHIP_TYPE = "BC"
 
+#glob pattern of the ship files, like ".10d", ".20d"...
+SHIP_FILE_PATTERN = "*.?0d"
+
 MANDATORY_SECTIONS_OPTIONS = {"Data":["PictureName", "ShipType", "Displacement"],
                               "Guns":["TurretStyle"], "Funnels":[]}
 
+#when the file changes on disk, changes to these options need the file to be loaded again
+#the other options of these sections are not displayed
+_DISPLAYED_OPTIONS = {"Data": ["PictureName", "ShipType", "Displacement"],
+                      "Guns": ["Main"]}
+
 class ShipData:
     """Main container for all data
 
@@ -30,7 +46,7 @@ class ShipData:
     Args:
         file (str): path to the file to be read.
         parameters (parameters_loader.parameters): dict with the configurable parameters.
-            Needs "ships_hlengths", see parameters_loaders or the default files for more info
+            Needs "ship_dimensions", see parameters_loaders or the default files for more info
     Attrs:
         structures (list): list of all model.Structure
         turrets (list): list of all Turret
@@ -38,8 +54,11 @@ class ShipData:
             {"funnelname": {"Pos":number, "Oval":number}}
         half_length (int): lengths from center to bow, in funnel coordinates
         ship_type (string): ship type, like "BC", "DD"...
-        side_pict (PIL.Image or None): A PIL Image if a side picture path was set in the file,
-            and this path can be found and read as a picture. Else None
+        displacement (int): displacement in tons
+        caliber (int or None): caliber of the main guns in inches, None if not in the file
+        side_pict (SidePicture or None): handle to the side picture if a side picture path
+            was set in the file, else None. The picture is decoded in the background on demand
+        dirty_sections (set[str]): names of the sections edited since the last load or save
     """
     def __init__(self, file, parameters):
         self.structures = []
@@ -47,36 +66,18 @@ class ShipData:
         self.funnels = {}
         self.path = pathlib.Path(file.name)
         #parser as self to help write back the file
-        self._parser = configparser.ConfigParser()
-        #we preserve the case of the option names, instead of converting all to lower case
-        self._parser.optionxform = str
-        try:
-            self._parser.read_file(file)
-        except configparser.Error as error:
-            raise ShipFileInvalidException(self.path.resolve(), error) from error
-
-        for section in MANDATORY_SECTIONS_OPTIONS:
-            if section not in self._parser.keys():
-                raise ShipFileInvalidException(self.path.resolve(),
-                                               message=f"Missing section: {section}")
-            else:
-                for option in MANDATORY_SECTIONS_OPTIONS[section]:
-                    if option not in self._parser[section]:
-                        message = f"Missing option: {option} in section {section}"
-                        raise ShipFileInvalidException(self.path.resolve(), message=message)
+        self._parser = _read_parser(file, self.path)
 
-        caliber = self._parser['Guns'].getint('Main')
+        self.caliber = self._parser['Guns'].getint('Main')
         #No length data in the ship file, length is determined from tonnage and ship type
         #reverse-engineered from in game ships
         self.ship_type = self._parser['Data']['ShipType']
-        displacement = self._parser['Data'].getint('Displacement')
+        self.displacement = self._parser['Data'].getint('Displacement')
 
-        #grab the first length whose tonnage is above our tonnage for the correct ship type
-        #assumes the length to tonnage are ordered
+        #the length of the first tonnage above our tonnage for the correct ship type
         #the lengths are in "funnel coordinates"
-        self.half_length = [v for k, v in
-                            parameters.ships_hlengths[self.ship_type].items()
-                            if k > displacement][0]
+        self.half_length = parameters.ship_dimensions.half_length(self.ship_type,
+                                                                  self.displacement)
 
         turret_data = {}
         torps = []
@@ -92,48 +93,360 @@ class ShipData:
                     torps.append(new_torp)
 
 
-        self.turrets_torps = [Turret(caliber, k, v, self.half_length, turret_data, parameters)
+        self.turrets_torps = [Turret(self.caliber, k, v, self.half_length, turret_data, parameters)
                               for k, v in turret_data.items()] + torps
 
 
         self.funnels = parse_funnels(self._parser["Funnels"])
 
-        if self._parser["Data"]["PictureName"] is not None:
-            pict_path = self.path.parent.joinpath(self._parser["Data"]["PictureName"])
-            try:
-                self.side_pict = Image.open(pict_path)
-            except OSError:
-                self.side_pict = None
+        self.side_pict = self._open_side_pict()
+
+        #the file whose content is the same as the parser, and the sections edited since then
+        self._saved_path = self.path.resolve()
+        self.dirty_sections = set()
+        #if sections were replaced in the parser itself since the last load or save
+        self._parser_edited = False
+        self._track_changes()
+
+    def _track_changes(self):
+        """Subscribe to the structures and funnels to know which sections need to be saved"""
+        for structure in self.structures:
+            structure.subscribe(self._on_part_changed)
+        for funnel in self.funnels.values():
+            funnel.subscribe(self._on_part_changed)
+
+    def _on_part_changed(self, observable, event_type, _event_info):
+        """Mark the section of the notifying structure or funnel as dirty"""
+        if event_type == "mirrored":
+            #an editing mode, not saved in the file
+            return
+        if isinstance(observable, Structure):
+            self.dirty_sections.add(observable.name)
         else:
-            self.side_pict = None
+            self.dirty_sections.add("Funnels")
+
+    def _open_side_pict(self):
+        """Handle to the side picture whose name is in the ship file, next to the ship file
+
+        Nothing is read from the disk until the picture is requested
+
+        Returns:
+            SidePicture or None if there is no picture name
+        """
+        if self._parser["Data"]["PictureName"] is not None:
+            return SidePicture(self.path.parent.joinpath(self._parser["Data"]["PictureName"]))
+        return None
+
+    def __getstate__(self):
+        """For the pickled snapshots of the ship cache
+
+        The side picture is not pickled, it is opened again when unpickling
+        """
+        state = self.__dict__.copy()
+        del state["side_pict"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.side_pict = self._open_side_pict()
+        #the subscriptions are not pickled
+        self._track_changes()
 
     def write_as_ini(self, file_object=None, file_path=None):
         """Write the ship data in a RTW-readable format to the given file path or file object
         Choose one or the other method!
 
+        Only the sections edited since the last load or save are serialized again.
+        When writing to a path, the data goes to a temporary file that then replaces the target,
+        and nothing is written if the target is the last saved file and nothing was edited.
+
         OSErrors should be handled by the caller
 
         Args:
             file_path (str): file path to save
             file_object (IOstram): writeable file-like object to save
+        Returns:
+            True if something was written, False if there was no change to save
         """
+        if file_path is None and file_object is not None:
+            self._serialize_dirty_sections()
+            self._parser.write(file_object)
+            return True
+
+        target = pathlib.Path(file_path if file_path is not None else self.path).resolve()
+        if (not self.dirty_sections and not self._parser_edited
+                and target == self._saved_path and target.exists()):
+            return False
+
+        self._serialize_dirty_sections()
+        self._write_atomic(target)
+        self._saved_path = target
+        self.dirty_sections.clear()
+        self._parser_edited = False
+        return True
+
+    def _serialize_dirty_sections(self):
+        """Copy the edited structures and funnels in the parser"""
+        for struct in self.structures:
+            if struct.name in self.dirty_sections:
+                if len(struct.points) > STRUCTURE_POINTS_MAX:
+                    summary.warning("%s has %d points, only the first %d are saved. "
+                                    "Use Simplify to keep its shape",
+                                    struct.name, len(struct.points), STRUCTURE_POINTS_MAX)
+                problems = model.outlinecheck.find_problems(struct.points, struct.fill)
+                if problems:
+                    summary.warning("%s will not look right in the game: %s", struct.name,
+                                    ", ".join(model.outlinecheck.describe(problem)
+                                              for problem in problems))
+                self._parser[struct.name] = struct.as_ini_section()
+        if "Funnels" in self.dirty_sections:
+            self._parser["Funnels"] = funnels_as_ini_section(self.funnels)
+
+    def _write_atomic(self, target):
+        """Write the parser to a temporary file in the target's folder, then replace the target
+
+        So the target is never left half written
+        """
+        file_descriptor, temp_path = tempfile.mkstemp(dir=target.parent,
+                                                      prefix=target.name, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w", newline="") as file:
+                self._parser.write(file)
+            if target.exists():
+                os.chmod(temp_path, stat.S_IMODE(os.stat(target).st_mode))
+            os.replace(temp_path, target)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def structures_and_funnels_sections(self):
+        """The superstructures and funnels as ini sections, with the unsaved edits
+
+        The sections that were not edited are copied as they were read, not converted again
+
+        Returns:
+            dict {section name: {option: value}}, Superstructure<x> sections and the Funnels section
+        """
+        sections = {}
         for struct in self.structures:
-            self._parser[struct.name] = struct.as_ini_section()
-
-        self._parser["Funnels"] = funnels_as_ini_section(self.funnels)
-        if  file_path is not None:
-            with open(file_path, "w") as file:
-                self._parser.write(file, space_around_delimiters=False)
-        elif file_object is not None:
-            self._parser.write(file_object, space_around_delimiters=False)
+            if struct.name in self.dirty_sections:
+                sections[struct.name] = struct.as_ini_section()
+            else:
+                sections[struct.name] = dict(self._parser[struct.name])
+        if "Funnels" in self.dirty_sections:
+            sections["Funnels"] = funnels_as_ini_section(self.funnels)
         else:
-            with open(self.path.resolve(), "w") as file:
-                self._parser.write(file, space_around_delimiters=False)
+            sections["Funnels"] = dict(self._parser["Funnels"])
+        return sections
+
+    def replace_structures_and_funnels(self, sections):
+        """Replace all the superstructures and the funnels by the given ini sections
+
+        To give the superstructures and funnels of a ship to its sister ships:
+        the other sections, like the turrets, are kept
+
+        Args:
+            sections (dict): as given by structures_and_funnels_sections
+        Returns:
+            dict {section name: "added", "removed" or "modified"} for the sections that changed
+        """
+        changes = {}
+        for struct in self.structures:
+            if struct.name not in sections:
+                self._parser.remove_section(struct.name)
+                changes[struct.name] = "removed"
+        for name, content in sections.items():
+            #same conversion to strings as when read from a file
+            content = {option: str(value) for option, value in content.items()}
+            if name not in self._parser:
+                changes[name] = "added"
+            elif dict(self._parser[name]) != content:
+                changes[name] = "modified"
+            else:
+                continue
+            self._parser[name] = content
+
+        if changes:
+            self.structures = [Structure(section, section_content)
+                               for section, section_content in self._parser.items()
+                               if "Superstructure" in section]
+            self.funnels = parse_funnels(self._parser["Funnels"])
+            self._track_changes()
+            self.dirty_sections.difference_update(changes)
+            self._parser_edited = True
+        return changes
+
+    def read_changes(self, file):
+        """Parse a new version of the ship file and find what changed since it was loaded or saved
+
+        Args:
+            file (file-like): the ship file, as rewritten by the game
+        Returns:
+            FileChanges
+        Raises:
+            ShipFileInvalidException
+        """
+        new_parser = _read_parser(file, self.path)
+        old_sections = set(self._parser.sections())
+        new_sections = set(new_parser.sections())
+        changed = old_sections ^ new_sections
+        changed.update(section for section in old_sections & new_sections
+                       if dict(self._parser[section]) != dict(new_parser[section]))
+
+        reload_needed = any(self._needs_reload(section, new_parser) for section in changed)
+        return FileChanges(new_parser, changed, reload_needed, changed & self.dirty_sections)
+
+    def _needs_reload(self, section, new_parser):
+        """If the change of this section cannot be merged in the live data"""
+        if section not in self._parser or section not in new_parser:
+            #a structure, turret... was added or removed
+            return _is_displayed_section(section)
+        if section in _DISPLAYED_OPTIONS:
+            return any(self._parser[section].get(option) != new_parser[section].get(option)
+                       for option in _DISPLAYED_OPTIONS[section])
+        if section == "Funnels":
+            return set(parse_funnels(new_parser[section])) != set(self.funnels)
+        return "Turret" in section or "TorpedoMount" in section
+
+    def merge_changes(self, changes, keep_edited=True):
+        """Apply the sections that changed on disk to the structures, funnels and parser
+
+        Only when changes.reload_needed is False: the other changes need a new ShipData
+
+        Args:
+            changes (FileChanges): as given by read_changes
+            keep_edited (bool): if True, the sections edited since the last save are not changed
+        Returns:
+            the set of the merged sections
+        """
+        merged = set()
+        structures = {structure.name: structure for structure in self.structures}
+        for section in changes.sections:
+            if keep_edited and section in self.dirty_sections:
+                continue
+            if section in changes.parser:
+                self._parser[section] = dict(changes.parser[section])
+            else:
+                self._parser.remove_section(section)
+
+            if section in structures:
+                new_structure = Structure(section, changes.parser[section])
+                structures[section].fill = new_structure.fill
+                structures[section].points = new_structure.points
+            elif section == "Funnels":
+                for name, funnel in parse_funnels(changes.parser[section]).items():
+                    self.funnels[name].position = funnel.position
+                    self.funnels[name].oval = funnel.oval
+            #the section is now the same as on disk
+            self.dirty_sections.discard(section)
+            merged.add(section)
+        return merged
+
+class FileChanges:
+    """What changed in a ship file since it was loaded or saved
+
+    Attrs:
+        parser (model.inifile.IniFile): the parsed new version of the file
+        sections (set[str]): names of the added, removed or modified sections
+        reload_needed (bool): if the changes cannot be merged in the ShipData
+            and the file must be loaded again, like when turrets are changed
+        conflicts (set[str]): changed sections that were also edited since the last save
+    """
+    def __init__(self, parser, sections, reload_needed, conflicts):
+        self.parser = parser
+        self.sections = sections
+        self.reload_needed = reload_needed
+        self.conflicts = conflicts
+
+def _is_displayed_section(section):
+    """True if the section is used to display the ship, not only kept to be written back"""
+    return (section in MANDATORY_SECTIONS_OPTIONS or
+            any(part in section for part in ("Superstructure", "Turret", "TorpedoMount")))
+
+def _read_parser(file, path):
+    """Parse a ship file and check the mandatory sections and options
+
+    Args:
+        file (file-like): the ship file
+        path (pathlib.Path): its path, for the error messages
+    Returns:
+        model.inifile.IniFile
+    Raises:
+        ShipFileInvalidException
+    """
+    try:
+        parser = IniFile.read(file)
+    except IniError as error:
+        raise ShipFileInvalidException(path.resolve(), error) from error
+
+    for section in MANDATORY_SECTIONS_OPTIONS:
+        if section not in parser:
+            raise ShipFileInvalidException(path.resolve(),
+                                           message=f"Missing section: {section}")
+        else:
+            for option in MANDATORY_SECTIONS_OPTIONS[section]:
+                if option not in parser[section]:
+                    message = f"Missing option: {option} in section {section}"
+                    raise ShipFileInvalidException(path.resolve(), message=message)
+    return parser
+
+class SidePicture:
+    """Side picture of a ship, decoded in a background thread
+
+    Call start() as soon as possible, then check ready before getting the image,
+    or result() waits for the decoding
+
+    Args:
+        path (pathlib.Path): path to the picture
+    """
+    def __init__(self, path):
+        self.path = path
+        self._image = None
+        self._decoded = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the decoding thread, if not already started"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._decode, daemon=True)
+                self._thread.start()
+
+    def _decode(self):
+        try:
+            image = Image.open(self.path)
+            image.load()
+            self._image = image
+        except OSError:
+            self._image = None
+        finally:
+            self._decoded.set()
+
+    @property
+    def ready(self):
+        """True when the decoding is finished, successful or not"""
+        return self._decoded.is_set()
+
+    def result(self, timeout=None):
+        """The decoded picture, starts the decoding if needed
+
+        Args:
+            timeout (number): how long to wait for the decoding, in seconds. None to wait until done
+        Returns:
+            PIL.Image, or None if the picture could not be read or is not ready before the timeout
+        """
+        self.start()
+        self._decoded.wait(timeout)
+        return self._image
 
 class ShipFileInvalidException(Exception):
     """Errors that can be raised while reading a ship data file"""
     def __init__(self, file_path, root_error=None, message=None):
-        if isinstance(root_error, configparser.Error):
+        if isinstance(root_error, IniError):
             super().__init__(f"Could not parse as INI the file {file_path}\n{root_error.message}")
         elif root_error is not None:
             super().__init__(f"Error trying to read the file {file_path}\n{root_error.message}")
@@ -0,0 +1,193 @@
+"""Searchable SQLite index of all the ship files in a folder tree
+
+The index is updated incrementally: only the files whose modification time or size changed
+since the last scan are parsed again, with the same code as when opening them in the editor.
+Each call opens its own connection, so the index can be updated in a background thread
+while the user interface searches it.
+"""
+import contextlib
+import logging
+import os
+import pathlib
+import sqlite3
+import schemas
+import model.shipdata as sd
+from model.turrets_torps import Turret
+
+summary = logging.getLogger("Summary")
+details = logging.getLogger("Details")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ships (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    ship_type TEXT,
+    displacement INTEGER,
+    caliber INTEGER,
+    turrets TEXT,
+    structures INTEGER,
+    points INTEGER,
+    picture TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+#columns returned by search, in order
+COLUMNS = ["path", "ship_type", "displacement", "caliber", "turrets",
+           "structures", "points", "picture"]
+
+#ship files parsed between two commits to the database
+_COMMIT_EVERY = 50
+
+class ShipIndex:
+    """Index of the ship files under a root folder
+
+    Args:
+        db_path (str): path to the SQLite database, created if needed
+    """
+    def __init__(self, db_path=schemas.SHIP_INDEX_PATH):
+        self._db_path = pathlib.Path(db_path)
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._transaction() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(str(self._db_path), timeout=10)
+        #readers are not blocked by the background update
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Connection that is committed, or rolled back on exception, then closed"""
+        connection = self._connect()
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @property
+    def root(self):
+        """The indexed folder, an empty string if none was set"""
+        with self._transaction() as connection:
+            row = connection.execute("SELECT value FROM settings WHERE name='root'").fetchone()
+        return row[0] if row is not None else ""
+
+    @root.setter
+    def root(self, value):
+        with self._transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO settings VALUES ('root', ?)", (str(value),))
+
+    def update(self, parameters, progress=None, cancel=None):
+        """Scan the root folder and index the new and modified ship files
+
+        The files that do not exist anymore, or are not under the root, are removed from the index
+
+        Args:
+            parameters (parameters_loader.Parameters): parameters to parse the ship files
+            progress (function): if given, called with (done, to_do) after each parsed file
+            cancel (threading.Event): if given, the update stops after the file being parsed
+                when it is set, keeping the files already parsed
+        Returns:
+            the amount of files parsed
+        """
+        root = self.root
+        on_disk = {}
+        if root:
+            for path in pathlib.Path(root).rglob(sd.SHIP_FILE_PATTERN):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                on_disk[str(path.resolve())] = (stat.st_mtime_ns, stat.st_size)
+
+        connection = self._connect()
+        try:
+            indexed = {path: (mtime, size) for path, mtime, size
+                       in connection.execute("SELECT path, mtime, size FROM ships")}
+            removed = [(path,) for path in indexed if path not in on_disk]
+            connection.executemany("DELETE FROM ships WHERE path=?", removed)
+            connection.commit()
+
+            to_parse = [path for path, stamp in on_disk.items() if indexed.get(path) != stamp]
+            for done, path in enumerate(to_parse, start=1):
+                if cancel is not None and cancel.is_set():
+                    to_parse = to_parse[:done - 1]
+                    break
+                connection.execute("INSERT OR REPLACE INTO ships VALUES "
+                                   "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (path, *on_disk[path], *_index_row(path, parameters)))
+                if done % _COMMIT_EVERY == 0:
+                    connection.commit()
+                if progress is not None:
+                    progress(done, len(to_parse))
+            connection.commit()
+        finally:
+            connection.close()
+        details.info("ship index: %s files parsed, %s removed", len(to_parse), len(removed))
+        return len(to_parse)
+
+    def search(self, text="", limit=1000):
+        """Find the correctly parsed ships that match all the words of the text
+
+        Each word is searched in the path, ship type, turret layout and picture name,
+        or compared to the displacement and caliber if it is a number
+
+        Args:
+            text (str): words separated by spaces, case insensitive
+            limit (int): maximum amount of results
+        Returns:
+            list of tuples, see COLUMNS
+        """
+        conditions = ["error IS NULL"]
+        values = []
+        for word in text.split():
+            like = f"%{word}%"
+            condition = "(path LIKE ? OR ship_type LIKE ? OR turrets LIKE ? OR picture LIKE ?"
+            values.extend([like, like, like, like])
+            if word.isdigit():
+                condition += " OR displacement=? OR caliber=?"
+                values.extend([int(word), int(word)])
+            conditions.append(condition + ")")
+        query = (f"SELECT {', '.join(COLUMNS)} FROM ships WHERE {' AND '.join(conditions)} "
+                 "ORDER BY path LIMIT ?")
+        with self._transaction() as connection:
+            return connection.execute(query, values + [limit]).fetchall()
+
+def _index_row(path, parameters):
+    """Parse a ship file into the indexed values
+
+    Returns:
+        tuple (ship_type, displacement, caliber, turrets, structures, points, picture, error)
+        if the file cannot be parsed, everything is None but the error
+    """
+    try:
+        with open(path, newline="") as file:
+            ship_data = sd.ShipData(file, parameters)
+    except (sd.ShipFileInvalidException, OSError, KeyError, IndexError, ValueError) as error:
+        return (None,)*7 + (f"{type(error).__name__}: {error}",)
+
+    turrets = " ".join(f"{turret.pos}{turret.guns}" for turret in ship_data.turrets_torps
+                       if isinstance(turret, Turret))
+    points = sum(len(structure.points) for structure in ship_data.structures)
+    picture = ship_data.side_pict.path.name if ship_data.side_pict is not None else None
+    return (ship_data.ship_type, ship_data.displacement, ship_data.caliber, turrets,
+            len(ship_data.structures), points, picture, None)
+
+def default_root(ship_file_path):
+    """The folder to index if none was set: the Save folder above the current ship's Game folder
+
+    Args:
+        ship_file_path (str): path to a ship file, or empty string
+    Returns:
+        path as a string, empty if there is no ship file
+    """
+    if not ship_file_path:
+        return ""
+    return os.fspath(pathlib.Path(ship_file_path).resolve().parent.parent)
@@ -0,0 +1,182 @@
+"""Find the part of the ship that is the nearest to a point, for the mouse picking
+
+The points are kept in the cells of a uniform grid: finding the nearest one only looks
+at the cells around the searched point, whatever the number of points.
+The index of a ship follows the changes of its superstructures and funnels
+through their notifications.
+"""
+import collections
+from math import floor, hypot, inf
+
+#grid cells per half length of the ship
+_CELLS_PER_HALF_LENGTH = 20
+
+#one pickable thing:
+#kind is "vertex", "funnel" or "turret"
+#owner is the Structure, Funnel or Turret
+#index is the index of the vertex in the structure's points, or of the turret's outline point
+#point is (x, y) in funnel coordinates
+Element = collections.namedtuple("Element", ["kind", "owner", "index", "point"])
+
+class GridIndex:
+    """Points with a key, in the cells of a uniform grid
+
+    Args:
+        cell_size (number): size of the cells, about the usual search distance
+    """
+    def __init__(self, cell_size):
+        self._cell_size = cell_size
+        #{(column, row): {key: point}}
+        self._cells = collections.defaultdict(dict)
+        #{key: point}
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, point):
+        return (floor(point[0]/self._cell_size), floor(point[1]/self._cell_size))
+
+    def point(self, key):
+        """The point of the key"""
+        return self._points[key]
+
+    def set(self, key, point):
+        """Add the point, or move it if the key is already there"""
+        self.remove(key)
+        self._points[key] = point
+        self._cells[self._cell(point)][key] = point
+
+    def remove(self, key):
+        """Remove the point of the key, if it is there"""
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(point)
+        del self._cells[cell][key]
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    def nearest(self, point, max_distance, accept=None):
+        """The key of the nearest point
+
+        Looks at the rings of cells around the point, from the inside,
+        until no point of the next ring can be nearer than the best one found
+
+        Args:
+            point (x, y): where to search from
+            max_distance (number): the points farther than that are ignored
+            accept (function): takes a key, returns False to ignore it. None to accept all
+        Returns:
+            (key, distance), (None, inf) if no point is near enough
+        """
+        best_key, best_distance = None, inf
+        column, row = self._cell(point)
+        max_ring = int(max_distance/self._cell_size) + 1
+        for ring in range(max_ring + 1):
+            if best_distance <= (ring - 1)*self._cell_size:
+                #all the points of this ring and the next ones are farther
+                break
+            for cell in _ring_cells(column, row, ring):
+                for key, other in self._cells.get(cell, {}).items():
+                    distance = hypot(other[0] - point[0], other[1] - point[1])
+                    if (distance < best_distance and distance <= max_distance
+                            and (accept is None or accept(key))):
+                        best_key, best_distance = key, distance
+        return best_key, best_distance
+
+def _ring_cells(column, row, ring):
+    """The cells at the ring distance from the cell, in a square"""
+    if ring == 0:
+        yield (column, row)
+        return
+    for delta in range(-ring, ring + 1):
+        yield (column + delta, row - ring)
+        yield (column + delta, row + ring)
+    for delta in range(-ring + 1, ring):
+        yield (column - ring, row + delta)
+        yield (column + ring, row + delta)
+
+class ShipElementsIndex:
+    """Index of the superstructures' vertices, funnels and turrets of a ship
+
+    Updated on the notifications of the superstructures and funnels.
+    The turrets cannot be edited, their outlines are indexed once.
+    Call close() when the index is not used anymore.
+
+    Args:
+        ship_data (model.shipdata.ShipData): the ship
+    """
+    def __init__(self, ship_data):
+        self._grid = GridIndex(ship_data.half_length/_CELLS_PER_HALF_LENGTH)
+        #{structure: number of indexed vertices}
+        self._vertex_counts = {}
+        self._unsubscribes = []
+        for structure in ship_data.structures:
+            self._index_structure(structure)
+            self._unsubscribes.append(structure.subscribe(self._on_structure_changed))
+        for funnel in ship_data.funnels.values():
+            self._index_funnel(funnel)
+            self._unsubscribes.append(funnel.subscribe(self._on_funnel_changed))
+        for turret in ship_data.turrets_torps:
+            for index, point in enumerate(turret.outline):
+                self._grid.set(("turret", turret, index), point)
+
+    def __len__(self):
+        return len(self._grid)
+
+    def close(self):
+        """Stop following the changes of the ship"""
+        for unsubscribe in self._unsubscribes:
+            unsubscribe()
+        self._unsubscribes = []
+
+    def nearest(self, point, max_distance, kinds=None):
+        """The part of the ship nearest to the point
+
+        Args:
+            point (x, y): in funnel coordinates
+            max_distance (number): in funnel coordinates, farther elements are ignored
+            kinds (set): the kinds of elements to search, all if None
+        Returns:
+            Element, None if nothing is near enough
+        """
+        accept = None if kinds is None else (lambda key: key[0] in kinds)
+        key, _distance = self._grid.nearest(point, max_distance, accept)
+        if key is None:
+            return None
+        return Element(key[0], key[1], key[2], self._grid.point(key))
+
+    def _index_structure(self, structure, start=0):
+        """Index the vertices of the structure, from the start index"""
+        for index in range(start, self._vertex_counts.get(structure, 0)):
+            self._grid.remove(("vertex", structure, index))
+        for index in range(start, len(structure.points)):
+            self._grid.set(("vertex", structure, index), structure.points[index])
+        self._vertex_counts[structure] = len(structure.points)
+
+    def _index_funnel(self, funnel):
+        #a funnel at 0 is not on the ship
+        if funnel.position != 0:
+            self._grid.set(("funnel", funnel, 0), (0, funnel.position))
+        else:
+            self._grid.remove(("funnel", funnel, 0))
+
+    def _on_structure_changed(self, structure, event_type, event_info):
+        if event_type == "update":
+            #with the partner of the point in mirrored mode
+            for index in event_info.get("indices", [event_info["index"]]):
+                self._grid.set(("vertex", structure, index), structure.points[index])
+        elif event_type in ("add_point", "delete_point"):
+            #the following vertices change index
+            self._index_structure(structure,
+                                  min(event_info.get("indices", [event_info["index"]])))
+        elif event_type == "replace_poits":
+            self._index_structure(structure)
+
+    def _on_funnel_changed(self, funnel, event_type, _event_info):
+        if event_type == "set_position":
+            self._index_funnel(funnel)
@@ -1,9 +1,9 @@
 """Class for the superstructures data
 And the commands that change it
 """
-from math import atan2, sin, cos, pi, sqrt
+from math import cos, sin, radians
 from window.framework import Observable, Command
-import model.shipdata as sd
+import model.geometry
 
 STRUCTURE_POINTS_MAX = 21
 
@@ -49,20 +49,22 @@ class Structure(Observable):
         #that's what the game seems to do
         rtw_points[:] = [point for point in rtw_points if (point[0] != 0 or point[1] != 0)]
 
-        #all duplicates are deleted, and the circular coordinates are converted to cartesian
+        #all consecutive duplicates are deleted, and the circular coordinates are converted
+        #to cartesian
+        #origin is more or less the middle of the ship
+        #x to the right
+        #y to the bow
+        #the magic value for the angle is from estimations from the game
+        unique_points = []
         temp_point = (0, 0)
         for point in rtw_points:
             if point != temp_point:
-                #origin is more or less the middle of the ship
-                #x to the right
-                #y to the bow
-                #the magic value for the angle is from estimations from the game
-                x = (-point[1]*sin(point[0]*sd.ANGLE_TO_RADS)
-                     *sd.STRUCTURE_TO_FUNNEL)
-                y = (-point[1]*cos(point[0]*sd.ANGLE_TO_RADS)
-                     *sd.STRUCTURE_TO_FUNNEL)
-                self._points.append((x, y))
-                temp_point = (point[0], point[1])
+                unique_points.append(point)
+                temp_point = point
+        #the angles and distances written in the file, one per point
+        self._rtw_points = unique_points
+        self._points = model.geometry.rtw_to_funnel(unique_points)
+        self._mirrored = False
 
     @property
     def fill(self):
@@ -79,14 +81,25 @@ class Structure(Observable):
 
     @property
     def points(self):
-        """expose the structure's point list"""
+        """expose the structure's point list
+
+        The points are snapped to the ones the ship file can store when they are set,
+        and the ones snapped on the point before them are merged into it,
+        so they are exactly the ones that will be loaded again
+        """
         return self._points
 
     @points.setter
     def points(self, value):
-        self._points = value
-        self._notify("replace_poits", {"new_points":value})
+        self._rtw_points, self._points = model.geometry.snap_outline(value)
+        self._notify("replace_poits", {"new_points":self._points})
+        if self._mirrored and not is_symmetrical(self._points):
+            self.mirrored = False
 
+    @property
+    def rtw_points(self):
+        """The (angle, distance) of the points as written in the ship file, do not modify it"""
+        return self._rtw_points
 
     def as_ini_section(self):
         """returns a dict that looks like the raw data loaded from the ship file
@@ -95,15 +108,9 @@ class Structure(Observable):
             intended to be used to write a new ship file with the modifications
         """
         section_content = {}
-        for index, point in enumerate(self._points):
-            angle = int(pi/2.0 * 1.0/sd.ANGLE_TO_RADS)
-            if point[1] != 0:
-                angle = int(atan2(-point[0], -point[1]) * 1.0/sd.ANGLE_TO_RADS)
-            distance = int(sqrt(pow(point[0], 2) + pow(point[1], 2))/sd.STRUCTURE_TO_FUNNEL)
+        for index, (angle, distance) in enumerate(self._rtw_points[:STRUCTURE_POINTS_MAX]):
             section_content[f"Point{index}Angle"] = angle
             section_content[f"Point{index}Distance"] = distance
-            if len(section_content)//2 >= STRUCTURE_POINTS_MAX:
-                break
 
         #pad the dict to the specified point amount with "empty" points
         if len(section_content)/2 < STRUCTURE_POINTS_MAX:
@@ -122,13 +129,33 @@ class Structure(Observable):
 
         It assumes the arguments are correct
             PLEASE OH PLEASE do not change the point list directly but use this method
+        In mirrored mode, the partner of the point is moved too,
+        and the point in the middle stays on the centerline
+        The point is snapped to the nearest one the ship file can store,
+        it is not moved if it would be snapped on a neighbour: the loading would merge them
         Args:
             point_index (int): the index of the point to be changed in the points list
             new_x (number): new value for x coordinate, funnel coordinates
             new_y (number):  new value for y coordinate, funnel coordinates
         """
-        self._points[point_index] = (new_x, new_y)
-        self._notify("update", {"index":point_index, "x":new_x, "y":new_y})
+        indices = [point_index]
+        if self._mirrored:
+            partner = self.partner_index(point_index)
+            if partner == point_index:
+                new_x = 0
+            else:
+                indices.append(partner)
+        new_rtw_points, new_points = model.geometry.snap_points([(new_x, new_y), (-new_x, new_y)])
+        rtw_points = list(self._rtw_points)
+        for index, rtw_point in zip(indices, new_rtw_points):
+            rtw_points[index] = rtw_point
+        if model.geometry.has_duplicates(rtw_points, indices):
+            return
+        for index, rtw_point, point in zip(indices, new_rtw_points, new_points):
+            self._points[index] = point
+            self._rtw_points[index] = rtw_point
+        new_x, new_y = new_points[0]
+        self._notify("update", {"index":point_index, "x":new_x, "y":new_y, "indices":indices})
 
     def add_point(self, point_index, new_x, new_y):
         """Call this when adding a point
@@ -136,24 +163,137 @@ class Structure(Observable):
         It assumes the arguments are correct
             PLEASE OH PLEASE do not change the point list directly but use this method
             or replace the whole list
+        In mirrored mode, the mirror of the point is added at the mirrored place.
+        In the middle of the outline, one point is added on the centerline if new_x is 0,
+        else the point and its mirror
+        A point on the centerline that is the first one stays the first one
         Args:
             point_index (int): the index of the point to be added in the points list
             new_x (number): new value for x coordinate, funnel coordinates
             new_y (number):  new value for y coordinate, funnel coordinates
+        Returns:
+            list of the indices of the added points, the asked point first,
+            empty if it would be snapped on a neighbour: the loading would merge them
         """
-        self._points.insert(point_index, (new_x, new_y))
-        self._notify("add_point", {"index":point_index, "x":new_x, "y":new_y})
+        count = len(self._points)
+        centerline_first = self._mirrored and mirror_center(self._points) == 0
+        if centerline_first and point_index == 0:
+            #the first point stays the one on the centerline
+            point_index = count
+        #where the mirror goes in the points before the addition
+        mirror_index = count - point_index + centerline_first
+        if not self._mirrored:
+            insertions = [(point_index, (new_x, new_y))]
+        elif point_index == mirror_index:
+            if new_x == 0:
+                insertions = [(point_index, (new_x, new_y))]
+            else:
+                #the point goes next to the point of its side
+                same_side = point_index > 0 and (self._points[point_index-1][0] < 0) == (new_x < 0)
+                point_first = same_side or point_index == 0
+                insertions = [(point_index + (not point_first), (new_x, new_y)),
+                              (point_index + point_first, (-new_x, new_y))]
+        elif point_index < mirror_index:
+            insertions = [(point_index, (new_x, new_y)),
+                          (mirror_index + 1, (-new_x, new_y))]
+        else:
+            #the mirror is before the point, the point moves by one
+            insertions = [(point_index + 1, (new_x, new_y)),
+                          (mirror_index, (-new_x, new_y))]
+        rtw_points = list(self._rtw_points)
+        new_rtw_points, _new_points = model.geometry.snap_points(
+            [point for _index, point in insertions])
+        for index, rtw_point in sorted(zip((index for index, _point in insertions),
+                                           new_rtw_points)):
+            rtw_points.insert(index, rtw_point)
+        if model.geometry.has_duplicates(rtw_points, [index for index, _point in insertions]):
+            return []
+        self.insert_points(insertions)
+        return [index for index, _point in insertions]
 
     def delete_point(self, point_index):
         """Call this when updating a point
 
         It assumes the arguments are correct
-
+        In mirrored mode, the partner of the point is deleted too
+        The points left next to a point at the same place are merged into it,
+        like the loading does
         Args:
             point_index (int): the index of the point to be changed in the points list
+        Returns:
+            list of (index, point) of the deleted points, to give to insert_points
         """
-        self._points.pop(point_index)
-        self._notify("delete_point", {"index": point_index})
+        indices = self.mirror_indices(point_index)
+        while True:
+            kept = [index for index in range(len(self._points)) if index not in indices]
+            merged = [index for previous, index in zip(kept, kept[1:])
+                      if self._rtw_points[previous] == self._rtw_points[index]]
+            if not merged:
+                break
+            indices.extend(self.mirror_indices(merged[0]))
+        deleted = [(index, self._points[index]) for index in sorted(indices)]
+        self.remove_points(indices, point_index)
+        return deleted
+
+    def mirror_indices(self, point_index):
+        """The point and its partner, if the structure is mirrored"""
+        if self._mirrored and self.partner_index(point_index) != point_index:
+            return [point_index, self.partner_index(point_index)]
+        return [point_index]
+
+    def partner_index(self, point_index):
+        """Index of the mirror of the point, in mirrored mode
+
+        The first point is the mirror of the last one, the second of the one before the last...
+        unless the first point is on the centerline, see mirror_center
+        """
+        return (mirror_center(self._points) - point_index) % len(self._points)
+
+    def insert_points(self, insertions):
+        """Add points, with one notification
+
+        No mirroring, intended for the undo of the deletions
+        The points are snapped to the nearest ones the ship file can store
+        Args:
+            insertions (list): (index, (x, y)), the index being the one of the point once
+                all the points are added
+        """
+        rtw_points, points = model.geometry.snap_points([point for _index, point in insertions])
+        for index, rtw_point, point in sorted(zip((index for index, _point in insertions),
+                                                  rtw_points, points)):
+            self._points.insert(index, point)
+            self._rtw_points.insert(index, rtw_point)
+        index, (new_x, new_y) = insertions[0][0], points[0]
+        self._notify("add_point", {"index":index, "x":new_x, "y":new_y,
+                                   "indices":sorted(index for index, _point in insertions)})
+
+    def remove_points(self, indices, point_index=None):
+        """Delete points, with one notification
+
+        No mirroring, intended for the undo of the additions
+        Args:
+            indices (list): indices of the points to delete
+            point_index (int): the point asked to be deleted, the first index if None
+        """
+        for index in sorted(indices, reverse=True):
+            self._points.pop(index)
+            self._rtw_points.pop(index)
+        self._notify("delete_point", {"index": indices[0] if point_index is None else point_index,
+                                      "indices": sorted(indices)})
+
+    @property
+    def mirrored(self):
+        """If True, the points are kept symmetrical: see update_point, add_point, delete_point
+
+        Use the SetMirrored command to make the points symmetrical when turning it on
+        """
+        return self._mirrored
+
+    @mirrored.setter
+    def mirrored(self, value):
+        if value != self._mirrored:
+            self._mirrored = value
+            self._notify("mirrored", {"mirrored": value})
 
 class UpdatePoint(Command):
     """Command to update a point
@@ -196,17 +336,17 @@ class DeletePoint(Command):
         super().__init__()
         self._structure = structure
         self._point_index = point_index
-        self._old_point = self._structure.points[point_index]
+        self._deleted = []
 
     def execute(self):
-        """Delete the point
+        """Delete the point, and its partner in mirrored mode
         """
-        self._structure.delete_point(self._point_index)
+        self._deleted = self._structure.delete_point(self._point_index)
 
     def undo(self):
-        """restore the point
+        """restore the points at their place
         """
-        self._structure.add_point(self._point_index, *self._old_point)
+        self._structure.insert_points(self._deleted)
 
 class AddPoint(Command):
     """Command to add a point
@@ -223,16 +363,18 @@ class AddPoint(Command):
         self._structure = structure
         self._point_index = point_index
         self._new_point = (new_x, new_y)
+        self._added = []
 
     def execute(self):
-        """Add point
+        """Add point, and its mirror in mirrored mode
         """
-        self._structure.add_point(self._point_index, *self._new_point)
+        self._added = self._structure.add_point(self._point_index, *self._new_point)
 
     def undo(self):
-        """remove the new point
+        """remove the new points
         """
-        self._structure.delete_point(self._point_index)
+        if self._added:
+            self._structure.remove_points(self._added)
 
 class SetFill(Command):
     """Command to change the fill state of a structure
@@ -259,47 +401,286 @@ class SetFill(Command):
         if self._old_fill_state != self._fill_state:
             self._structure.fill = self._old_fill_state
 
-class ApplySymmetry(Command):
-    """Make a structure symmetrical
+class SetMirrored(Command):
+    """Turn the mirrored mode of a structure on or off
 
-    The side that will be mirrored is the side of the first point that is not on the centerline
-    the points after the first point that on the other side of the centerline will be deleted
+    When turning it on, the structure is made symmetrical with symmetrical_points,
+    unless it already is
+    Args:
+        structure (Structure): the structure to be updated
+        mirrored (bool): the new mode
     """
-    def __init__(self, structure):
+    def __init__(self, structure, mirrored):
         super().__init__()
         self._structure = structure
-        #fun with pass by reference vs pass by value
-        self._old_points = structure.points
+        self._mirrored = mirrored
+        self._old_mirrored = structure.mirrored
+        #copies, the list of the structure is changed in place by the other commands
+        self._old_points = list(structure.points)
+        self._new_points = None
+        if mirrored and not is_symmetrical(structure.points):
+            self._new_points = symmetrical_points(structure.points)
+
+    def execute(self):
+        if self._new_points is not None:
+            self._structure.points = list(self._new_points)
+        self._structure.mirrored = self._mirrored
 
+    def undo(self):
+        self._structure.mirrored = self._old_mirrored
+        if self._new_points is not None:
+            self._structure.points = list(self._old_points)
+
+def symmetrical_points(points):
+    """The points made symmetrical along the centerline
+
+    The side that will be mirrored is the side of the first point that is not on the centerline
+    the points after the first point that on the other side of the centerline will be deleted
+    Args:
+        points (list): (x, y) tuples
+    Returns:
+        list of (x, y), see mirror_center for the partner of each point
+    """
+    new_points = []
+    port_side_first = True
+    #find the first point that is not on the centerline of the ship
+    for point in points:
+        if point[0] > 0:
+            port_side_first = False
+            break
+        elif point[0] < 0:
+            port_side_first = True
+            break
+
+    #add the points that are on the side to mirror
+    #and build the list of points to add
+    #the first point that is not on this side is the first point to delete
+    #all following points will be deleted
+    points_to_mirror = []
+    for point in points:
+        if (point[0] == 0 or
+                (point[0] < 0 and port_side_first) or
+                (point[0] > 0 and not port_side_first)):
+            new_points.append((point[0], point[1]))
+            points_to_mirror.insert(0, (-point[0], point[1]))
+        else:
+            break
+    #the points on the centerline at the ends of the side are their own partners,
+    #they are not added twice
+    if points_to_mirror and points_to_mirror[0][0] == 0:
+        points_to_mirror.pop(0)
+    if points_to_mirror and new_points[0][0] == 0:
+        points_to_mirror.pop()
+    #concatene the points to keep and points to add
+    return new_points + points_to_mirror
+
+def mirror_center(points):
+    """c such that the partner of the i-th point is the (c-i)-th, modulo the amount of points
+
+    The first point is the partner of the last one and the middle point of an odd amount
+    of points is its own partner: c is n-1.
+    Unless the points are not symmetrical that way and the first point is on the centerline:
+    it is its own partner, and so is the middle point of an even amount of points: c is 0.
+    """
+    count = len(points)
+    if count and points[0][0] == 0 and not _is_mirror(points, count - 1):
+        return 0
+    return count - 1
+
+def _is_mirror(points, center):
+    """True if each point is the mirror of the (center-i)-th point"""
+    count = len(points)
+    return all(points[index][0] == -points[(center - index) % count][0]
+               and points[index][1] == points[(center - index) % count][1]
+               for index in range(count))
+
+def is_symmetrical(points):
+    """True if each point is the mirror of its partner, see Structure.partner_index"""
+    return _is_mirror(points, mirror_center(points))
+
+class ReplacePoints(Command):
+    """Replace all the points of one or more structures
+
+    Each structure is notified once, with its whole new list of points
+    The structures whose points do not change are left alone
+    Args:
+        structures (list): the structures to change, or a single Structure
+        new_points (function): takes a structure and a copy of its list of points,
+            returns the new list
+    """
+    def __init__(self, structures, new_points):
+        super().__init__()
+        if isinstance(structures, Structure):
+            structures = [structures]
+        self._structures = []
+        self._old_points = []
         self._new_points = []
-        port_side_first = True
-        #find the first point that is not on the centerline of the ship
-        for point in structure.points:
-            if point[0] > 0:
-                port_side_first = False
-                break
-            elif point[0] < 0:
-                port_side_first = True
-                break
+        self._old_mirrored = []
+        for structure in structures:
+            #copies, the lists of the structures can be changed in place by the other commands
+            old_points = list(structure.points)
+            points = new_points(structure, list(old_points))
+            if points != old_points:
+                self._structures.append(structure)
+                self._old_points.append(old_points)
+                self._new_points.append(points)
+                self._old_mirrored.append(structure.mirrored)
 
-        #add the points that are on the side to mirror
-        #and build the list of points to add
-        #the first point that is not on this side is the first point to delete
-        #all following points will be deleted
-        points_to_mirror = []
-        for point in structure.points:
-            if (point[0] == 0 or
-                    (point[0] < 0 and port_side_first) or
-                    (point[0] > 0 and not port_side_first)):
-                self._new_points.append((point[0], point[1]))
-                points_to_mirror.insert(0, (-point[0], point[1]))
-            else:
-                break
-        #concatene the points to keep and points to add
-        self._new_points = self._new_points + points_to_mirror
+    @property
+    def changed(self):
+        """False if no structure is changed"""
+        return bool(self._structures)
+
+    @property
+    def structures(self):
+        """The structures that are changed"""
+        return list(self._structures)
 
     def execute(self):
-        self._structure.points = self._new_points
+        for structure, points in zip(self._structures, self._new_points):
+            structure.points = list(points)
 
     def undo(self):
-        self._structure.points = self._old_points
+        for structure, points, mirrored in zip(self._structures, self._old_points,
+                                               self._old_mirrored):
+            structure.points = list(points)
+            #the new points may have not been symmetrical
+            structure.mirrored = mirrored
+
+class TransformStructures(ReplacePoints):
+    """Apply an affine transform to all the points of one or more structures
+
+    Args:
+        structures (list): the structures to transform, or a single Structure
+        matrix (tuple): (a, b, c, d), the new point is (a*x + b*y, c*x + d*y) + offset
+        offset (tuple): (x, y) added after the matrix
+    """
+    def __init__(self, structures, matrix, offset=(0, 0)):
+        a, b, c, d = matrix
+        off_x, off_y = offset
+        super().__init__(structures,
+                         lambda _structure, points: [(a*x + b*y + off_x, c*x + d*y + off_y)
+                                                     for x, y in points])
+
+class Translate(TransformStructures):
+    """Move structures
+
+    Args:
+        structures (list): the structures to move, or a single Structure
+        offset_x (number): towards starboard, funnel coordinates
+        offset_y (number): towards the bow, funnel coordinates
+    """
+    def __init__(self, structures, offset_x, offset_y):
+        super().__init__(structures, (1, 0, 0, 1), (offset_x, offset_y))
+
+class Scale(TransformStructures):
+    """Make structures bigger or smaller
+
+    Args:
+        structures (list): the structures to scale, or a single Structure
+        factor_x (number): scale across the ship
+        factor_y (number): scale along the ship, the same as factor_x if None
+        center (tuple): (x, y) point that does not move, the middle of the structures if None
+    """
+    def __init__(self, structures, factor_x, factor_y=None, center=None):
+        if factor_y is None:
+            factor_y = factor_x
+        if center is None:
+            center = structures_center(structures)
+        super().__init__(structures, (factor_x, 0, 0, factor_y),
+                         (center[0]*(1 - factor_x), center[1]*(1 - factor_y)))
+
+class Rotate(TransformStructures):
+    """Turn structures
+
+    Args:
+        structures (list): the structures to turn, or a single Structure
+        degrees (number): positive angles turn the bow side of the structures towards port
+        center (tuple): (x, y) point that does not move, the middle of the structures if None
+    """
+    def __init__(self, structures, degrees, center=None):
+        if center is None:
+            center = structures_center(structures)
+        cos_angle = cos(radians(degrees))
+        sin_angle = sin(radians(degrees))
+        super().__init__(structures, (cos_angle, -sin_angle, sin_angle, cos_angle),
+                         (center[0] - cos_angle*center[0] + sin_angle*center[1],
+                          center[1] - sin_angle*center[0] - cos_angle*center[1]))
+
+class Mirror(TransformStructures):
+    """Mirror structures
+
+    Args:
+        structures (list): the structures to mirror, or a single Structure
+        across_centerline (bool): if True, port and starboard are swapped, around the centerline
+            of the ship. If False, the bow and stern sides are swapped, around the middle of
+            the structures
+    """
+    def __init__(self, structures, across_centerline=True):
+        if across_centerline:
+            super().__init__(structures, (-1, 0, 0, 1))
+        else:
+            center_y = structures_center(structures)[1]
+            super().__init__(structures, (1, 0, 0, -1), (0, 2*center_y))
+
+class Simplify(ReplacePoints):
+    """Remove the points of structures that change their outline the least
+
+    See model.geometry.simplify
+    Args:
+        structures (list): the structures to simplify, or a single Structure
+        max_points (int): the most points to keep in each structure
+        tolerance (number): the points worth less than this area are removed even
+            if there are not too many points
+    """
+    def __init__(self, structures, max_points=STRUCTURE_POINTS_MAX, tolerance=0.0):
+        super().__init__(structures,
+                         lambda structure, points: model.geometry.simplify(
+                             points, max_points, tolerance, closed=structure.fill))
+
+    @property
+    def removed_points(self):
+        """How many points are removed from all the structures"""
+        return (sum(len(points) for points in self._old_points)
+                - sum(len(points) for points in self._new_points))
+
+    def deviations(self):
+        """For each structure, how far the simplified outline is from the original
+
+        Returns:
+            list of (largest distance, area difference), see model.geometry.outline_deviation
+        """
+        return [model.geometry.outline_deviation(old, new, closed=structure.fill)
+                for structure, old, new in zip(self._structures, self._old_points,
+                                               self._new_points)]
+
+    def new_points(self):
+        """The points of each structure after the simplification"""
+        return [list(points) for points in self._new_points]
+
+def simplify_ship(ship_data):
+    """Bring all the superstructures of a ship down to STRUCTURE_POINTS_MAX points
+
+    To use as a transform of batch.py:
+        python batch.py <folder> --transform model.structure:simplify_ship
+    Args:
+        ship_data (model.shipdata.ShipData)
+    """
+    Simplify(ship_data.structures).execute()
+
+def structures_center(structures):
+    """The middle of the bounding box of all the points of the structures
+
+    Args:
+        structures (list): Structure, or a single Structure
+    Returns:
+        (x, y) in funnel coordinates, (0, 0) if there is no point
+    """
+    if isinstance(structures, Structure):
+        structures = [structures]
+    points = [point for structure in structures for point in structure.points]
+    if not points:
+        return (0, 0)
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return ((min(xs) + max(xs))/2, (min(ys) + max(ys))/2)
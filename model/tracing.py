@@ -0,0 +1,124 @@
+"""Trace the outline of a superstructure from a picture of it seen from the top
+
+The picture is the whole length of the ship, bow at the left like in the top view,
+the superstructure drawn dark on a light or transparent background.
+The thresholding and the cleaning are done by PIL, only the walk around the outline
+is done in python, so its time depends on the outline's length, not on the picture's size.
+"""
+from PIL import Image, ImageFilter
+import model.geometry
+from model.structure import STRUCTURE_POINTS_MAX
+
+#bigger pictures are reduced before the tracing, more details are lost by the simplification
+MAX_TRACED_SIZE = 1024
+DEFAULT_THRESHOLD = 128
+
+#the 8 neighbours of a pixel, clockwise on the screen (y down), starting from the east
+_NEIGHBOURS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+_NEIGHBOUR_INDEX = {offset: index for index, offset in enumerate(_NEIGHBOURS)}
+
+class TracingError(Exception):
+    """Nothing to trace in the picture"""
+
+def trace_picture(path, half_length, threshold=DEFAULT_THRESHOLD,
+                  max_points=STRUCTURE_POINTS_MAX):
+    """The outline of the first shape from the top of the picture, in funnel coordinates
+
+    Args:
+        path (str): the picture file
+        half_length (number): the half length of the ship, the width of the picture
+            is the length of the ship
+        threshold (int): the pixels darker than that, from 0 to 255, are the superstructure
+        max_points (int): the outline is simplified down to this amount of points
+    Returns:
+        list of (x, y) points
+    Raises:
+        OSError if the picture cannot be read, TracingError if there is no shape
+    """
+    with Image.open(path) as picture:
+        mask, scale = make_mask(picture, threshold)
+    outline = trace_outline(mask)
+    if len(outline) < 3:
+        raise TracingError(f"No shape darker than {threshold} in {path}")
+    #same orientation as the top view, the center of the picture is the center of the ship
+    to_funnel = 2.0*half_length/(mask.width*scale)
+    center_x, center_y = mask.width/2.0, mask.height/2.0
+    points = [(-(y - center_y)*scale*to_funnel, (x - center_x)*scale*to_funnel)
+              for x, y in outline]
+    return model.geometry.simplify(points, max_points)
+
+def make_mask(picture, threshold=DEFAULT_THRESHOLD):
+    """Black and white version of the picture, the superstructure in white
+
+    Args:
+        picture (PIL.Image.Image)
+        threshold (int): the pixels darker than that, from 0 to 255, are the superstructure
+    Returns:
+        (mode "L" image with only 0 and 255, size of one of its pixels in pixels of the picture)
+    """
+    scale = 1.0
+    if max(picture.size) > MAX_TRACED_SIZE:
+        scale = max(picture.size)/MAX_TRACED_SIZE
+        picture = picture.resize((max(1, round(picture.width/scale)),
+                                  max(1, round(picture.height/scale))))
+    if picture.mode in ("RGBA", "LA") or "transparency" in picture.info:
+        #the transparent pixels are the background
+        rgba = picture.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        picture = Image.alpha_composite(background, rgba)
+    mask = picture.convert("L").point(lambda value: 255 if value < threshold else 0)
+    #remove the isolated pixels and fill the small holes
+    mask = mask.filter(ImageFilter.MedianFilter(3))
+    return mask, scale
+
+def trace_outline(mask):
+    """Walk around the first white shape from the top of the mask, clockwise on the screen
+
+    Moore neighbourhood tracing: from each pixel of the outline, the next one is the first
+    white neighbour clockwise from the black pixel the walk came from
+
+    Args:
+        mask (PIL.Image.Image): mode "L", the shapes in white (255)
+    Returns:
+        list of (x, y) pixels of the outline, empty if the mask is all black
+    """
+    bounding_box = mask.getbbox()
+    if bounding_box is None:
+        return []
+    top = bounding_box[1]
+    start = (mask.crop((0, top, mask.width, top + 1)).tobytes().find(b"\xff"), top)
+    pixels = mask.load()
+    width, height = mask.size
+
+    def is_white(x, y):
+        return 0 <= x < width and 0 <= y < height and pixels[x, y] == 255
+
+    outline = [start]
+    current = start
+    #the pixel at the west of the first white pixel of the row is black
+    backtrack = _NEIGHBOUR_INDEX[(-1, 0)]
+    first_state = None
+    for _ in range(4*width*height):
+        for turn in range(1, 9):
+            direction = (backtrack + turn) % 8
+            offset = _NEIGHBOURS[direction]
+            candidate = (current[0] + offset[0], current[1] + offset[1])
+            if is_white(*candidate):
+                break
+        else:
+            #a single pixel
+            return outline
+        #the last black pixel checked, relative to the new pixel
+        previous = _NEIGHBOURS[(direction - 1) % 8]
+        black = (current[0] + previous[0], current[1] + previous[1])
+        backtrack = _NEIGHBOUR_INDEX[(black[0] - candidate[0], black[1] - candidate[1])]
+        current = candidate
+        #stop when entering the first pixel again the same way
+        state = (current, backtrack)
+        if first_state is None:
+            first_state = state
+        elif state == first_state:
+            break
+        outline.append(current)
+    #the first pixel was added again
+    return outline[:-1]
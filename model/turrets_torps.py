@@ -1,7 +1,10 @@
 """Turrets and torpedo mpunt data in a useable form"""
 
+import logging
 from schemas import TURRETS
 
+details = logging.getLogger("Details")
+
 class Turret:
     """Container for the data needed to draw a turret
     Args:
@@ -13,28 +16,21 @@ class Turret:
         all_turrs (list[string]): the list of all the turret position used on the ship
         parameters (Parameters): parameters for the whole program
     Attr:
+        pos (string): the letter of the turret
+        guns (int): how many guns in the turret
         outline (list[(x,y)]): a list of vertexes for the turret's outline. In funnel coordinates
     """
     def __init__(self, caliber, pos, guns, half_length, all_turrs, parameters):
+        self.pos = pos
+        self.guns = guns
         to_bow = parameters.turrets_positions[pos]["to_bow"]
-        scale = parameters.turrets_scale[caliber]
 
         rel_position = rel_tur_or_torp_position(pos, all_turrs, parameters)
 
         position = (rel_position[0]*half_length, rel_position[1]*half_length)
-        raw_outline = parameters.turrets_outlines[guns]
-        #mirror if the turret should be backward
-        if not to_bow:
-            mirrored_outline = [(vertex[0], -vertex[1]) for vertex in raw_outline]
-        else:
-            mirrored_outline = raw_outline
-        #also mirror if the turret is to starboard
-        if position[0] >0:
-            mirrored_outline = [(-vertex[0], vertex[1]) for vertex in mirrored_outline]
-        #scale according to gun caliber
-        scaled_outline = [(vertex[0]*scale, vertex[1]*scale) for vertex in mirrored_outline]
+        template = parameters.outline_templates.turret(guns, caliber, to_bow, position[0] > 0)
         #move according to position
-        self.outline = [(vertex[0]+position[0], vertex[1]+position[1]) for vertex in scaled_outline]
+        self.outline = [(vertex[0]+position[0], vertex[1]+position[1]) for vertex in template]
 
 def rel_tur_or_torp_position(pos, all_turrs, parameters):
     """Apply the game's logic to get a turret or toorp mount position
@@ -42,51 +38,76 @@ def rel_tur_or_torp_position(pos, all_turrs, parameters):
     Args:
         pos (string): the letter of the turret, like "A", "X", etc...
             positions 1 to 4 are also passed as strings
-        all_turrs (list[string]): the list of all the turret position used on the ship
+        all_turrs (iterable[string]): all the turret positions used on the ship
         parameters (Parameters): parameters for the whole program
     """
-    rel_position = parameters.turrets_positions[pos]["positions"][0]
-
-    if pos == "X":
-        if ("W" in all_turrs or "V" in all_turrs or
-                "R" in all_turrs or "C" in all_turrs):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-
-    elif pos == "W":
-        if ("X" in all_turrs or "V" in all_turrs or "B" in all_turrs):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-
-    elif pos == "A":
-        if ("V" in all_turrs or
-                {"W", "X", "Y"}.issubset(all_turrs) or
-                "C" in all_turrs and "X" in all_turrs or
-                "B" in all_turrs and "R" in all_turrs and (
-                    ("W" in all_turrs or "X" in all_turrs or "Y" in all_turrs))):
-            rel_position = parameters.turrets_positions[pos]["positions"][2]
-        elif ("X" in all_turrs or  "W" in all_turrs or
-              "B" in all_turrs and ("C" in all_turrs or "R" in all_turrs or "W" in all_turrs)):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-
-    elif pos == "B":
-        if ("V" in all_turrs or
-                "W" in all_turrs or
-                "C" in all_turrs and ("X" in all_turrs or "Y" in all_turrs) or
-                "A" in all_turrs and "R" in all_turrs and ("X" in all_turrs or "Y" in all_turrs)):
-            rel_position = parameters.turrets_positions[pos]["positions"][2]
-        elif ("X" in all_turrs or "Y" in all_turrs or "C" in all_turrs or "R" in all_turrs):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-
-    elif pos == "Y":
-        if (("X" in all_turrs and "W" in all_turrs.keys()) or
-                ("V" in all_turrs and "W"in all_turrs)):
-            rel_position = parameters.turrets_positions[pos]["positions"][3]
-        elif ("V" in all_turrs or "W" in all_turrs or
-              ({"A", "B", "C"}.issubset(all_turrs)) or
-              ({"A", "B", "R"}.issubset(all_turrs))):
-            rel_position = parameters.turrets_positions[pos]["positions"][2]
-        elif ("B" in all_turrs or "C" in all_turrs or "R" in all_turrs or "X" in all_turrs):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-    return rel_position
+    return parameters.turrets_resolver.layout_positions(all_turrs)[pos]
+
+class TurretPositionResolver:
+    """The game's rules that choose between the possible positions of the turrets
+
+    The rules are data, from turrets_rules.json, compiled once to sets of turrets.
+    The position of a turret depends on the other turrets of the ship, so the positions of all
+    the turrets of a layout are resolved at once and kept for the next ships with the same layout.
+
+    Args:
+        turrets_positions (dict): the possible positions of each turret, from
+            turrets_positions.json
+        rules (dict): the rules for each turret, see schemas.TURRETS_RULES_SCHEMA
+    """
+    #more layouts than that are forgotten, a whole save folder has far less
+    MAX_LAYOUTS = 10000
+
+    def __init__(self, turrets_positions, rules):
+        self._turrets_positions = turrets_positions
+        #{turret: [(index in its positions, [frozensets of turrets that must all be there])]}
+        self._rules = {}
+        for pos, pos_rules in rules.items():
+            count = len(turrets_positions.get(pos, {}).get("positions", []))
+            compiled = []
+            for rule in pos_rules:
+                if rule["position"] >= count:
+                    details.warning("Turret %s has no position %d, rule ignored",
+                                    pos, rule["position"])
+                    continue
+                compiled.append((rule["position"], [frozenset(turrets) for turrets in rule["when"]]))
+            self._rules[pos] = compiled
+        #{frozenset of turrets: {turret: relative position}}
+        self._layouts = {}
+
+    def position_index(self, pos, layout):
+        """Index of the position of the turret among its possible positions
+
+        Args:
+            pos (str): the turret
+            layout (frozenset): all the turrets of the ship
+        Returns:
+            the index given by the first rule that matches, 0 if none
+        """
+        for index, alternatives in self._rules.get(pos, []):
+            if any(turrets <= layout for turrets in alternatives):
+                return index
+        return 0
+
+    def layout_positions(self, all_turrs):
+        """The relative positions of all the turrets of a ship
+
+        Args:
+            all_turrs (iterable[str]): all the turrets of the ship
+        Returns:
+            dict {turret: relative position (x, y)}, shared by all the ships with the same
+            turrets: do not modify it
+        """
+        layout = frozenset(all_turrs)
+        positions = self._layouts.get(layout)
+        if positions is None:
+            positions = {pos: self._turrets_positions[pos]["positions"][self.position_index(pos,
+                                                                                           layout)]
+                         for pos in layout if pos in self._turrets_positions}
+            if len(self._layouts) >= TurretPositionResolver.MAX_LAYOUTS:
+                self._layouts.clear()
+            self._layouts[layout] = positions
+        return positions
 
 class Torpedo:
     """Container for the data needed to draw a torpedo mount
@@ -112,11 +133,66 @@ class Torpedo:
             rel_position = [0, 1.5]
 
         position = (rel_position[0]*half_length, rel_position[1]*half_length)
-        raw_outline = parameters.torpedo_outlines[tubes_count]
-        #rotate if the turret should be backward
-        if not to_bow:
-            rotated_outline = [(point[0], -point[1]) for point in raw_outline]
-        else:
-            rotated_outline = raw_outline
+        template = parameters.outline_templates.torpedo(tubes_count, to_bow)
         #move according to position
-        self.outline = [(point[0]+position[0], point[1]+position[1]) for point in rotated_outline]
+        self.outline = [(point[0]+position[0], point[1]+position[1]) for point in template]
+
+class OutlineTemplates:
+    """The outlines of the turrets and torpedo mounts, turned and scaled once for all the ships
+
+    Only the translation to its position is left to do for each turret or mount.
+    The templates are tuples shared by all the turrets with the same key: do not modify them.
+
+    Args:
+        turrets_outlines (list): for each amount of guns, the outline of the turret
+        turrets_scale (list): scale factor of the turret outlines, per gun caliber
+        torpedo_outlines (list): for each amount of tubes, the outline of the mount
+    """
+    def __init__(self, turrets_outlines, turrets_scale, torpedo_outlines):
+        self._turrets_outlines = turrets_outlines
+        self._turrets_scale = turrets_scale
+        self._torpedo_outlines = torpedo_outlines
+        #{(guns, caliber, to_bow, starboard): template}
+        self._turrets = {}
+        #{(tubes, to_bow): template}
+        self._torpedoes = {}
+
+    def turret(self, guns, caliber, to_bow, starboard):
+        """Outline of a turret at the origin
+
+        Args:
+            guns (int): how many guns in the turret
+            caliber (int): caliber of the guns
+            to_bow (bool): False if the turret faces the stern
+            starboard (bool): True if the turret is to starboard
+        Returns:
+            tuple of (x, y), in funnel coordinates
+        """
+        key = (guns, caliber, to_bow, starboard)
+        template = self._turrets.get(key)
+        if template is None:
+            scale = self._turrets_scale[caliber]
+            #mirrored if the turret is to starboard or backward, then scaled for the caliber
+            x_sign = -1 if starboard else 1
+            y_sign = 1 if to_bow else -1
+            template = tuple((x_sign*vertex[0]*scale, y_sign*vertex[1]*scale)
+                             for vertex in self._turrets_outlines[guns])
+            self._turrets[key] = template
+        return template
+
+    def torpedo(self, tubes, to_bow):
+        """Outline of a torpedo mount at the origin
+
+        Args:
+            tubes (int): how many tubes in the mount
+            to_bow (bool): False if the mount faces the stern
+        Returns:
+            tuple of (x, y), in funnel coordinates
+        """
+        key = (tubes, to_bow)
+        template = self._torpedoes.get(key)
+        if template is None:
+            y_sign = 1 if to_bow else -1
+            template = tuple((point[0], y_sign*point[1]) for point in self._torpedo_outlines[tubes])
+            self._torpedoes[key] = template
+        return template
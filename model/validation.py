@@ -0,0 +1,154 @@
+"""Checks of a ship file that find all its problems, instead of stopping at the first one
+
+Used to check whole save folders without opening each file in the editor
+"""
+import pathlib
+import schemas
+import model.shipdata as sd
+from model.inifile import IniFile, IniError
+from model.structure import Structure, STRUCTURE_POINTS_MAX
+import model.outlinecheck
+
+def issue(check, message, section=None):
+    """One problem found in a ship file
+
+    Args:
+        check (str): identifier of the check that failed, like "turret_position"
+        message (str): human readable description
+        section (str): the section where the problem is, None if it is not in one section
+    Returns:
+        dict that can be dumped as JSON
+    """
+    return {"check": check, "section": section, "message": message}
+
+def validate_file(path, parameters):
+    """Run all the checks on a ship file
+
+    Args:
+        path (pathlib.Path): the ship file
+        parameters (parameters_loader.Parameters): parameters for the whole program
+    Returns:
+        list of issues, empty if the file is correct
+    """
+    path = pathlib.Path(path)
+    try:
+        with open(path, newline="") as file:
+            ini_file = IniFile.read(file)
+    except OSError as error:
+        return [issue("read", str(error))]
+    except IniError as error:
+        return [issue("ini", error.message)]
+
+    issues = check_mandatory(ini_file)
+    if issues:
+        #the other checks need the mandatory options
+        return issues
+    issues.extend(check_ship_type(ini_file, parameters))
+    issues.extend(check_turrets(ini_file, parameters))
+    issues.extend(check_torpedo_mounts(ini_file, parameters))
+    issues.extend(check_structures(ini_file))
+    issues.extend(check_side_picture(ini_file, path))
+    if not issues:
+        #anything that the checks above missed
+        try:
+            with open(path, newline="") as file:
+                sd.ShipData(file, parameters)
+        except (sd.ShipFileInvalidException, OSError, KeyError, IndexError, ValueError) as error:
+            issues.append(issue("load", f"{type(error).__name__}: {error}"))
+    return issues
+
+def check_mandatory(ini_file):
+    """The sections and options without which the file cannot be loaded"""
+    issues = []
+    for section, options in sd.MANDATORY_SECTIONS_OPTIONS.items():
+        if section not in ini_file:
+            issues.append(issue("mandatory", f"Missing section: {section}", section))
+            continue
+        for option in options:
+            if option not in ini_file[section]:
+                issues.append(issue("mandatory",
+                                    f"Missing option: {option}", section))
+    return issues
+
+def check_ship_type(ini_file, parameters):
+    """The ship type must have lengths, and the displacement must be under the biggest tonnage
+
+    A heavier ship is loaded with the length of the biggest tonnage, probably not the right one
+    """
+    ship_type = ini_file["Data"]["ShipType"]
+    if ship_type not in parameters.ships_hlengths:
+        return [issue("ship_type", f"Unknown ship type: {ship_type}", "Data")]
+    try:
+        displacement = ini_file["Data"].getint("Displacement")
+    except ValueError:
+        return [issue("displacement",
+                      f"Displacement is not a number: {ini_file['Data']['Displacement']}", "Data")]
+    if displacement >= max(parameters.ships_hlengths[ship_type]):
+        return [issue("displacement",
+                      f"No length for a {ship_type} of {displacement} tons, "
+                      "the longest is used", "Data")]
+    return []
+
+def check_turrets(ini_file, parameters):
+    """The turrets must be at known positions and have a known amount of guns"""
+    issues = []
+    for section, content in ini_file.items():
+        if "Turret" not in section:
+            continue
+        pos = content.get("Pos")
+        if pos not in schemas.TURRETS or pos not in parameters.turrets_positions:
+            issues.append(issue("turret_position", f"Unknown turret position: {pos}", section))
+        guns = content.get("Guns", "")
+        if not guns.isdigit() or int(guns) >= len(parameters.turrets_outlines):
+            issues.append(issue("turret_guns", f"Unknown amount of guns: {guns}", section))
+    return issues
+
+def check_torpedo_mounts(ini_file, parameters):
+    """The torpedo mounts must have an outline for their amount of tubes
+
+    There are MAX_TORP_PER_MOUNT outlines, from 0 tubes
+    """
+    issues = []
+    for section, content in ini_file.items():
+        if "TorpedoMount" not in section:
+            continue
+        tubes = content.get("Tubes", "")
+        if not tubes.isdigit():
+            issues.append(issue("torpedo_tubes", f"Tubes is not a number: {tubes}", section))
+        elif int(tubes) >= len(parameters.torpedo_outlines):
+            issues.append(issue("torpedo_tubes",
+                                f"{tubes} tubes, more than {len(parameters.torpedo_outlines)-1}",
+                                section))
+    return issues
+
+def check_structures(ini_file):
+    """The superstructures cannot have more than STRUCTURE_POINTS_MAX points,
+    and their outlines must be drawable"""
+    issues = []
+    for section, content in ini_file.items():
+        if "Superstructure" not in section:
+            continue
+        try:
+            structure = Structure(section, content)
+        except ValueError as error:
+            issues.append(issue("structure", f"Not a superstructure: {error}", section))
+            continue
+        points_count = len(structure.points)
+        if points_count > STRUCTURE_POINTS_MAX:
+            issues.append(issue("structure_points",
+                                f"{points_count} points, more than {STRUCTURE_POINTS_MAX}",
+                                section))
+        issues.extend(check_structure_outline(structure))
+    return issues
+
+def check_structure_outline(structure):
+    """The outline must not cross itself, have edges of no length or spikes"""
+    return [issue("structure_outline", model.outlinecheck.describe(problem), structure.name)
+            for problem in model.outlinecheck.find_problems(structure.points, structure.fill)]
+
+def check_side_picture(ini_file, path):
+    """The side picture must be next to the ship file"""
+    picture_name = ini_file["Data"]["PictureName"]
+    if not path.parent.joinpath(picture_name).is_file():
+        return [issue("side_picture", f"Missing side picture: {picture_name}", "Data")]
+    return []
@@ -4,6 +4,8 @@ import logging
 import pathlib
 import jsonschema
 import schemas
+from model.turrets_torps import TurretPositionResolver, OutlineTemplates
+from model.dimensions import ShipDimensions
 
 summary = logging.getLogger("Summary")
 details = logging.getLogger("Details")
@@ -57,13 +59,20 @@ class Parameters:
             from origin to bow
             The key is the biggest tonnage for which the length is still valid
             the value is the distance from origin to bow in funnel coordinates.
+        ship_dimensions (ShipDimensions): the half length of a ship from ships_hlengths
         recent_files (dict): a ict of recently saved files, the side view zoom and offset for them,
             and if the grid was displayed or not
         turrets_positions (dict): for each turret positions, a list of (int,int)
             that describe their possible positions. Relative coordinates.
+        turrets_rules (dict): for each turret position, the rules of the game that choose
+            between its possible positions
+        turrets_resolver (TurretPositionResolver): the positions of the turrets of a ship,
+            from the rules
         turrets_outlines(dict): for each amount of gun per turret (0=casemate), the turret's outline
             that will be drawn in the top view. Absolute coordinates
         turrets_scale (dict): scale factor for the turret outlines, per gun caliber
+        torpedo_outlines (list): for each amount of tubes per mount, the mount's outline
+        outline_templates (OutlineTemplates): the turret and mount outlines, turned and scaled
         zoom (number): how much should the side view be zoomed, ! multiplied by the ship half length
         offset (number): by how much the side pict should be horizontally offset
         grid (bool): if the grid was displayed or not when the ship file was saved
@@ -78,6 +87,10 @@ class Parameters:
         self.turrets_positions = read_json(schemas.TURRETS_POSITION_PATH,
                                            schemas.TURRETS_POSITION_SCHEMA,
                                            schemas.DEFAULT_TURRETS_POSITION)
+        self.turrets_rules = read_json(schemas.TURRETS_RULES_PATH,
+                                       schemas.TURRETS_RULES_SCHEMA,
+                                       schemas.DEFAULT_TURRETS_RULES)
+        self.turrets_resolver = TurretPositionResolver(self.turrets_positions, self.turrets_rules)
         self.turrets_scale = read_json(schemas.TURRETS_SCALE_PATH,
                                        schemas.TURRETS_SCALE_SCHEMA,
                                        schemas.DEFAULT_TURRETS_SCALE)
@@ -87,6 +100,8 @@ class Parameters:
         self.torpedo_outlines = read_json(schemas.TORPEDO_OUTLINES_PATH,
                                           schemas.TORPEDO_OUTLINES_SCHEMA,
                                           schemas.DEFAULT_TORPEDO_OUTLINES)
+        self.outline_templates = OutlineTemplates(self.turrets_outlines, self.turrets_scale,
+                                                  self.torpedo_outlines)
 
         raw_hlengths = read_json(schemas.HALF_LENGTHS_PATH,
                                  schemas.HALF_LENGTHS_SCHEMA,
@@ -95,6 +110,7 @@ class Parameters:
         self.ships_hlengths = {}
         for ship_type, lengths_dicts in raw_hlengths.items():
             self.ships_hlengths[ship_type] = convert_str_key_to_int(lengths_dicts)
+        self.ship_dimensions = ShipDimensions(self.ships_hlengths)
 
         #if the requested file is in the list of recent files,
         #use its zoom and offset for the side pict
@@ -42,6 +42,48 @@ _DEFAULT_TURRET_POSITION = {"positions": [(1000, 1000), (1000, 1000), (1000, 100
                            "to_bow": True}
 DEFAULT_TURRETS_POSITION = {turret:_DEFAULT_TURRET_POSITION for turret in TURRETS}
 
+#rules of the game that choose between the possible positions of a turret
+#for each turret position, the rules are tried in order and the first that matches
+#gives the index in the "positions" of turrets_positions.json, the first one if none matches
+#a rule matches if all the turrets of one of the lists of "when" are on the ship
+TURRETS_RULES_PATH = "./data/turrets_rules.json"
+TURRETS_RULES_SCHEMA = (
+{
+  "$schema" : "http://json-schema.org/draft-04/schema#",
+  "type":"object",
+  "patternProperties":
+  {
+    "^(" + "|".join(TURRETS) + ")$":
+    {
+      "type":"array",
+      "items":
+      {
+        "type":"object",
+        "properties":
+        {
+          "position": {"type":"integer", "minimum":0, "maximum":3},
+          "when":
+          {
+            "type":"array",
+            "items":
+            {
+              "type":"array",
+              "items":{"enum":TURRETS},
+              "minItems":1
+            },
+            "minItems":1
+          }
+        },
+        "required":["position", "when"],
+        "additionalProperties":False
+      }
+    }
+  },
+  "additionalProperties":False
+})
+#all the turrets at their first position
+DEFAULT_TURRETS_RULES = {}
+
 #turret outlines
 MAX_GUNS_PER_TURRET = 4
 TURRETS_OUTLINES_PATH = "./data/turrets_outlines.json"
@@ -160,6 +202,36 @@ HALF_LENGTHS_SCHEMA = (
 })
 DEFAULT_HALF_LENGTHS = {ship_type:{"2000000":200} for ship_type in SHIP_TYPES}
 
+#measures of a reference ship for the calibration, in pixels of a top or side picture
+#the turrets are only measured along the length on a side picture
+#the half length in funnel coordinates is given, or the funnel coordinates per pixel
+CALIBRATION_MEASURES_SUFFIX = ".json"
+CALIBRATION_MEASURES_SCHEMA = (
+{
+  "$schema" : "http://json-schema.org/draft-04/schema#",
+  "type":"object",
+  "properties":
+  {
+    "view": {"enum":["top", "side"]},
+    "bow": {"type":"array", "items":{"type":"number"}, "minItems":2, "maxItems":2},
+    "stern": {"type":"array", "items":{"type":"number"}, "minItems":2, "maxItems":2},
+    "half_length": {"type":"number", "minimum":0, "exclusiveMinimum":True},
+    "scale": {"type":"number", "minimum":0, "exclusiveMinimum":True},
+    "turrets":
+    {
+      "type":"object",
+      "patternProperties":
+      {
+        "^(" + "|".join(TURRETS) + ")$":
+        {"type":"array", "items":{"type":"number"}, "minItems":2, "maxItems":2}
+      },
+      "additionalProperties":False
+    }
+  },
+  "required":["view", "bow", "stern"],
+  "additionalProperties":False
+})
+
 RECENT_FILES_PATH = pathlib.Path(appdirs.user_data_dir("Draftnought")).joinpath("recent_files.json")
 RECENT_FILES_SCHEMA = (
   {
@@ -195,6 +267,13 @@ RECENT_FILES_SCHEMA = (
 )
 
 DEFAULT_RECENT_FILES ={}
+
+#snapshots of the parsed ship files, to reopen them without parsing
+SHIP_CACHE_PATH = pathlib.Path(appdirs.user_data_dir("Draftnought")).joinpath("ship_cache")
+SHIP_CACHE_MAX_BYTES = 20*1000*1000
+
+#searchable index of the ship files
+SHIP_INDEX_PATH = pathlib.Path(appdirs.user_data_dir("Draftnought")).joinpath("ship_index.sqlite")
 DEFAULT_PARAM = {
     "sideview_zoom":1.2571630183484306*257,
     "sideview_offset":-350,
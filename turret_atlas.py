@@ -0,0 +1,319 @@
+"""Where every turret lands in every layout of turrets, to check the turret positions data
+
+All the layouts of up to --max-turrets turrets of schemas.TURRETS are resolved by the
+turret position rules, by a pool of worker processes. For each ship type, the pairs of
+turrets at given positions whose outlines overlap are flagged, on the shortest ship of the type
+where they are the closest. Superfiring turrets overlap in the top view too,
+the flags are things to look at, not errors.
+
+The atlas is one JSON file: the possible positions of each turret, the index of the position
+of each turret of each layout, and for each ship type the overlapping pairs with the smallest
+layout they are in. The overlaps of any layout are found from them by layout_overlaps.
+Comparing it to the atlas of a previous version shows what a change of the rules or positions moved.
+Contact sheets with one layout per overlapping pair can be drawn too.
+
+Example:
+    python turret_atlas.py --output atlas.json --sheets ./atlas_sheets
+    python turret_atlas.py --output new_atlas.json --compare atlas.json
+"""
+import argparse
+import concurrent.futures
+import itertools
+import json
+import pathlib
+import sys
+import time
+from PIL import Image, ImageDraw
+import schemas
+import parameters_loader
+import model.geometry
+
+DEFAULT_MAX_TURRETS = 5
+DEFAULT_GUNS = 2
+DEFAULT_CALIBER = 12
+#overlaps smaller than this, in funnel coordinates, are only turrets touching
+DEFAULT_MIN_AREA = 1.0
+
+#contact sheets
+CELL_SIZE = (300, 90)
+SHEET_COLUMNS = 4
+SHEET_ROWS = 12
+
+#parameters of the worker process, set once per process by _init_worker
+_parameters = None
+
+def layouts(first, max_turrets):
+    """All the layouts whose first turret, in the order of schemas.TURRETS, is first
+
+    Args:
+        first (str): a turret of schemas.TURRETS
+        max_turrets (int): the most turrets in a layout
+    Yields:
+        tuples of turrets, in the order of schemas.TURRETS
+    """
+    others = schemas.TURRETS[schemas.TURRETS.index(first) + 1:]
+    for size in range(max_turrets):
+        for turrets in itertools.combinations(others, size):
+            yield (first,) + turrets
+
+def shortest_half_length(parameters, ship_type):
+    """The half length of the smallest ships of the type"""
+    return min(parameters.ships_hlengths[ship_type].values())
+
+def turret_outline(parameters, pos, index, half_length, guns, caliber):
+    """The outline of a turret at one of its possible positions, as Turret makes it
+
+    Returns:
+        list of (x, y), in funnel coordinates
+    """
+    rel_position = parameters.turrets_positions[pos]["positions"][index]
+    position = (rel_position[0]*half_length, rel_position[1]*half_length)
+    template = parameters.outline_templates.turret(guns, caliber,
+                                                   parameters.turrets_positions[pos]["to_bow"],
+                                                   position[0] > 0)
+    return [(vertex[0]+position[0], vertex[1]+position[1]) for vertex in template]
+
+def pair_name(placed1, placed2):
+    """Name of two turrets at given positions, like "A2-X0" for A at its third position and X at
+    its first one"""
+    return f"{placed1[0]}{placed1[1]}-{placed2[0]}{placed2[1]}"
+
+def outlines_overlap(parameters, ship_type, placed1, placed2, options):
+    """If the outlines of two turrets at given positions overlap
+
+    Args:
+        placed1, placed2 (tuple): (turret, index of its position)
+    """
+    half_length = shortest_half_length(parameters, ship_type)
+    outline1, outline2 = (turret_outline(parameters, pos, index, half_length,
+                                         options["guns"], options["caliber"])
+                          for pos, index in (placed1, placed2))
+    if not model.geometry.boxes_overlap(model.geometry.bounding_box(outline1),
+                                        model.geometry.bounding_box(outline2)):
+        return False
+    pieces = model.geometry.intersection_pieces(model.geometry.triangulate(outline1),
+                                                model.geometry.triangulate(outline2))
+    return sum(model.geometry.polygon_area(piece) for piece in pieces) > options["min_area"]
+
+def atlas_job(first, options):
+    """Resolve the layouts starting with one turret and find their overlaps on all ship types
+
+    The position of a turret does not depend on the ship type, only the overlaps do.
+    Each pair of turrets at given positions is only intersected once, whatever the amount
+    of layouts it is in.
+    Top level function so it can be sent to the worker processes
+
+    Returns:
+        ({layout: the index of the position of each turret, as a string of digits},
+         {ship_type: {pair_name: the first layout with the pair}}) for the overlapping pairs
+    """
+    resolver = _parameters.turrets_resolver
+    indices = {}
+    #{(placed1, placed2): first layout}
+    pairs = {}
+    for turrets in layouts(first, options["max_turrets"]):
+        layout = frozenset(turrets)
+        placed = [(pos, resolver.position_index(pos, layout)) for pos in turrets]
+        name = "".join(turrets)
+        indices[name] = "".join(str(index) for _pos, index in placed)
+        for pair in itertools.combinations(placed, 2):
+            pairs.setdefault(pair, name)
+    overlaps = {ship_type: {pair_name(*pair): name for pair, name in pairs.items()
+                            if outlines_overlap(_parameters, ship_type, *pair, options)}
+                for ship_type in schemas.SHIP_TYPES}
+    return indices, overlaps
+
+def _init_worker(parameters):
+    """Runs once in each worker process"""
+    global _parameters
+    _parameters = parameters
+
+def make_atlas(parameters, options, workers=None):
+    """Resolve all the layouts and find the overlapping turrets in a pool of processes
+
+    Args:
+        parameters (parameters_loader.Parameters)
+        options (dict): max_turrets, guns, caliber and min_area
+        workers (int): amount of processes, None for as many as processors
+    Returns:
+        the atlas, a dict ready to be written as JSON
+    """
+    atlas = {"options": options,
+             "positions": {pos: parameters.turrets_positions[pos]["positions"]
+                           for pos in schemas.TURRETS},
+             "layouts": {},
+             "ship_types": {ship_type: {"half_length": shortest_half_length(parameters, ship_type),
+                                        "overlaps": {}}
+                            for ship_type in schemas.SHIP_TYPES}}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=_init_worker,
+                                                initargs=(parameters,)) as executor:
+        futures = [executor.submit(atlas_job, first, options) for first in schemas.TURRETS]
+        for future in concurrent.futures.as_completed(futures):
+            indices, overlaps = future.result()
+            atlas["layouts"].update(indices)
+            for ship_type, pairs in overlaps.items():
+                known = atlas["ship_types"][ship_type]["overlaps"]
+                for name, layout in pairs.items():
+                    #keep the shortest example, the same whatever the order the jobs end in
+                    if name not in known or (len(layout), layout) < (len(known[name]),
+                                                                      known[name]):
+                        known[name] = layout
+    atlas["layouts"] = dict(sorted(atlas["layouts"].items()))
+    for data in atlas["ship_types"].values():
+        data["overlaps"] = dict(sorted(data["overlaps"].items()))
+    return atlas
+
+def layout_overlaps(atlas, ship_type, name):
+    """The pairs of overlapping turrets of a layout
+
+    Args:
+        atlas (dict): as given by make_atlas
+        ship_type (str)
+        name (str): the layout, its turrets in the order of schemas.TURRETS
+    Returns:
+        list of pair names
+    """
+    overlaps = atlas["ship_types"][ship_type]["overlaps"]
+    placed = list(zip(name, (int(index) for index in atlas["layouts"][name])))
+    return [pair_name(*pair) for pair in itertools.combinations(placed, 2)
+            if pair_name(*pair) in overlaps]
+
+def compare(old_atlas, atlas, out=sys.stdout):
+    """Print what changed from an older atlas
+
+    Returns:
+        the amount of changes
+    """
+    changes = 0
+    for name, indices in atlas["layouts"].items():
+        old_indices = old_atlas["layouts"].get(name)
+        if old_indices is not None and old_indices != indices:
+            changes += 1
+            print(f"{name}: positions {old_indices} -> {indices}", file=out)
+    for ship_type, data in atlas["ship_types"].items():
+        old_overlaps = old_atlas["ship_types"].get(ship_type, {}).get("overlaps", {})
+        for pair in sorted(set(data["overlaps"]) - set(old_overlaps)):
+            changes += 1
+            print(f"{ship_type} {pair}: new overlap, in {data['overlaps'][pair]}", file=out)
+        for pair in sorted(set(old_overlaps) - set(data["overlaps"])):
+            changes += 1
+            print(f"{ship_type} {pair}: no more overlap", file=out)
+    return changes
+
+def draw_sheets(atlas, parameters, folder, limit):
+    """Draw one layout per pair of overlapping turrets, the pair in red
+
+    Args:
+        atlas (dict): as given by make_atlas
+        parameters (parameters_loader.Parameters)
+        folder (str): where the PNG files are written, one or more per ship type
+        limit (int): the most layouts drawn per ship type
+    Returns:
+        list of the paths of the written files
+    """
+    folder = pathlib.Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    options = atlas["options"]
+    written = []
+    per_sheet = SHEET_COLUMNS*SHEET_ROWS
+    for ship_type, data in atlas["ship_types"].items():
+        pairs = list(data["overlaps"].items())[:limit]
+        for sheet_number, start in enumerate(range(0, len(pairs), per_sheet), start=1):
+            sheet = Image.new("RGB", (CELL_SIZE[0]*SHEET_COLUMNS, CELL_SIZE[1]*SHEET_ROWS),
+                              "white")
+            draw = ImageDraw.Draw(sheet)
+            for cell, (pair, name) in enumerate(pairs[start:start + per_sheet]):
+                origin = ((cell % SHEET_COLUMNS)*CELL_SIZE[0], (cell//SHEET_COLUMNS)*CELL_SIZE[1])
+                _draw_cell(draw, origin, name, pair, atlas, ship_type, parameters, options)
+            path = folder.joinpath(f"{ship_type}_{sheet_number:02d}.png")
+            sheet.save(path)
+            written.append(path)
+    return written
+
+def _draw_cell(draw, origin, name, pair, atlas, ship_type, parameters, options):
+    """Draw one layout, bow to the left like the top view"""
+    half_length = atlas["ship_types"][ship_type]["half_length"]
+    factor = (CELL_SIZE[0]/2.1)/half_length
+    center = (origin[0] + CELL_SIZE[0]/2, origin[1] + CELL_SIZE[1]/2)
+
+    def to_cell(point):
+        return (point[1]*factor + center[0], -point[0]*factor + center[1])
+
+    for line in parameters.hulls_shapes[ship_type]:
+        draw.line([to_cell((point[0]*half_length, point[1]*half_length)) for point in line],
+                  fill="gray")
+    for pos, index in zip(name, atlas["layouts"][name]):
+        outline = turret_outline(parameters, pos, int(index), half_length,
+                                 options["guns"], options["caliber"])
+        draw.polygon([to_cell(point) for point in outline],
+                     outline="red" if f"{pos}{index}" in pair.split("-") else "black")
+    draw.text((origin[0] + 4, origin[1] + 2), f"{pair} in {name}", fill="black")
+    draw.rectangle([origin, (origin[0] + CELL_SIZE[0] - 1, origin[1] + CELL_SIZE[1] - 1)],
+                   outline="lightgray")
+
+def make_arg_parser():
+    """Command line arguments"""
+    parser = argparse.ArgumentParser(description="Resolve the positions of the turrets of all "
+                                                 "the layouts and find the overlapping ones")
+    parser.add_argument("-o", "--output", default="turret_atlas.json",
+                        help="the atlas JSON file to write, default: turret_atlas.json")
+    parser.add_argument("--max-turrets", type=int, default=DEFAULT_MAX_TURRETS,
+                        help=f"the most turrets per layout, default: {DEFAULT_MAX_TURRETS}")
+    parser.add_argument("--guns", type=int, default=DEFAULT_GUNS,
+                        help=f"guns per turret for the outlines, default: {DEFAULT_GUNS}")
+    parser.add_argument("--caliber", type=int, default=DEFAULT_CALIBER,
+                        help=f"caliber of the guns for the outlines, default: {DEFAULT_CALIBER}")
+    parser.add_argument("--min-area", type=float, default=DEFAULT_MIN_AREA,
+                        help="smallest overlap that is flagged, in funnel coordinates, "
+                             f"default: {DEFAULT_MIN_AREA}")
+    parser.add_argument("-c", "--compare", default=None, metavar="OLD_ATLAS",
+                        help="print the changes from this atlas, exit code 1 if there are any")
+    parser.add_argument("-s", "--sheets", default=None, metavar="FOLDER",
+                        help="draw the pairs of overlapping turrets in this folder")
+    parser.add_argument("--sheet-limit", type=int, default=SHEET_COLUMNS*SHEET_ROWS*2,
+                        help="the most pairs drawn per ship type")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="amount of worker processes, default: one per processor")
+    return parser
+
+def main(argv=None):
+    """Make the atlas, write it, compare it and draw it
+
+    Returns:
+        the exit code: 1 if there are changes from the compared atlas, 0 if not
+    """
+    args = make_arg_parser().parse_args(argv)
+    parameters = parameters_loader.Parameters("")
+    if not 0 <= args.caliber < len(parameters.turrets_scale):
+        print(f"The caliber must be between 0 and {len(parameters.turrets_scale) - 1}")
+        return 1
+    if not 0 <= args.guns < len(parameters.turrets_outlines):
+        print(f"The guns per turret must be between 0 and {len(parameters.turrets_outlines) - 1}")
+        return 1
+    options = {"max_turrets": args.max_turrets, "guns": args.guns, "caliber": args.caliber,
+               "min_area": args.min_area}
+
+    start = time.perf_counter()
+    atlas = make_atlas(parameters, options, args.workers)
+    with open(args.output, "w") as file:
+        json.dump(atlas, file, separators=(",", ":"))
+    print(f"{len(atlas['layouts'])} layouts in {time.perf_counter() - start:.2f} s, "
+          f"written to {args.output}")
+    for ship_type, data in atlas["ship_types"].items():
+        print(f"{ship_type:<4}{len(data['overlaps']):6} pairs of overlapping turrets")
+
+    if args.sheets is not None:
+        paths = draw_sheets(atlas, parameters, args.sheets, args.sheet_limit)
+        print(f"{len(paths)} contact sheets in {args.sheets}")
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            old_atlas = json.load(file)
+        changes = compare(old_atlas, atlas)
+        print(f"{changes} changes from {args.compare}")
+        return 1 if changes else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
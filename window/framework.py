@@ -34,6 +34,14 @@ class CommandStack:
         self._undo_stack.append(command)
         command.execute()
 
+    def clear(self):
+        """Forget all the commands
+
+        When the data was changed outside of the commands, they might not be valid anymore
+        """
+        self._undo_stack = []
+        self._redo_stack = []
+
     def undo(self):
         """Undo the command on top of the undoing stack
         Then add is on to of the redo stack
@@ -93,6 +101,12 @@ class Observable:
         for call in self._subscribers:
             call(self, event_type, event_info)
 
+    def __getstate__(self):
+        """The subscribers are not pickled: they are widgets or bound to widgets"""
+        state = self.__dict__.copy()
+        state["_subscribers"] = []
+        return state
+
 class Subscriber(ABC):
     """Subscriber for the observer pattern
 
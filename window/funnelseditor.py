@@ -109,6 +109,15 @@ class FunnelEditor(tk.Frame, Subscriber, Observable):
         self._command_stack.do(model.funnel.MoveFunnel(self._funnel,
                                                        point[1]))
 
+    def activate(self):
+        """Give the focus to the editor, so that it gets the clicks on the top view"""
+        self._pos_entry.focus_set()
+
+    @property
+    def funnel(self):
+        """The edited funnel"""
+        return self._funnel
+
     @property
     def oval(self):
         """Pipe throught the funnel's data state"""
@@ -0,0 +1,154 @@
+"""Dialog to find and open a ship from the index of all ship files"""
+
+import threading
+import tkinter as tk
+from tkinter import filedialog
+from tkinter.ttk import Treeview, Scrollbar, Entry, Label, Button
+import model.shipindex
+
+#how often to check on the background indexing, in ms
+_UPDATE_POLL_MS = 100
+
+_COLUMNS_WIDTHS = {"path": 330, "ship_type": 40, "displacement": 70, "caliber": 40,
+                   "turrets": 120, "structures": 40, "points": 40, "picture": 100}
+_COLUMNS_TITLES = {"path": "File", "ship_type": "Type", "displacement": "Tons",
+                   "caliber": "Guns", "turrets": "Turrets", "structures": "Str.",
+                   "points": "Pts", "picture": "Picture"}
+
+class IndexDialog(tk.Toplevel):
+    """List of the indexed ships, filtered as the user types
+
+    The index is updated in a background thread when the dialog opens
+
+    Args:
+        parent (tk.Tk): the main window
+        ship_index (model.shipindex.ShipIndex): the index to search
+        parameters (parameters_loader.Parameters): parameters to parse the ship files
+        on_open (function): called with the path of the ship to open
+    """
+    def __init__(self, parent, ship_index, parameters, on_open):
+        super().__init__(parent)
+        self.title("Open from index")
+        self.transient(parent)
+        self._index = ship_index
+        self._parameters = parameters
+        self._on_open = on_open
+        self._progress = (0, 0)
+        self._update_thread = None
+        #set to stop the running update
+        self._cancel_update = threading.Event()
+        #the root changed while an update was running, update again when it stops
+        self._update_again = False
+        self._poll_id = None
+
+        if not self._index.root:
+            self._index.root = model.shipindex.default_root(parameters.current_file_path)
+
+        self._root_var = tk.StringVar(value=self._index.root)
+        Label(self, textvariable=self._root_var).grid(row=0, column=0, sticky=tk.W)
+        Button(self, text="Change folder", command=self._change_root).grid(row=0, column=1)
+
+        self._filter_var = tk.StringVar()
+        self._filter_var.trace_add("write", self._refresh_list)
+        filter_entry = Entry(self, textvariable=self._filter_var)
+        filter_entry.grid(row=1, column=0, columnspan=2, sticky=tk.W+tk.E)
+        filter_entry.bind("<Return>", self._open_selected)
+        filter_entry.bind("<Down>", self._focus_list)
+
+        columns = model.shipindex.COLUMNS
+        self._tree = Treeview(self, columns=columns, selectmode="browse", height=20)
+        self._tree.column("#0", minwidth=0, width=0)
+        for column in columns:
+            self._tree.column(column, width=_COLUMNS_WIDTHS[column])
+            self._tree.heading(column, text=_COLUMNS_TITLES[column])
+        self._tree.grid(row=2, column=0, sticky=tk.N+tk.S+tk.E+tk.W)
+        self._tree.bind("<Double-1>", self._open_selected)
+        self._tree.bind("<Return>", self._open_selected)
+        scroll = Scrollbar(self, command=self._tree.yview)
+        scroll.grid(row=2, column=1, sticky=tk.N+tk.S+tk.W)
+        self._tree.configure(yscrollcommand=scroll.set)
+
+        self._status_var = tk.StringVar()
+        Label(self, textvariable=self._status_var).grid(row=3, column=0, sticky=tk.W)
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(2, weight=1)
+
+        self._refresh_list()
+        self._start_update()
+        filter_entry.focus_set()
+
+    def _start_update(self):
+        """Update the index in a background thread, and check on it from the Tk loop
+
+        A running update is stopped, and started again for the new root when it has stopped
+        """
+        if self._update_thread is not None and self._update_thread.is_alive():
+            self._cancel_update.set()
+            self._update_again = True
+            return
+        self._update_again = False
+        self._cancel_update = threading.Event()
+        self._progress = (0, 0)
+        self._update_thread = threading.Thread(target=self._update_index,
+                                               args=(self._cancel_update,), daemon=True)
+        self._update_thread.start()
+        self._poll_update()
+
+    def _update_index(self, cancel):
+        """Runs in the background thread, no Tk calls here"""
+        self._index.update(self._parameters, progress=self._set_progress, cancel=cancel)
+
+    def _set_progress(self, done, to_do):
+        self._progress = (done, to_do)
+
+    def _poll_update(self):
+        self._poll_id = None
+        done, to_do = self._progress
+        if self._update_thread.is_alive():
+            self._status_var.set(f"Indexing {done}/{to_do}..." if to_do else "Scanning...")
+            #the first file comes after the removal of the files of another root
+            if done == 1 or done and done % 50 == 0:
+                self._refresh_list()
+            self._poll_id = self.after(_UPDATE_POLL_MS, self._poll_update)
+        elif self._update_again:
+            self._start_update()
+        else:
+            self._status_var.set("")
+            self._refresh_list()
+
+    def _change_root(self):
+        folder = filedialog.askdirectory(parent=self, initialdir=self._index.root or None)
+        if folder:
+            self._index.root = folder
+            self._root_var.set(folder)
+            self._start_update()
+
+    def _refresh_list(self, *_args):
+        """Fill the list with the ships matching the filter"""
+        self._tree.delete(*self._tree.get_children())
+        for row in self._index.search(self._filter_var.get()):
+            self._tree.insert("", "end", values=["" if value is None else value for value in row])
+        children = self._tree.get_children()
+        if children:
+            self._tree.selection_set(children[0])
+
+    def _focus_list(self, _event):
+        self._tree.focus_set()
+        if self._tree.selection():
+            self._tree.focus(self._tree.selection()[0])
+
+    def _open_selected(self, *_args):
+        selection = self._tree.selection()
+        if not selection:
+            return
+        path = self._tree.set(selection[0], "path")
+        self.destroy()
+        self._on_open(path)
+
+    def destroy(self):
+        """Stop checking on the background indexing, it finishes on its own"""
+        if self._poll_id is not None:
+            self.after_cancel(self._poll_id)
+            self._poll_id = None
+        super().destroy()
@@ -8,6 +8,8 @@ _WIDTH = 701
 _HEIGHT = 301
 _GRID_STEPS = 25
 _GRID_RGBA = (0, 0, 0, 125)
+#how often to check if the side picture is decoded, in ms
+_PICTURE_POLL_MS = 50
 
 class SideView(tk.Canvas, Subscriber):
     """Display the side view picture if one is defined in the ship data
@@ -15,6 +17,8 @@ class SideView(tk.Canvas, Subscriber):
     Can pan with mouse drag
     TODO:debug the initial height calculations
 
+    The picture is decoded in the background: a placeholder text is displayed until it is ready
+
     Args:
         parent (tk.Frame): the parent frame where the picture goes
         shipdata (model.shipdata): shipdata that has, or does not have, a side_pict
@@ -23,12 +27,13 @@ class SideView(tk.Canvas, Subscriber):
     def __init__(self, parent, ship_data, parameters, sideview):
         self._parameters = parameters
         Subscriber.__init__(self, sideview)
-        if ship_data.side_pict:
-            self._image = ship_data.side_pict
+        self._side_pict = ship_data.side_pict
+        if self._side_pict is not None:
+            self._side_pict.start()
             self.borderwidth = 2
         else:
-            self._image = Image.new(mode="RGBA", size=(1, 1), color=(0, 0, 0, 0))
             self.borderwidth = 0
+        self._image = Image.new(mode="RGBA", size=(1, 1), color=(0, 0, 0, 0))
         self._tkimage = ImageTk.PhotoImage(self._image)
         tk.Canvas.__init__(self, parent,
                            width=_WIDTH,
@@ -58,6 +63,33 @@ class SideView(tk.Canvas, Subscriber):
 
         self.bind("<MouseWheel>", self._on_mousewheel)
 
+        self._poll_id = None
+        self._placeholder_id = None
+        if self._side_pict is not None:
+            self._placeholder_id = self.create_text(self.canvasx(_WIDTH/2),
+                                                    self.canvasy(_HEIGHT/2),
+                                                    text="Loading side picture...")
+            self._wait_for_picture()
+
+    def _wait_for_picture(self):
+        """Check if the side picture is decoded, display it if it is, check again later if not"""
+        self._poll_id = None
+        if not self._side_pict.ready:
+            self._poll_id = self.after(_PICTURE_POLL_MS, self._wait_for_picture)
+            return
+        self.delete(self._placeholder_id)
+        image = self._side_pict.result()
+        if image is not None:
+            self._image = image
+            self._re_zoom(self._parameters.sideview_zoom)
+
+    def destroy(self):
+        """Stop waiting for the picture when the view is destroyed"""
+        if self._poll_id is not None:
+            self.after_cancel(self._poll_id)
+            self._poll_id = None
+        super().destroy()
+
     def _on_click(self, event):
         """Mark the start of the pan
         no pan along y axis
@@ -0,0 +1,108 @@
+"""Dialog to simplify superstructures, with a preview of the result"""
+
+import tkinter as tk
+from tkinter.ttk import Label, Button
+import model.structure
+
+_CANVAS_WIDTH = 400
+_CANVAS_HEIGHT = 250
+_MARGIN = 10
+#steps of the tolerance slider
+_SLIDER_STEPS = 200
+
+class SimplifyDialog(tk.Toplevel):
+    """Shows the superstructures before and after the simplification, updated with the slider
+
+    The simplification always brings the structures down to STRUCTURE_POINTS_MAX points,
+    the tolerance removes more points
+
+    Args:
+        parent (tk.Widget): the widget that opens the dialog
+        structures (list): the superstructures to simplify
+        command_stack (CommandStack): the undo/redo stack common to the whole programm
+    """
+    def __init__(self, parent, structures, command_stack):
+        super().__init__(parent)
+        self.title("Simplify")
+        self.transient(parent.winfo_toplevel())
+        self._structures = structures
+        self._command_stack = command_stack
+        self._command = None
+
+        points = [point for structure in structures for point in structure.points]
+        self._to_canvas = _make_converter(points)
+
+        self._canvas = tk.Canvas(self, width=_CANVAS_WIDTH, height=_CANVAS_HEIGHT,
+                                 borderwidth=2, relief="ridge", background="white")
+        self._canvas.grid(row=0, column=0, columnspan=2)
+
+        max_tolerance = _max_tolerance(points)
+        self._tolerance_var = tk.DoubleVar(value=0)
+        tk.Scale(self, label="Tolerance (area)", variable=self._tolerance_var,
+                 from_=0, to=max_tolerance, resolution=max_tolerance/_SLIDER_STEPS,
+                 orient=tk.HORIZONTAL, command=self._preview).grid(row=1, column=0, columnspan=2,
+                                                                 sticky=tk.W+tk.E)
+        self._info_var = tk.StringVar()
+        Label(self, textvariable=self._info_var).grid(row=2, column=0, columnspan=2)
+
+        Button(self, text="Apply", command=self._apply).grid(row=3, column=0)
+        Button(self, text="Cancel", command=self.destroy).grid(row=3, column=1)
+
+        self._preview()
+        #the structures must not change while the dialog is open
+        self.grab_set()
+
+    def _preview(self, *_args):
+        """Simplify with the current tolerance and draw the result over the original"""
+        self._command = model.structure.Simplify(self._structures,
+                                                 tolerance=self._tolerance_var.get())
+        self._canvas.delete("all")
+        for structure in self._structures:
+            self._draw(structure.points, structure.fill, "grey")
+        for structure, points in zip(self._command.structures, self._command.new_points()):
+            self._draw(points, structure.fill, "red", mark_points=True)
+
+        before = sum(len(structure.points) for structure in self._structures)
+        deviations = self._command.deviations()
+        distance = max((deviation[0] for deviation in deviations), default=0)
+        area = sum(deviation[1] for deviation in deviations)
+        self._info_var.set(f"{before} → {before - self._command.removed_points} points, "
+                           f"largest deviation {distance:.1f}, area change {area:.0f}")
+
+    def _draw(self, points, closed, color, mark_points=False):
+        if len(points) < 2:
+            return
+        canvas_points = [self._to_canvas(point) for point in points]
+        if closed:
+            canvas_points.append(canvas_points[0])
+        self._canvas.create_line(*canvas_points, fill=color, width=2 if mark_points else 1)
+        if mark_points:
+            for x, y in canvas_points:
+                self._canvas.create_oval(x - 2, y - 2, x + 2, y + 2, outline=color)
+
+    def _apply(self):
+        if self._command is not None and self._command.changed:
+            self._command_stack.do(self._command)
+        self.destroy()
+
+def _make_converter(points):
+    """Funnel to canvas coordinates that fit all the points in the canvas, bow at the left"""
+    if not points:
+        return lambda point: point
+    min_x = min(point[0] for point in points)
+    max_x = max(point[0] for point in points)
+    min_y = min(point[1] for point in points)
+    max_y = max(point[1] for point in points)
+    factor = min((_CANVAS_WIDTH - 2*_MARGIN)/max(max_y - min_y, 1),
+                 (_CANVAS_HEIGHT - 2*_MARGIN)/max(max_x - min_x, 1))
+    #same orientation as the top view
+    return lambda point: (_MARGIN + (point[1] - min_y)*factor,
+                          _MARGIN + (max_x - point[0])*factor)
+
+def _max_tolerance(points):
+    """A tolerance that removes nearly all the points"""
+    if not points:
+        return 1
+    width = max(point[0] for point in points) - min(point[0] for point in points)
+    length = max(point[1] for point in points) - min(point[1] for point in points)
+    return max(width*length/20, 1)
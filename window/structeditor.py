@@ -1,9 +1,14 @@
 """All the classes to display the points and properties of a structure and edti them
 """
+import logging
 import tkinter as tk
+from tkinter import filedialog
 from tkinter.ttk import Treeview, Scrollbar, Entry, Label, Checkbutton, Button, Style
 import model.shipdata
 import model.structure
+import model.tracing
+import model.metrics
+from window.simplifydialog import SimplifyDialog
 from window.framework import Subscriber, Observable
 
 VISIBLE_POINTS = 10
@@ -11,14 +16,25 @@ EDIT_ZONE_COL = 0
 POINTS_TABLE_COL = EDIT_ZONE_COL+1
 SCROLL_COL = POINTS_TABLE_COL+1
 
+summary = logging.getLogger("Summary")
+
 class StructEditor(tk.Frame, Subscriber, Observable):
     """Displays and allow editing of the coordinates and points of one superstructure
 
     Args:
         parent (tk.Frame): widget that is the parent of the editor
         structure (model.structure.Structure): the ship superstructure that will be edited
+        command_stack (CommandStack): the undo/redo stack common to the whole programm
+        all_structures (list): all the superstructures of the ship, for the transforms
+            of all the structures at once
+        half_length (number): half length of the ship, to trace the structure from a picture
+            and show its size relative to the ship's
+    Attrs:
+        metrics (model.metrics.StructureMetrics): area, centroid, length and beam of the structure
     """
-    def __init__(self, parent, structure, command_stack):
+    def __init__(self, parent, structure, command_stack, all_structures=None, half_length=None):
+        #notified before the editor, that shows the metrics on the notifications
+        self.metrics = model.metrics.StructureMetrics(structure)
         Subscriber.__init__(self, structure)
         Observable.__init__(self)
         tk.Frame.__init__(self, parent, borderwidth=4, relief="raised")
@@ -57,9 +73,21 @@ class StructEditor(tk.Frame, Subscriber, Observable):
         self._index_of_sel_point = -1
         self._fill_tree()
 
-        self._edit_zone = EditZone(self, self._structure, command_stack, self._on_get_focus)
+        self._edit_zone = EditZone(self, self._structure, command_stack, self._on_get_focus,
+                                   all_structures, half_length)
         self._edit_zone.grid(column=EDIT_ZONE_COL, row=0, sticky=tk.N)
 
+        self._half_length = half_length
+        self._metrics_var = tk.StringVar()
+        (Label(self, textvariable=self._metrics_var, justify=tk.LEFT)
+         .grid(column=EDIT_ZONE_COL, row=1, columnspan=SCROLL_COL+1, sticky=tk.W))
+        self._refresh_metrics()
+
+    def destroy(self):
+        """Stop following the changes of the structure"""
+        self.metrics.close()
+        super().destroy()
+
     def _set_selection(self, new_sel_index):
         """Set the selected point to the new_sel_index
 
@@ -109,13 +137,19 @@ class StructEditor(tk.Frame, Subscriber, Observable):
         if event_type == "add_point":
             self._index_of_sel_point = event_info["index"]
             self._fill_tree()
+        elif event_type == "mirrored":
+            self._edit_zone.refresh_mirrored()
         else:
             if self._index_of_sel_point >= len(self._structure.points):
                 self._index_of_sel_point = len(self._structure.points)
                 self._edit_zone.unset_point()
             self._fill_tree()
+        self._refresh_metrics()
         self._notify("focus", {})
 
+    def _refresh_metrics(self):
+        self._metrics_var.set(format_metrics(self.metrics.metrics, self._half_length))
+
     def update_to_coord(self, point):
         """Move the selected point to the position of the given point
 
@@ -136,6 +170,23 @@ class StructEditor(tk.Frame, Subscriber, Observable):
             self._set_selection(self._index_of_sel_point+1)
             self.winfo_toplevel().update()
 
+    def select_point(self, point_index):
+        """Give the focus to the editor and select the point
+
+        Args:
+            point_index (int): index of the point in the structure
+        """
+        self._tree.focus_set()
+        self._set_selection(point_index)
+        children = self._tree.get_children()
+        if 0 <= point_index < len(children):
+            self._tree.see(children[point_index])
+
+    @property
+    def structure(self):
+        """The edited superstructure"""
+        return self._structure
+
     @property
     def points(self):
         """Pipe throught the struct's properties"""
@@ -162,6 +213,8 @@ class EditZone(tk.Frame):
         struct_editor (StructEditor): the struct_editor instance in which this widget will be placed
         command_stack (Command Stack): the undo/redo stack common to the whole programm
         on_get_focus (function): a function that takes no args called when this widget get the focus
+        all_structures (list): all the superstructures of the ship, None to transform only this one
+        half_length (number): half length of the ship, None to not trace from pictures
     """
     _FILL_CHECK_ROW = 0
     _POINT_INDEX_ROW = _FILL_CHECK_ROW+1
@@ -170,11 +223,23 @@ class EditZone(tk.Frame):
     _ADD_ROW = _Y_ROW+1
     _DEL_ROW = _ADD_ROW+1
     _SYMM_ROW = _DEL_ROW+1
-
-    def __init__(self, parent, structure, command_stack, on_get_focus):
+    _OFFSET_X_ROW = _SYMM_ROW+1
+    _OFFSET_Y_ROW = _OFFSET_X_ROW+1
+    _MOVE_ROW = _OFFSET_Y_ROW+1
+    _SCALE_ROW = _MOVE_ROW+1
+    _ANGLE_ROW = _SCALE_ROW+1
+    _MIRROR_ROW = _ANGLE_ROW+1
+    _SIMPLIFY_ROW = _MIRROR_ROW+1
+    _TRACE_ROW = _SIMPLIFY_ROW+1
+    _ALL_STRUCTURES_ROW = _TRACE_ROW+1
+
+    def __init__(self, parent, structure, command_stack, on_get_focus, all_structures=None,
+                 half_length=None):
         tk.Frame.__init__(self, parent)
         self.command_stack = command_stack
         self._structure = structure
+        self._all_structures = all_structures
+        self._half_length = half_length
         self._fill_var = tk.IntVar()
         self._fill_var.set(self._structure.fill)
 
@@ -216,8 +281,46 @@ class EditZone(tk.Frame):
          .grid(row=EditZone._ADD_ROW, column=0, columnspan=2, sticky=tk.E+tk.W))
         (Button(self, text="Delete", command=self._delete_point)
          .grid(row=EditZone._DEL_ROW, column=0, columnspan=2, sticky=tk.E+tk.W))
-        (Button(self, text="Symmetry", command=self._apply_symmetry)
-         .grid(row=EditZone._SYMM_ROW, column=0, columnspan=2, sticky=tk.E+tk.W))
+        #the partner of each point is kept as its mirror
+        self._mirrored_var = tk.IntVar(value=int(structure.mirrored))
+        (Checkbutton(self, text="Mirrored", variable=self._mirrored_var,
+                     command=self._set_mirrored)
+         .grid(row=EditZone._SYMM_ROW, column=0, columnspan=2))
+
+        #transforms of the whole structure
+        self._offset_x = tk.StringVar(value="0")
+        self._offset_y = tk.StringVar(value="0")
+        self._scale = tk.StringVar(value="1")
+        self._angle = tk.StringVar(value="0")
+        for row, text, variable in ((EditZone._OFFSET_X_ROW, "Move \u21d5:", self._offset_x),
+                                    (EditZone._OFFSET_Y_ROW, "Move \u21d4:", self._offset_y)):
+            Label(self, text=text).grid(row=row, column=0, sticky=tk.E)
+            entry = Entry(self, textvariable=variable, width=6)
+            entry.grid(row=row, column=1, sticky=tk.W)
+            entry.bind("<FocusIn>", on_get_focus)
+        (Button(self, text="Move", command=self._translate)
+         .grid(row=EditZone._MOVE_ROW, column=0, columnspan=2, sticky=tk.E+tk.W))
+        for row, text, variable, command in ((EditZone._SCALE_ROW, "Scale", self._scale,
+                                              self._scale_structures),
+                                             (EditZone._ANGLE_ROW, "Rotate", self._angle,
+                                              self._rotate)):
+            Button(self, text=text, command=command).grid(row=row, column=0, sticky=tk.E+tk.W)
+            entry = Entry(self, textvariable=variable, width=6)
+            entry.grid(row=row, column=1, sticky=tk.W)
+            entry.bind("<FocusIn>", on_get_focus)
+        (Button(self, text="Flip \u21d5", command=lambda: self._mirror(True))
+         .grid(row=EditZone._MIRROR_ROW, column=0, sticky=tk.E+tk.W))
+        (Button(self, text="Flip \u21d4", command=lambda: self._mirror(False))
+         .grid(row=EditZone._MIRROR_ROW, column=1, sticky=tk.E+tk.W))
+        (Button(self, text="Simplify...", command=self._simplify)
+         .grid(row=EditZone._SIMPLIFY_ROW, column=0, columnspan=2, sticky=tk.E+tk.W))
+        if half_length is not None:
+            (Button(self, text="Trace picture...", command=self._trace_picture)
+             .grid(row=EditZone._TRACE_ROW, column=0, columnspan=2, sticky=tk.E+tk.W))
+        self._all_structures_var = tk.IntVar(value=0)
+        if all_structures is not None:
+            (Checkbutton(self, text="All structures", variable=self._all_structures_var)
+             .grid(row=EditZone._ALL_STRUCTURES_ROW, column=0, columnspan=2))
 
     def set_editable_point(self, point_index):
         """Called when another point is selected
@@ -289,9 +392,82 @@ class EditZone(tk.Frame):
         """
         self.command_stack.do(model.structure.AddPoint(self._structure, self._point_index+1, 0, 0))
 
-    def _apply_symmetry(self):
-        """Make the whole structure symmetrical"""
-        self.command_stack.do(model.structure.ApplySymmetry(self._structure))
+    def _set_mirrored(self):
+        """Turn the mirrored mode on or off, making the structure symmetrical"""
+        self.command_stack.do(model.structure.SetMirrored(self._structure,
+                                                          bool(self._mirrored_var.get())))
+
+    def refresh_mirrored(self):
+        """Show the mirrored mode of the structure, that can change with undo/redo"""
+        self._mirrored_var.set(int(self._structure.mirrored))
+
+    def _structures_to_transform(self):
+        """This structure, or all of them if asked"""
+        if self._all_structures is not None and self._all_structures_var.get():
+            return self._all_structures
+        return [self._structure]
+
+    def _translate(self):
+        """Move the structure by the offsets of the fields"""
+        if is_float(self._offset_x.get()) and is_float(self._offset_y.get()):
+            self.command_stack.do(model.structure.Translate(self._structures_to_transform(),
+                                                            float(self._offset_x.get()),
+                                                            float(self._offset_y.get())))
+
+    def _scale_structures(self):
+        """Scale the structure by the factor of the field, around its middle"""
+        if is_float(self._scale.get()) and float(self._scale.get()) > 0:
+            self.command_stack.do(model.structure.Scale(self._structures_to_transform(),
+                                                        float(self._scale.get())))
+
+    def _rotate(self):
+        """Turn the structure by the angle of the field, in degrees, around its middle"""
+        if is_float(self._angle.get()):
+            self.command_stack.do(model.structure.Rotate(self._structures_to_transform(),
+                                                         float(self._angle.get())))
+
+    def _mirror(self, across_centerline):
+        """Swap port and starboard, or bow and stern"""
+        self.command_stack.do(model.structure.Mirror(self._structures_to_transform(),
+                                                     across_centerline))
+
+    def _simplify(self):
+        """Open the preview of the simplification of the structure"""
+        SimplifyDialog(self, self._structures_to_transform(), self.command_stack)
+
+    def _trace_picture(self):
+        """Replace the outline by the one traced from a picture of the whole ship's length"""
+        path = filedialog.askopenfilename(parent=self, title="Trace the outline of",
+                                          filetypes=[("Pictures", "*.png *.bmp *.gif *.jpg"),
+                                                     ("All files", "*")])
+        if not path:
+            return
+        try:
+            points = model.tracing.trace_picture(path, self._half_length)
+        except (OSError, model.tracing.TracingError) as error:
+            summary.error("Could not trace %s: %s", path, error)
+            return
+        self.command_stack.do(model.structure.ReplacePoints(self._structure,
+                                                            lambda _structure, _points: points))
+        summary.info("%s traced from %s, %d points", self._structure.name, path, len(points))
+
+def format_metrics(metrics, half_length=None):
+    """The metrics as text, relative to the ship's size if the half length is known
+
+    Args:
+        metrics (model.metrics.Metrics)
+        half_length (number): the half length of the ship, None for funnel coordinates only
+    """
+    if metrics.centroid is None:
+        return "No point"
+    text = (f"Area {metrics.area:.0f}, center \u21d5{metrics.centroid[0]:.1f} "
+            f"\u21d4{metrics.centroid[1]:.1f}\n"
+            f"Length {metrics.length:.1f}, beam {metrics.beam:.1f}")
+    if half_length:
+        relative = model.metrics.relative(metrics, half_length)
+        text += (f"\nCenter at {relative['centroid']:+.0f}% of the half length, "
+                 f"length {relative['length']:.0f}% of the ship's")
+    return text
 
 def is_float(possible_number):
     """Returns true if the passed string can be parsed to a float, false if not
@@ -5,17 +5,25 @@
 import tkinter as tk
 from window.sideview import make_grid
 from window.framework import Observable
+import model.spatialindex
+import model.outlinecheck
+import model.overlaps
+from model.funnel import HALF_WIDTH_TO_HALF_LENGTH, OVAL_STRETCH
 
-_HFUNNELS_TO_HLENGTH = 0.028
-_FUNNEL_OVAL = 1.38
 _WIDTH = 701
 _HEIGHT = 261
+#how near the mouse has to be to pick a vertex, funnel or turret, in pixels
+_PICK_RADIUS = 8
 
 class TopView(tk.Canvas, Observable):
     """Everything having to do with the area displaying the top view of the ship
 
     The ship is displayed with bow at the left
     the ship is scaled to fit the length of the canvas
+    The vertex, funnel or turret under the mouse is highlighted,
+    ctrl+click on a vertex or a funnel activates its editor
+    The crossing and zero length edges and the spikes of the superstructures are shown in red
+    The places where superstructures, funnels, turrets and torpedo mounts overlap are hatched
 
     Args:
         parent (tk.Frame): the parent of the canvas
@@ -57,14 +65,20 @@ class TopView(tk.Canvas, Observable):
         self._struct_editors = struct_editors
         for struct_editor in struct_editors:
             struct_editor.subscribe(self._on_notification)
+        self._outline_checkers = [model.outlinecheck.OutlineChecker(struct_editor.structure)
+                                  for struct_editor in struct_editors]
 
-        self._funnel_half_width = ship_data.half_length*_HFUNNELS_TO_HLENGTH
+        self._funnel_half_width = ship_data.half_length*HALF_WIDTH_TO_HALF_LENGTH
         self._funnel_editors = funnel_editors
         for funnel_editor in funnel_editors:
             funnel_editor.subscribe(self._on_notification)
 
         self._turrets = ship_data.turrets_torps
 
+        self._elements = model.spatialindex.ShipElementsIndex(ship_data)
+        self._overlaps = model.overlaps.OverlapAnalyzer(ship_data)
+        self._hovered = None
+
         self._grid = make_grid(self.winfo_reqwidth(), self.winfo_reqheight(), horizontal=True)
         self._grid_on = False
 
@@ -77,6 +91,7 @@ class TopView(tk.Canvas, Observable):
         self.bind("<Leave>", self._on_mouse_move)
         self.bind("<ButtonPress-1>", self._on_click)
         self.bind("<ButtonRelease-1>", self._on_left_release)
+        self.bind("<Control-ButtonRelease-1>", self._on_pick)
         self.bind("<MouseWheel>", self._on_mousewheel)
 
     def make_converters(self, half_length):
@@ -195,7 +210,7 @@ class TopView(tk.Canvas, Observable):
         drawing_ids = []
         delta = self._funnel_half_width
         if oval:
-            delta = delta*_FUNNEL_OVAL
+            delta = delta*OVAL_STRETCH
         if position != 0:
             vertex1_canvas = self._funnel_to_canvas((0-self._funnel_half_width, position-delta))
             vertex2_canvas = self._funnel_to_canvas((0+self._funnel_half_width, position+delta))
@@ -258,8 +273,79 @@ class TopView(tk.Canvas, Observable):
         for turret in self._turrets:
             self._drawings_ids = self._drawings_ids + self._draw_turret(turret)
 
+        for overlap in self._overlaps.overlaps:
+            self._drawings_ids = self._drawings_ids + self._draw_overlap(overlap)
+
+        for checker in self._outline_checkers:
+            self._drawings_ids = self._drawings_ids + self._draw_problems(checker)
+
+        if self._hovered is not None:
+            self._drawings_ids = self._drawings_ids + self._draw_hovered(self._hovered)
+
         self.refresh_grid()
 
+    def _draw_overlap(self, overlap):
+        """Hatch the region where two parts of the ship overlap
+
+        Args:
+            overlap (model.overlaps.Overlap)
+        """
+        return [self.create_polygon(*[self._funnel_to_canvas(point) for point in piece],
+                                    fill="red", stipple="gray50", outline="")
+                for piece in overlap.pieces]
+
+    def _draw_problems(self, checker):
+        """Show in red where the outline of a structure is broken
+
+        Args:
+            checker (model.outlinecheck.OutlineChecker): the checker of the structure
+        """
+        points = checker.structure.points
+        drawing_ids = []
+        for problem in checker.problems:
+            if problem.kind == "spike":
+                x, y = self._funnel_to_canvas(points[problem.indices[0]])
+                drawing_ids.append(self.create_oval(x - _PICK_RADIUS/2, y - _PICK_RADIUS/2,
+                                                    x + _PICK_RADIUS/2, y + _PICK_RADIUS/2,
+                                                    outline="red", width=2))
+            else:
+                for index in problem.indices:
+                    start, end = model.outlinecheck.edge(points, index)
+                    drawing_ids.append(self.create_line(*self._funnel_to_canvas(start),
+                                                        *self._funnel_to_canvas(end),
+                                                        fill="red", width=4))
+        return drawing_ids
+
+    def _draw_hovered(self, element):
+        """Highlight the element under the mouse
+
+        Args:
+            element (model.spatialindex.Element)
+        """
+        if element.kind == "turret":
+            canvas_outline = [self._funnel_to_canvas(point) for point in element.owner.outline]
+            return [self.create_polygon(*canvas_outline, fill="", outline="blue", width=2)]
+        x, y = self._funnel_to_canvas(element.point)
+        return [self.create_oval(x - _PICK_RADIUS/2, y - _PICK_RADIUS/2,
+                                 x + _PICK_RADIUS/2, y + _PICK_RADIUS/2,
+                                 outline="blue", width=2)]
+
+    def _element_at(self, event, kinds=None):
+        """The vertex, funnel or turret under the mouse
+
+        Args:
+            event (tk.Event): mouse event
+            kinds (set): the kinds of elements to search, all if None
+        Returns:
+            model.spatialindex.Element, None if nothing is near enough
+        """
+        canvas_point = (event.x + self.canvasx(0), event.y + self.canvasy(0))
+        funnel_point = self._canvas_to_funnel(canvas_point)
+        #the pick radius in funnel coordinates, for the current zoom
+        origin = self._canvas_to_funnel((0, 0))
+        radius = abs(self._canvas_to_funnel((_PICK_RADIUS, 0))[1] - origin[1])
+        return self._elements.nearest(funnel_point, radius, kinds)
+
     def refresh_grid(self):
         """Update the grid according to grid_on
         Resize the grid if the previous grid was too small
@@ -281,8 +367,12 @@ class TopView(tk.Canvas, Observable):
         self._parameters.topview_offset = new_offset
         self._notify("Drag", {"x":x_move})
 
-    def _on_mouse_move(self, _event):
+    def _on_mouse_move(self, event):
         if not self._dragging:
+            if event.type == tk.EventType.Leave:
+                self._hovered = None
+            else:
+                self._hovered = self._element_at(event)
             self.redraw(self._active_editor)
 
     def _on_mousewheel(self, event):
@@ -313,6 +403,28 @@ class TopView(tk.Canvas, Observable):
             self._active_editor.update_to_coord(self._canvas_to_funnel((event.x + self.canvasx(0),
                                                                         event.y + self.canvasy(0))))
 
+    def _on_pick(self, event):
+        """Activate the editor of the vertex or funnel under the mouse"""
+        if self._dragging:
+            self._dragging = False
+            return
+        element = self._element_at(event, {"vertex", "funnel"})
+        if element is None:
+            return
+        if element.kind == "vertex":
+            for editor in self._struct_editors:
+                if editor.structure is element.owner:
+                    editor.select_point(element.index)
+        else:
+            for editor in self._funnel_editors:
+                if editor.funnel is element.owner:
+                    editor.activate()
+
+    def destroy(self):
+        """Stop following the changes of the ship"""
+        self._elements.close()
+        super().destroy()
+
     def switch_grid(self, grid_on):
         """Add or remove the grid according to the state of grid_on"""
         self._grid_on = grid_on